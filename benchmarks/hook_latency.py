@@ -0,0 +1,115 @@
+#!/usr/bin/env python3
+"""
+This script measures how much time the remember shell hook adds to every prompt.
+
+An interactive bash or zsh reads a list of commands from stdin and draws a prompt after each
+one, running the hook installed with every --hook_style. The same run without the hook is the
+baseline, the difference per prompt is the latency the hook adds.
+
+ex: python3 benchmarks/hook_latency.py --prompts 500 --repeat 5
+"""
+import argparse
+import os
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+from typing import Dict, List, Optional, Tuple
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.realpath(__file__))))
+
+from install_remember3 import create_hook_function  # noqa: E402
+from remember.command_store_lib import CUSTOM_HIST_HEAD, read_unread_history  # noqa: E402
+from remember.constants import HOOK_STYLES  # noqa: E402
+
+SHELLS = ['bash', 'zsh']
+BASELINE = 'none'
+BASH_RC = """HISTFILE={history_file_path}
+HISTSIZE=100000
+{hook_function}
+PROMPT_COMMAND='history -a{hook_call}'
+"""
+ZSH_RC = """HISTFILE={history_file_path}
+HISTSIZE=100000
+SAVEHIST=100000
+setopt INC_APPEND_HISTORY
+{hook_function}
+autoload -U add-zsh-hook
+{hook_call}
+"""
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.split('\n\n')[0].strip())
+    parser.add_argument('--prompts', type=int, default=300, help='Prompts drawn per run.')
+    parser.add_argument('--repeat', type=int, default=5, help='Runs per hook, the fastest counts.')
+    parser.add_argument('--shell', choices=SHELLS, action='append',
+                        help='Only benchmark this shell, repeat it for several.')
+    args = parser.parse_args()
+    print(f'{"shell":<7}{"hook":<9}{"us/prompt":>11}{"added us":>10}{"records":>9}')
+    for shell in args.shell or SHELLS:
+        if not shutil.which(shell):
+            print(f'{shell:<7}not installed')
+            continue
+        results: Dict[str, float] = {}
+        for hook_style in [BASELINE] + HOOK_STYLES:
+            seconds, records = benchmark_hook(shell, hook_style, args.prompts, args.repeat)
+            results[hook_style] = seconds / args.prompts * 1e6
+            added = results[hook_style] - results[BASELINE]
+            print(f'{shell:<7}{hook_style:<9}{results[hook_style]:>11.1f}{added:>10.1f}'
+                  f'{records if records is not None else "":>9}')
+
+
+def benchmark_hook(shell: str, hook_style: str, prompts: int,
+                   repeat: int) -> Tuple[float, Optional[int]]:
+    """The fastest run in seconds and the commands the hook recorded in its last run."""
+    best = float('inf')
+    records: Optional[int] = None
+    for _ in range(repeat):
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            context_file_path = os.path.join(tmp_dir, 'histcontext')
+            with open(context_file_path, 'w', encoding='utf8') as context_file:
+                context_file.write(CUSTOM_HIST_HEAD)
+            rc_file_path = _write_rc_file(shell, hook_style, tmp_dir, context_file_path)
+            commands = ''.join(f': {index}\n' for index in range(prompts))
+            start_time = time.perf_counter()
+            subprocess.run(_get_shell_command(shell, rc_file_path), input=commands, text=True,
+                           cwd=tmp_dir, env=_get_shell_env(tmp_dir), stdout=subprocess.DEVNULL,
+                           stderr=subprocess.DEVNULL, check=False)
+            best = min(best, time.perf_counter() - start_time)
+            if hook_style != BASELINE:
+                records = len(read_unread_history(context_file_path, None).commands)
+    return best, records
+
+
+def _write_rc_file(shell: str, hook_style: str, tmp_dir: str, context_file_path: str) -> str:
+    history_file_path = os.path.join(tmp_dir, 'history')
+    hook_function = ''
+    hook_call = ''
+    if hook_style != BASELINE:
+        hook_function = create_hook_function(
+            history_file_path, hook_style, context_file_path, shell == 'zsh')
+        hook_call = ';hook_function' if shell == 'bash' else 'add-zsh-hook precmd hook_function'
+    rc_template = BASH_RC if shell == 'bash' else ZSH_RC
+    # zsh reads .zshrc from ZDOTDIR.
+    rc_file_path = os.path.join(tmp_dir, 'bashrc' if shell == 'bash' else '.zshrc')
+    with open(rc_file_path, 'w', encoding='utf8') as rc_file:
+        rc_file.write(rc_template.format(history_file_path=history_file_path,
+                                         hook_function=hook_function, hook_call=hook_call))
+    return rc_file_path
+
+
+def _get_shell_command(shell: str, rc_file_path: str) -> List[str]:
+    if shell == 'bash':
+        return ['bash', '--noprofile', '--rcfile', rc_file_path, '-i']
+    return ['zsh', '-i']
+
+
+def _get_shell_env(tmp_dir: str) -> Dict[str, str]:
+    return {'PATH': os.environ.get('PATH', ''), 'HOME': tmp_dir, 'ZDOTDIR': tmp_dir,
+            'TERM': 'dumb'}
+
+
+if __name__ == "__main__":
+    main()
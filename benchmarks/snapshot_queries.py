@@ -0,0 +1,71 @@
+#!/usr/bin/env python3
+"""
+This script compares a burst of store queries on the store file with the same burst on an
+in memory snapshot of it.
+
+The burst annotates commands the way a script working through a runbook would, it looks each
+command up, reads the stats of its primary command and updates its info. The snapshot run includes
+copying the store into memory and, with --write_back, writing it back to the file.
+
+ex: python3 benchmarks/snapshot_queries.py --commands 50000 --lookups 2000 --write_back
+"""
+import argparse
+import os
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.realpath(__file__))))
+
+from remember.sql_store import Command, SqlCommandStore  # noqa: E402
+
+PRIMARY_COMMANDS = ['git', 'docker', 'kubectl', 'make', 'grep', 'ssh', 'python3', 'ls']
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.split('\n\n')[0].strip())
+    parser.add_argument('--commands', type=int, default=20000, help='Commands in the store.')
+    parser.add_argument('--lookups', type=int, default=1000, help='Commands annotated per run.')
+    parser.add_argument('--write_back', action='store_true',
+                        help='Write the snapshot back to the store file.')
+    parser.add_argument('--dir',
+                        help='Where to create the store, the temporary directory by default.')
+    args = parser.parse_args()
+    with tempfile.TemporaryDirectory(dir=args.dir) as tmp_dir:
+        db_file_path = os.path.join(tmp_dir, 'remember.db')
+        store = SqlCommandStore(db_file_path)
+        store.add_commands([_get_command(x) for x in range(args.commands)])
+        store.close()
+        print(f'{"path":<10}{"ms":>10}{"us/lookup":>11}')
+        for name in ('disk', 'snapshot'):
+            store = SqlCommandStore(db_file_path)
+            start_time = time.perf_counter()
+            if name == 'disk':
+                annotate(store, args.commands, args.lookups)
+            else:
+                with store.in_memory_snapshot(args.write_back) as snapshot:
+                    annotate(snapshot, args.commands, args.lookups)
+            seconds = time.perf_counter() - start_time
+            store.close()
+            print(f'{name:<10}{seconds * 1000:>10.1f}{seconds / args.lookups * 1e6:>11.1f}')
+
+
+def annotate(store: SqlCommandStore, command_count: int, lookups: int) -> None:
+    # Spread over the whole store so the page cache of the file doesn't hold them all.
+    step = max(1, command_count // lookups)
+    for index in range(0, step * lookups, step):
+        command = _get_command(index % command_count)
+        if not store.has_command_by_name(command.get_unique_command_id()):
+            continue
+        store.get_primary_command_stat(command.get_primary_command())
+        command.set_command_info(f'runbook step {index}')
+        store.update_command_info(command)
+
+
+def _get_command(index: int) -> Command:
+    primary_command = PRIMARY_COMMANDS[index % len(PRIMARY_COMMANDS)]
+    return Command(f'{primary_command} --step {index} target{index % 97}', float(index))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,24 @@
+""" An executable python script that applies the retention policy to the store.
+
+Old commands that were only seen once are deleted, the number of commands remembered per
+directory is capped and the freed space is returned to the file system.
+"""
+import remember.command_store_lib as command_store
+from remember import handle_args
+from remember.retention import RetentionPolicy, apply_retention_policy
+
+
+def main() -> None:
+    """Entry point for this executable python module."""
+    args = handle_args.setup_args_for_compact()
+    store_file_path = command_store.get_file_path(args.save_dir)
+    store = command_store.load_command_store(store_file_path)
+    if command_store.has_info_index(args.save_dir):
+        command_store.load_info_index(store, args.save_dir)
+    policy = RetentionPolicy(args.days, args.max_contexts, not args.include_annotated,
+                             args.batch_size)
+    print(apply_retention_policy(store, policy))
+
+
+if __name__ == "__main__":
+    main()
@@ -1,23 +1,35 @@
+import argparse
 import os
 import subprocess
 
-from remember import command_store_lib
-from remember.command_store_lib import read_last_search, DEFAULT_LAST_SAVE_FILE_NAME
+from remember import profiling
+from remember.constants import BColors
 from remember.handle_args import setup_for_execute_last
-from remember.interactive import get_user_input, write_to_hist_file
+from remember.history_file import write_to_hist_file
+from remember.last_search import LAST_SEARCH_FILE_NAME, read_last_search_command
 
 
 def main() -> None:
-    shell_env = os.getenv('SHELL')
     args = setup_for_execute_last()
-    file_path = os.path.join(args.save_dir, DEFAULT_LAST_SAVE_FILE_NAME)
-    last_search_results = read_last_search(file_path)
-    selected_command = last_search_results[args.index - 1]
-    red = command_store_lib.BColors.FAIL
-    white = command_store_lib.BColors.ENDC
+    with profiling.profile(args.profile, args.save_dir, 'execute_last'):
+        run_execute_last_args(args)
+
+
+def run_execute_last_args(args: argparse.Namespace) -> None:
+    shell_env = os.getenv('SHELL')
+    file_path = os.path.join(args.save_dir, LAST_SEARCH_FILE_NAME)
+    if not os.path.exists(file_path):
+        print('There is no last search to execute from, search with re first.')
+        return
+    selected_command = read_last_search_command(file_path, args.index)
+    if selected_command is None:
+        print(f'The last search has no result number {args.index}.')
+        return
+    red = BColors.FAIL
+    white = BColors.ENDC
     msg = f'You want to execute -> {red}{selected_command}{white} (just hit enter for yes and ' \
           f'type anything else for no): '
-    user_response = get_user_input(msg)
+    user_response = input(msg)
     if user_response:
         return
     if not shell_env:
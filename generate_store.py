@@ -0,0 +1,31 @@
+""" An executable python script that ingests one or more history files into the store.
+
+Every history file (bash, zsh, the custom .histcontext or histories copied from other hosts) is
+parsed in its own worker process and the merged commands are written in one transaction.
+History archives too big to read at once are imported a chunk at a time with --chunked.
+"""
+import remember.command_store_lib as command_store
+from remember import handle_args
+from remember.constants import CUSTOM_HISTORY_FILE_PATH
+
+
+def main() -> None:
+    """Entry point for this executable python module."""
+    args = handle_args.setup_args_for_generate()
+    history_file_paths = args.history_file_path or [CUSTOM_HISTORY_FILE_PATH]
+    store_file_path = command_store.get_file_path(args.save_dir)
+    store = command_store.load_command_store(store_file_path)
+    if args.chunked:
+        chunk_size = int(args.chunk_mb * 1024 * 1024)
+        for history_file_path in history_file_paths:
+            num_commands = command_store.import_history_archive(
+                store, history_file_path, args.save_dir, chunk_size)
+            print(f'Imported {num_commands} commands from {history_file_path}.')
+        return
+    num_commands = command_store.process_history_sources(
+        store, history_file_paths, args.save_dir, args.jobs)
+    print(f'Stored {num_commands} distinct commands from {len(history_file_paths)} history files.')
+
+
+if __name__ == "__main__":
+    main()
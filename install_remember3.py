@@ -9,19 +9,94 @@ from collections import OrderedDict
 from tkinter import filedialog as fd
 from typing import List, Optional, Tuple
 
+from remember import profiling
 from remember.command_store_lib import get_file_path, CUSTOM_HIST_HEAD
 from remember.handle_args import setup_args_for_setup
-from remember.constants import ALIASES, CUSTOM_HISTORY_FILE_PATH, DEFAULT_REMEMBER_SAVE_DIR
+from remember.constants import ALIASES, CUSTOM_HISTORY_FILE_PATH, DEFAULT_REMEMBER_SAVE_DIR, \
+    FLUSH_HOOK_BUFFER, HOOK_STYLE_BUFFERED, HOOK_STYLE_BUILTIN, HOOK_STYLE_TAIL
 
 
 HISTORY_FILE_PATH = os.getenv('HISTFILE')
 HISTORY_FILE = 'HISTFILE={}\n'
 HOOK_STRING = '# Remember command hook'
+HOOK_CONTEXT_FILE_PATH = '~/.remember3/.histcontext'
 HOOK_FUNCTION = """hook_function() {{
-  last_line=$(tail -1 {})
+  last_line=$(tail -1 {history_file_path})
   pwdresult=$(pwd)
-  echo "$pwdresult<<!>>$last_line" >> ~/.remember3/.histcontext
+  echo "$pwdresult<<!>>$last_line" >> {context_file_path}
 }}"""
+# Only uses builtins so the prompt doesn't fork. The history number skips prompts that didn't
+# add a command, like the first one or an empty line.
+BUILTIN_HOOK_FUNCTION = """hook_function() {{
+  if [[ -z $_remember_histcmd || $HISTCMD == "$_remember_histcmd" ]]; then
+    _remember_histcmd=$HISTCMD
+    return
+  fi
+  _remember_histcmd=$HISTCMD
+  {{ printf '%s<<!>>' "$PWD"; fc -ln -1; }} >> {context_file_path} 2>/dev/null
+}}"""
+# Commands written at once by the buffered hook.
+HOOK_FLUSH_EVERY = 20
+# Keeps the directories and writes them with their commands, read back with fc relative to the
+# last one, every few prompts and on exit. The exit command itself is in the history then.
+# An EXIT trap set before the hook still runs after the flush, one set after it replaces it.
+BASH_BUFFERED_HOOK_FUNCTION = """hook_function() {{
+  if [[ -z $_remember_histcmd || $HISTCMD == "$_remember_histcmd" ]]; then
+    _remember_histcmd=$HISTCMD
+    return
+  fi
+  _remember_histcmd=$HISTCMD
+  _remember_buffer+=("$PWD")
+  (( ${{#_remember_buffer[@]}} < {flush_every} )) || _remember_flush
+}}
+_remember_flush() {{
+  local index count=${{#_remember_buffer[@]}} skip=${{1:-0}}
+  (( count )) || return
+  {{
+    for ((index = 0; index < count; index++)); do
+      printf '\\x1e%s<<!>>' "${{_remember_buffer[index]}}"
+      fc -ln $((index - count - skip)) $((index - count - skip))
+      printf '\\x1f\\n'
+    done
+  }} >> {context_file_path} 2>/dev/null
+  _remember_buffer=()
+}}
+_remember_exit() {{
+  case $1 in
+    exit|'exit '*) _remember_flush 1 ;;
+    *) _remember_flush ;;
+  esac
+  [[ -z $_remember_previous_exit ]] || eval "$_remember_previous_exit"
+}}
+if [[ $(trap -p EXIT) != *_remember_exit* ]]; then
+  eval "_remember_trap=($(trap -p EXIT))"
+  _remember_previous_exit=${{_remember_trap[2]}}
+  unset _remember_trap
+  trap '_remember_exit "$BASH_COMMAND"' EXIT
+fi"""
+# preexec gets the command as it was typed, the records are written with a single print.
+ZSH_BUFFERED_HOOK_FUNCTION = """_remember_preexec() {{
+  _remember_command=$1
+}}
+hook_function() {{
+  [[ -n $_remember_command ]] || return
+  _remember_buffer+=($'\\x1e'"$PWD<<!>>$_remember_command"$'\\x1f\\n')
+  _remember_command=
+  (( ${{#_remember_buffer}} < {flush_every} )) || _remember_flush
+}}
+_remember_flush() {{
+  (( ${{#_remember_buffer}} )) || return
+  print -rn -- "${{(j::)_remember_buffer}}" >> {context_file_path} 2>/dev/null
+  _remember_buffer=()
+}}
+add-zsh-hook preexec _remember_preexec
+add-zsh-hook zshexit _remember_flush"""
+# The bash and the zsh hook function of every style.
+HOOK_FUNCTIONS = {
+    HOOK_STYLE_BUILTIN: (BUILTIN_HOOK_FUNCTION, BUILTIN_HOOK_FUNCTION),
+    HOOK_STYLE_BUFFERED: (BASH_BUFFERED_HOOK_FUNCTION, ZSH_BUFFERED_HOOK_FUNCTION),
+    HOOK_STYLE_TAIL: (HOOK_FUNCTION, HOOK_FUNCTION),
+}
 
 ZSH_REMEMBER_HOOK = """
 {hook_str}
@@ -57,6 +132,11 @@ class SetupArgs:
 
 def main() -> None:
     args = setup_args_for_setup()
+    with profiling.profile(args.profile, DEFAULT_REMEMBER_SAVE_DIR, 'install_remember3'):
+        run_setup_args(args)
+
+
+def run_setup_args(args: Namespace) -> None:
     setup_args = setup_all_files_and_dirs(args)
     if not setup_args:
         return
@@ -64,7 +144,8 @@ def main() -> None:
     history_file_path = setup_args.history_file_path
     save_dir = setup_args.save_dir_path
     rc_file_path = setup_args.rc_file_path
-    alias_dict, check_write_dict = create_lines_to_write(is_zsh, history_file_path, save_dir)
+    alias_dict, check_write_dict = create_lines_to_write(
+        is_zsh, history_file_path, save_dir, args.hook_style)
     write_lines_to_files(rc_file_path, save_dir, check_write_dict, alias_dict)
 
 
@@ -88,7 +169,10 @@ def setup_all_files_and_dirs(args: Namespace) -> Optional[SetupArgs]:
 
 
 def create_lines_to_write(
-        is_zsh: bool, history_file_path: str, save_dir) -> Tuple[OrderedDict, OrderedDict]:
+        is_zsh: bool,
+        history_file_path: str,
+        save_dir,
+        hook_style: str = HOOK_STYLE_BUILTIN) -> Tuple[OrderedDict, OrderedDict]:
     remember_home = pathlib.Path(__file__).parent.resolve()
     # The keys are what to check for in the rc file the values are what to write
     # if the key isn't present
@@ -96,9 +180,11 @@ def create_lines_to_write(
     check_write_dict['HISTSIZE'] = 'HISTSIZE=50000\n'
     check_write_dict['SAVEHIST'] = 'SAVEHIST=50000\n'
     check_write_dict['HISTFILESIZE'] = 'HISTFILESIZE=50000\n'
-    _append_rc_file_options(is_zsh, history_file_path, check_write_dict)
+    _append_rc_file_options(is_zsh, history_file_path, check_write_dict, hook_style)
     check_write_dict['HISTFILE'] = HISTORY_FILE.format(history_file_path)
-    alias_lines = ALIASES.format(remember_home=remember_home, save_dir=save_dir).split('\n')
+    flush = FLUSH_HOOK_BUFFER if hook_style == HOOK_STYLE_BUFFERED else ''
+    alias_lines = ALIASES.format(
+        remember_home=remember_home, save_dir=save_dir, flush=flush).split('\n')
     alias_dict = get_alias_dict(alias_lines)
     return alias_dict, check_write_dict
 
@@ -152,14 +238,28 @@ def create_db_if_doesnt_exist(save_dir: str) -> None:
     conn.close()
 
 
-def _append_rc_file_options(is_zsh: bool, history_path: str, check_write_dict: OrderedDict) -> None:
+def _append_rc_file_options(is_zsh: bool, history_path: str, check_write_dict: OrderedDict,
+                            hook_style: str) -> None:
     if is_zsh:
         check_write_dict['setopt INC_APPEND_HISTORY'] = 'setopt INC_APPEND_HISTORY\n'
-    check_write_dict[HOOK_STRING] = create_hook(is_zsh, history_path)
+    check_write_dict[HOOK_STRING] = create_hook(is_zsh, history_path, hook_style)
+
+
+def create_hook_function(history_file_path: str,
+                         hook_style: str = HOOK_STYLE_BUILTIN,
+                         context_file_path: str = HOOK_CONTEXT_FILE_PATH,
+                         is_zsh: bool = False) -> str:
+    """The hook_function that appends the last command and its directory to the context file."""
+    bash_hook_function, zsh_hook_function = HOOK_FUNCTIONS[hook_style]
+    hook_function = zsh_hook_function if is_zsh else bash_hook_function
+    return hook_function.format(history_file_path=history_file_path,
+                                context_file_path=context_file_path,
+                                flush_every=HOOK_FLUSH_EVERY)
 
 
-def create_hook(is_zsh: bool, history_file_path: str) -> str:
-    hook_function = HOOK_FUNCTION.format(history_file_path)
+def create_hook(is_zsh: bool, history_file_path: str, hook_style: str = HOOK_STYLE_BUILTIN) -> str:
+    hook_function = create_hook_function(
+        history_file_path, hook_style, HOOK_CONTEXT_FILE_PATH, is_zsh)
     if is_zsh:
         return ZSH_REMEMBER_HOOK.format(hook_str=HOOK_STRING, hook_func=hook_function)
     return BASH_REMEMBER_HOOK.format(hook_str=HOOK_STRING, hook_func=hook_function)
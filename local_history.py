@@ -1,14 +1,26 @@
+# Imported first so that the import phase covers the imports below.
+from remember import timing
+import argparse
 import os
-import time
 from typing import Optional
 
+from remember import profiling
 from remember.handle_args import setup_args_for_local_history
 import remember.command_store_lib as command_store
 from remember.interactive import display_and_interact_results
 
 
 def main() -> Optional[str]:
+    timing.end_import_phase()
     args = setup_args_for_local_history()
+    try:
+        with profiling.profile(args.profile, args.save_dir, 'local_history'):
+            return run_local_history_args(args)
+    finally:
+        timing.report_timings(args.timings)
+
+
+def run_local_history_args(args: argparse.Namespace) -> Optional[str]:
     if not args.save_dir:
         return """To many or too few args.\n$> remember.py [
                  file_store_directory_path] [history_file_path]
@@ -18,7 +30,8 @@ def main() -> Optional[str]:
                  file_store_directory_path] [history_file_path]
                  ['word|phrase to look up']"""
     return run_history_command(args.save_dir, args.history_file_path, os.getcwd(),
-                               args.execute, args.max, args.query)
+                               args.execute, args.max, args.query, args.recursive, args.since,
+                               args.before, args.background)
 
 
 def run_history_command(save_dir: str,
@@ -26,18 +39,32 @@ def run_history_command(save_dir: str,
                         directory: str,
                         execute: bool,
                         max_results: int,
-                        search_term: str) -> Optional[str]:
+                        search_term: str,
+                        recursive: bool = False,
+                        since: Optional[float] = None,
+                        before: Optional[float] = None,
+                        background: bool = False) -> Optional[str]:
     search_term_list = [search_term] if search_term else []
     store_file_path = command_store.get_file_path(save_dir)
     store = command_store.load_command_store(store_file_path)
-    command_store.start_history_processing(store, history_file_path, save_dir, 1)
-    print(f'Looking for all past commands with: {directory}')
-    start_time = time.time()
-    result = store.get_command_with_context(directory, search_term_list)
-    total_time = time.time() - start_time
-    print("Search time %.5f:  seconds" % total_time)
-    return display_and_interact_results(
-        result, max_results, save_dir, history_file_path, None, execute)
+    history_processor = None
+    if background:
+        history_processor = command_store.start_background_history_processing(
+            store, history_file_path, save_dir, 1)
+    else:
+        command_store.start_history_processing(store, history_file_path, save_dir, 1)
+    try:
+        print(f'Looking for all past commands with: {directory}')
+        with timing.phase(timing.PHASE_SEARCH):
+            result = store.get_command_with_context(directory, search_term_list, recursive,
+                                                    since, before)
+        if history_processor:
+            history_processor.report_lag(execute)
+        return display_and_interact_results(
+            result, max_results, save_dir, history_file_path, None, execute)
+    finally:
+        if history_processor:
+            history_processor.join()
 
 
 if __name__ == "__main__":
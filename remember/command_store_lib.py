@@ -1,11 +1,24 @@
 """
 This Module contains the core logic for the remember functions.
 """
+import hashlib
+import io
 import os.path
+import threading
+from concurrent.futures import ProcessPoolExecutor
+from dataclasses import dataclass
 from enum import Enum
-from typing import List, Optional
+from itertools import repeat
+from typing import TYPE_CHECKING, BinaryIO, Callable, Dict, List, Optional, Tuple
 
-from remember.sql_store import SqlCommandStore, IgnoreRules, Command
+from remember import timing
+from remember.constants import BColors, DEFAULT_IMPORT_CHUNK_SIZE
+from remember.last_search import LAST_SEARCH_FILE_NAME, encode_last_search
+from remember.sql_store import SqlCommandStore, IgnoreRules, Command, PrimaryCommandStats, \
+    HistoryFileState, HistoryImportCheckpoint, HistoryReadPosition
+
+if TYPE_CHECKING:
+    from remember.info_index import CommandInfoIndex
 
 import shutil
 import time
@@ -13,25 +26,27 @@ import time
 PROCESSED_TO_TAG = '****** previous commands read *******'
 CUSTOM_HIST_HEAD = '## remember command custom history file ##\n'
 CUSTOM_HIST_SEPARATOR = '<<!>>'
+# The buffered shell hook frames every record so that multi-line commands can be written.
+CUSTOM_HIST_RECORD_START = '\x1e'
+CUSTOM_HIST_RECORD_END = '\x1f'
 REMEMBER_DB_FILE_NAME = 'remember.db'
-DEFAULT_LAST_SAVE_FILE_NAME = 'last_saved_results.txt'
+DEFAULT_LAST_SAVE_FILE_NAME = LAST_SEARCH_FILE_NAME
 IGNORE_RULE_FILE_NAME = 'ignore_rules.txt'
+INFO_INDEX_FILE_NAME = 'remember_info_index.npz'
+QUERY_PLANS_FILE_NAME = 'remember_query_plans.txt'
+SLOWEST_QUERY_PLAN_COUNT = 5
+# The last commands read from a history file, looked for to find where to continue reading it.
+HISTORY_ANCHOR_LINES = 3
+# Bytes read before the last position to check the file was only appended to since.
+HISTORY_ANCHOR_WINDOW_SIZE = 64 * 1024
+# The custom history file is swapped for an empty one once this many of its bytes were read.
+CUSTOM_HISTORY_COMPACT_SIZE = 1024 * 1024
+# How long the replaced custom history file has to stop growing before it is let go.
+CUSTOM_HISTORY_SETTLE_SECONDS = 0.05
 ERROR_CUSTOM_HIST_FILE = f"This looks like a custom history file format. Please add '{CUSTOM_HIST_HEAD}' " \
                          f"as the first line to ~/.histcontext"
 
 
-class BColors(object):
-    HEADER = '\033[95m'
-    OKBLUE = '\033[94m'
-    OKGREEN = '\033[92m'
-    YELLOW = '\033[33m'
-    WARNING = '\033[93m'
-    FAIL = '\033[91m'
-    ENDC = '\033[0m'
-    BOLD = '\033[1m'
-    UNDERLINE = '\033[4m'
-
-
 class CommandAndContext(object):
     def __init__(self, command_line: str, directory_context: str = None):
         self._command_line = command_line
@@ -58,41 +73,168 @@ class HistoryProcessor(object):
                  store: SqlCommandStore,
                  history_file_path: str,
                  save_directory: str,
-                 threshold: int = 100):
+                 threshold: int = 100,
+                 on_progress: Optional[Callable[[int, int], None]] = None,
+                 verbose: bool = True):
         self._store = store
+        self._on_progress = on_progress
+        self._verbose = verbose
         self._threshold = threshold
         self._history_file_path = history_file_path
-        tmp_file_path = os.path.join(save_directory, IGNORE_RULE_FILE_NAME)
-        self._ignore_rule_file = tmp_file_path if os.path.isfile(tmp_file_path) else None
+        self._ignore_rule_file = _get_ignore_rule_file(save_directory)
         self._history_file_type = HistoryFileType.UNKNOWN
+        self._read_end = HistoryReadEnd(0, [])
         self._lines_processed = False
+        # True once every command in the file is in the store, none are left under threshold.
+        self._all_commands_stored = False
 
     def process_history_file(self) -> None:
-        print('Reading ' + self._history_file_path)
-        start_time = time.time()
-        lines = get_string_file_lines(self._history_file_path)
-        self._set_history_file_type(lines)
-        commands = get_unread_commands(lines, self._history_file_type)
+        history_file_state = get_history_file_state(self._history_file_path)
+        if history_file_state and \
+                history_file_state == self._store.get_history_file_state(self._history_file_path):
+            # Nothing was written to the file since it was last ingested.
+            return
+        if self._verbose:
+            print('Reading ' + self._history_file_path)
+        unread_history = read_unread_history(
+            self._history_file_path, self._store.get_history_read_position(self._history_file_path))
+        self._history_file_type = unread_history.file_type
+        self._read_end = unread_history.read_end
+        commands = unread_history.commands
         if len(commands) > self._threshold:
-            process_history_commands(self._store, commands, self._ignore_rule_file)
-            print(f'Wrote to database in {time.time() - start_time} seconds')
+            process_history_commands(self._store, commands, self._ignore_rule_file,
+                                     self._on_progress)
             self._lines_processed = True
+        self._all_commands_stored = self._lines_processed or not commands
 
     def update_history_file(self) -> None:
-        if not self._lines_processed:
-            return
-        if self._history_file_type == HistoryFileType.STANDARD:
-            with open(self._history_file_path, "a") as myfile:
-                myfile.write(f'{PROCESSED_TO_TAG}\n')
+        if self._lines_processed:
+            self._read_end = mark_history_file_processed(
+                self._history_file_path, self._history_file_type, self._read_end)
+        if self._all_commands_stored:
+            _record_history_read_end(self._store, self._history_file_path, self._read_end)
         else:
-            with open(self._history_file_path, 'w') as hist_file:
-                hist_file.write(CUSTOM_HIST_HEAD)
+            # The read position stays put so the commands under the threshold are read again
+            # with the next ones, until then the unchanged file is skipped.
+            _record_unchanged_history_file(self._store, self._history_file_path, self._read_end)
 
-    def _set_history_file_type(self, history_lines: List[str]):
-        if history_lines[0] == CUSTOM_HIST_HEAD:
-            self._history_file_type = HistoryFileType.CUSTOM
-            return
-        self._history_file_type = HistoryFileType.STANDARD
+
+class BackgroundHistoryProcessor(object):
+    """Processes the history file on its own connection while the caller searches.
+
+    Both connections use the write-ahead log so the search reads the last committed snapshot
+    instead of waiting for the writer. The caller reports how far behind that snapshot is with
+    get_lag_message and must join before it writes to the history file itself. on_join runs
+    once the processor is done, it switches the store back to its own journal mode.
+    """
+
+    def __init__(self,
+                 db_file_path: str,
+                 history_file_path: str,
+                 save_directory: str,
+                 threshold: int = 100,
+                 on_join: Optional[Callable[[], None]] = None):
+        self._db_file_path = db_file_path
+        self._on_join = on_join
+        self._history_file_path = history_file_path
+        self._save_directory = save_directory
+        self._threshold = threshold
+        # None until the history file has been read and filtered.
+        self._total_commands: Optional[int] = None
+        self._written_commands = 0
+        self._error: Optional[Exception] = None
+        self._thread = threading.Thread(target=self._run, name='remember-history')
+
+    def start(self) -> None:
+        # Printed here, the search output would interleave with it.
+        print('Reading ' + self._history_file_path + ' in the background')
+        self._thread.start()
+
+    def join(self) -> None:
+        self._thread.join()
+        if self._on_join:
+            self._on_join()
+            self._on_join = None
+        if self._error:
+            print(f'Processing the history file failed: {self._error}')
+
+    def is_done(self) -> bool:
+        return not self._thread.is_alive()
+
+    def get_unprocessed_count(self) -> Optional[int]:
+        """The commands read but not yet written, None while the file is still being read."""
+        if self._total_commands is None:
+            return None
+        return self._total_commands - self._written_commands
+
+    def get_lag_message(self) -> str:
+        if self.is_done():
+            if self._error:
+                return 'Results may not include the latest commands, processing them failed.'
+            return 'Results include the latest commands.'
+        unprocessed_count = self.get_unprocessed_count()
+        if unprocessed_count is None:
+            return 'Results may lag behind, the history file is still being read.'
+        return f'Results lag by {unprocessed_count} unprocessed commands.'
+
+    def report_lag(self, will_write_history: bool) -> None:
+        """Print how far behind the results are.
+
+        When the caller is about to write to the history file this waits for the processor,
+        which may still rewrite that file.
+        """
+        print(self.get_lag_message())
+        if will_write_history:
+            self.join()
+
+    def _on_progress(self, written: int, total: int) -> None:
+        self._written_commands = written
+        self._total_commands = total
+
+    def _run(self) -> None:
+        store = SqlCommandStore(self._db_file_path)
+        try:
+            store.enable_write_ahead_log()
+            history_processor = HistoryProcessor(store, self._history_file_path,
+                                                 self._save_directory, self._threshold,
+                                                 self._on_progress, verbose=False)
+            history_processor.process_history_file()
+            history_processor.update_history_file()
+            if self._total_commands is None:
+                # Under the threshold, nothing had to be written.
+                self._total_commands = 0
+        except Exception as error:
+            self._error = error
+        finally:
+            store.close()
+
+
+@dataclass
+class ParsedHistorySource:
+    """The unread commands of one history file, aggregated by command and directory."""
+    history_file_path: str
+    file_type: HistoryFileType
+    # Including the commands the ignore rules dropped.
+    unread_count: int
+    # (command, directory context) -> (times seen, last used)
+    commands: Dict[Tuple[str, Optional[str]], Tuple[int, float]]
+    read_end: 'HistoryReadEnd'
+
+
+@dataclass(frozen=True)
+class HistoryReadEnd:
+    """Where a read of a history file ended, the next read continues from there."""
+    byte_offset: int
+    # The last commands before byte_offset, they are looked for if the file was rewritten.
+    anchor: List[str]
+
+
+@dataclass
+class UnreadHistory:
+    """The commands of a history file that weren't ingested yet."""
+    file_type: HistoryFileType
+    commands: List[CommandAndContext]
+    read_end: HistoryReadEnd
 
 
 def create_ignore_rule(src_file: str) -> IgnoreRules:
@@ -138,6 +280,15 @@ def print_command(index: int, command: Command,
         print(BColors.FAIL + "Command context/info: " + info_str + BColors.ENDC)
 
 
+def print_primary_command_stats(stats: List[PrimaryCommandStats]) -> None:
+    """Pretty print the usage of each primary command."""
+    for index, stat in enumerate(stats, 1):
+        last_used = time.strftime('%Y-%m-%d %H:%M', time.localtime(stat.last_used))
+        print(f'{BColors.HEADER}({index}): {BColors.YELLOW}{stat.primary_command}'
+              f'{BColors.OKBLUE} --count:{stat.total_count} --variants:{stat.distinct_variants}'
+              f' --last used:{last_used}{BColors.ENDC}')
+
+
 def _highlight_term_in_string(highlight_str: str, term: str) -> str:
     return highlight_str.replace(term, f'{BColors.OKGREEN}{term}{BColors.YELLOW}')
 
@@ -147,6 +298,13 @@ def _create_indexed_highlighted_print_string(index: int, command_str: str, comma
            f'--count:{command.get_count_seen()}{BColors.ENDC}'
 
 
+def get_history_file_state(history_file_path: str) -> Optional[HistoryFileState]:
+    try:
+        return HistoryFileState.from_stat(os.stat(history_file_path))
+    except OSError:
+        return None
+
+
 def get_string_file_lines(src_file: str) -> List[str]:
     unprocessed_lines: List = []
     tmp_hist_file = src_file + '.tmp'
@@ -162,6 +320,240 @@ def get_string_file_lines(src_file: str) -> List[str]:
     return unprocessed_lines
 
 
+def get_file_bytes(src_file: str) -> bytes:
+    with open(src_file, 'rb') as hist_file:
+        return hist_file.read()
+
+
+def get_history_file_type(history_lines: List[str]) -> HistoryFileType:
+    if history_lines and history_lines[0] == CUSTOM_HIST_HEAD:
+        return HistoryFileType.CUSTOM
+    return HistoryFileType.STANDARD
+
+
+def mark_history_file_processed(history_file_path: str,
+                                file_type: HistoryFileType,
+                                read_end: HistoryReadEnd) -> HistoryReadEnd:
+    """Mark the commands read up to read_end as processed, returns where the next read starts.
+
+    A processed marker is appended to a standard history file. The custom history file is left
+    as is, the shell hook may be appending to it, until enough of it was read to compact it.
+    """
+    if file_type == HistoryFileType.STANDARD:
+        with open(history_file_path, "a") as myfile:
+            already_read = myfile.tell() == read_end.byte_offset
+            myfile.write(f'{PROCESSED_TO_TAG}\n')
+        if already_read:
+            # Nothing was appended since the read, the marker doesn't need to be read again.
+            return HistoryReadEnd(read_end.byte_offset + len(PROCESSED_TO_TAG) + 1,
+                                  read_end.anchor)
+    elif read_end.byte_offset >= CUSTOM_HISTORY_COMPACT_SIZE:
+        compact_custom_history_file(history_file_path, read_end.byte_offset)
+        return HistoryReadEnd(len(CUSTOM_HIST_HEAD), [])
+    return read_end
+
+
+def compact_custom_history_file(history_file_path: str, byte_offset: int) -> None:
+    """Drop the lines before byte_offset from the custom history file without losing appends.
+
+    The file is never truncated. A new file with the header and the unread lines replaces it
+    with an atomic rename so the shell hook always appends to a whole file. Hooks that opened
+    the old file before it was replaced can still append to it, it is read until it stopped
+    growing for CUSTOM_HISTORY_SETTLE_SECONDS and what they wrote is copied to the new file.
+    """
+    swap_file_path = history_file_path + '.swap'
+    with open(history_file_path, 'rb') as history_file:
+        history_file.seek(byte_offset)
+        with open(swap_file_path, 'wb') as swap_file:
+            swap_file.write(CUSTOM_HIST_HEAD.encode('utf-8'))
+            swap_file.write(history_file.read())
+        shutil.copymode(history_file_path, swap_file_path)
+        os.replace(swap_file_path, history_file_path)
+        settled = False
+        while True:
+            late_lines = history_file.read()
+            if late_lines:
+                with open(history_file_path, 'ab') as new_history_file:
+                    new_history_file.write(late_lines)
+                settled = False
+            elif settled:
+                return
+            else:
+                time.sleep(CUSTOM_HISTORY_SETTLE_SECONDS)
+                settled = True
+
+
+def _record_history_read_end(store: SqlCommandStore,
+                             history_file_path: str,
+                             read_end: HistoryReadEnd) -> None:
+    history_file_state = get_history_file_state(history_file_path)
+    if history_file_state is None:
+        return
+    store.set_history_read_position(history_file_path, HistoryReadPosition(
+        history_file_state.device, history_file_state.inode, read_end.byte_offset,
+        len(read_end.anchor), _get_fingerprint(read_end.anchor)))
+    _record_unchanged_history_file(store, history_file_path, read_end, history_file_state)
+
+
+def _record_unchanged_history_file(store: SqlCommandStore,
+                                   history_file_path: str,
+                                   read_end: HistoryReadEnd,
+                                   history_file_state: Optional[HistoryFileState] = None) -> None:
+    if history_file_state is None:
+        history_file_state = get_history_file_state(history_file_path)
+    if history_file_state is not None and history_file_state.size == read_end.byte_offset:
+        # Nothing was appended since the read so the next run can skip the file until it is.
+        store.set_history_file_state(history_file_path, history_file_state)
+
+
+def read_unread_history(history_file_path: str,
+                        position: Optional[HistoryReadPosition]) -> UnreadHistory:
+    """Read the commands written to the history file since it was read up to position.
+
+    When it is the same file and the commands right before the position are unchanged only what
+    follows the position is read. When the file was truncated, rewritten or replaced since, the
+    last commands that were read are looked for in the whole file and only the commands after
+    their first occurrence are unread. If they are gone too, the file holds only new commands
+    and the processed marker decides as it does for a file that was never read.
+    """
+    if position is None:
+        with timing.phase(timing.PHASE_HISTORY_READ):
+            data = get_file_bytes(history_file_path)
+        with timing.phase(timing.PHASE_PARSE):
+            # The position is the byte length of the file, undecodable lines included.
+            file_type = _get_history_data_type(data[:len(CUSTOM_HIST_HEAD)])
+            if file_type == HistoryFileType.CUSTOM:
+                data = _drop_partial_line(data)
+            lines = _decode_lines(data)
+            commands = get_unread_commands(lines, file_type) if lines else []
+        return UnreadHistory(file_type, commands,
+                             HistoryReadEnd(len(data), _get_anchor(lines, HISTORY_ANCHOR_LINES)))
+    with timing.phase(timing.PHASE_HISTORY_READ):
+        with open(history_file_path, 'rb') as history_file:
+            stat_result = os.fstat(history_file.fileno())
+            same_file = position.byte_offset <= stat_result.st_size and \
+                (position.device, position.inode) == (stat_result.st_dev, stat_result.st_ino)
+            read_start = max(0, position.byte_offset - HISTORY_ANCHOR_WINDOW_SIZE) \
+                if same_file else 0
+            history_file.seek(read_start)
+            data = history_file.read()
+            if read_start:
+                history_file.seek(0)
+                file_head = history_file.read(len(CUSTOM_HIST_HEAD))
+            else:
+                file_head = data[:len(CUSTOM_HIST_HEAD)]
+    file_type = _get_history_data_type(file_head)
+    with timing.phase(timing.PHASE_PARSE):
+        if file_type == HistoryFileType.CUSTOM:
+            data = _drop_partial_line(data)
+        if same_file:
+            read_lines = _decode_lines(data[:position.byte_offset - read_start])
+            if read_start:
+                # The window most likely starts in the middle of a line.
+                read_lines = read_lines[1:]
+            if _get_fingerprint(_get_anchor(read_lines, position.anchor_lines)) == \
+                    position.fingerprint:
+                # Only appended to since.
+                unread_lines = _decode_lines(data[position.byte_offset - read_start:])
+                return UnreadHistory(
+                    file_type, _get_line_commands(unread_lines, file_type), HistoryReadEnd(
+                        read_start + len(data),
+                        _get_anchor(read_lines + unread_lines, HISTORY_ANCHOR_LINES)))
+    if read_start:
+        # Rewritten in place, the anchor can be anywhere in the file.
+        with timing.phase(timing.PHASE_HISTORY_READ):
+            with open(history_file_path, 'rb') as history_file:
+                data = history_file.read()
+        if file_type == HistoryFileType.CUSTOM:
+            data = _drop_partial_line(data)
+    with timing.phase(timing.PHASE_PARSE):
+        lines = _decode_lines(data)
+        anchor_end = _find_anchor_end(lines, position)
+        if anchor_end is not None:
+            commands = _get_line_commands(lines[anchor_end:], file_type)
+        else:
+            commands = get_unread_commands(lines, file_type) if lines else []
+    return UnreadHistory(file_type, commands,
+                         HistoryReadEnd(len(data), _get_anchor(lines, HISTORY_ANCHOR_LINES)))
+
+
+def _get_history_data_type(file_head: bytes) -> HistoryFileType:
+    if file_head == CUSTOM_HIST_HEAD.encode('utf-8'):
+        return HistoryFileType.CUSTOM
+    return HistoryFileType.STANDARD
+
+
+def _drop_partial_line(data: bytes) -> bytes:
+    # The shell hook may still be writing the last line or record, it is read once it is whole.
+    data = data[:data.rfind(b'\n') + 1]
+    record_start = data.rfind(CUSTOM_HIST_RECORD_START.encode('utf-8'))
+    if record_start > data.rfind(CUSTOM_HIST_RECORD_END.encode('utf-8')):
+        data = data[:record_start]
+    return data
+
+
+def _decode_lines(data: bytes) -> List[str]:
+    decoded_lines = [_try_decode_line(x) for x in io.BytesIO(data).readlines()]
+    return _join_framed_records([x for x in decoded_lines if x])
+
+
+def _join_framed_records(lines: List[str]) -> List[str]:
+    """Replace the lines of every framed record with a single line holding the record.
+
+    A record that isn't closed, because it is still being written or another shell's write
+    tore it, is dropped.
+    """
+    joined_lines = []
+    record_lines: Optional[List[str]] = None
+    for line in lines:
+        if line.startswith(CUSTOM_HIST_RECORD_START):
+            record_lines = []
+            line = line[len(CUSTOM_HIST_RECORD_START):]
+        if record_lines is None:
+            joined_lines.append(line)
+            continue
+        record_end = line.find(CUSTOM_HIST_RECORD_END)
+        if record_end < 0:
+            record_lines.append(line)
+            continue
+        record_lines.append(line[:record_end])
+        joined_lines.append(''.join(record_lines))
+        record_lines = None
+    return joined_lines
+
+
+def _is_history_command(line: str) -> bool:
+    line = line.strip()
+    return bool(line) and line != CUSTOM_HIST_HEAD.strip() and PROCESSED_TO_TAG not in line
+
+
+def _get_anchor(lines: List[str], count: int) -> List[str]:
+    """The last count commands of the lines."""
+    commands = [x.strip() for x in lines if _is_history_command(x)]
+    return commands[max(0, len(commands) - count):]
+
+
+def _get_fingerprint(anchor: List[str]) -> str:
+    # Hashed so that commands the ignore rules keep out of the store aren't written to it.
+    return hashlib.sha256('\n'.join(anchor).encode('utf-8')).hexdigest()
+
+
+def _find_anchor_end(lines: List[str], position: HistoryReadPosition) -> Optional[int]:
+    """The index of the line after the first occurrence of the anchor of the position.
+
+    The same commands typed again after the anchor match it too, the first occurrence is taken
+    so that they are read, at worst an earlier repeat has commands read twice.
+    """
+    if not position.anchor_lines:
+        return None
+    command_indexes = [index for index, line in enumerate(lines) if _is_history_command(line)]
+    for end in range(position.anchor_lines, len(command_indexes) + 1):
+        anchor = [lines[x].strip() for x in command_indexes[end - position.anchor_lines:end]]
+        if _get_fingerprint(anchor) == position.fingerprint:
+            return command_indexes[end - 1] + 1
+    return None
+
+
 def get_unread_commands(history_lines: List[str],
                         file_type: HistoryFileType) -> List[CommandAndContext]:
     """Read the history file and get all the unread commands."""
@@ -173,9 +565,9 @@ def get_unread_commands(history_lines: List[str],
         return _get_unread_commands_custom_file(history_lines[1:])
     for line in reversed(history_lines):
         if PROCESSED_TO_TAG in line:
-            return list(reversed(unprocessed_commands))
+            break
         unprocessed_commands.append(CommandAndContext(line.strip()))
-    return unprocessed_commands
+    return list(reversed(unprocessed_commands))
 
 
 def _try_decode_line(line: bytes) -> Optional[str]:
@@ -186,32 +578,41 @@ def _try_decode_line(line: bytes) -> Optional[str]:
 
 
 def _get_unread_commands_custom_file(file_lines: List[str]) -> List[CommandAndContext]:
-    return [CommandAndContext(y[1].strip(), y[0]) for y in
-            [x.split(CUSTOM_HIST_SEPARATOR) for x in file_lines]]
+    return _get_line_commands(_join_framed_records(file_lines), HistoryFileType.CUSTOM)
 
 
 def process_history_commands(
         store: SqlCommandStore,
         commands: List[CommandAndContext],
-        ignore_file: Optional[str] = None) -> None:
-    """Process the commands from the history file."""
-
-    output = []
-    if ignore_file:
-        ignore_rules = create_ignore_rule(ignore_file)
-    else:
-        ignore_rules = IgnoreRules()
-    # get the max count
-    current_time = time.time()
-    for command_and_context in commands:
-        current_time += 1
-        command = Command(command_str=command_and_context.command_line(),
-                          last_used=current_time,
-                          directory_context=command_and_context.directory_context())
-        if ignore_rules.is_match(command.get_unique_command_id()):
-            continue
-        store.add_command(command)
-        output.append(command.get_unique_command_id())
+        ignore_file: Optional[str] = None,
+        on_progress: Optional[Callable[[int, int], None]] = None) -> None:
+    """Process the commands from the history file.
+
+    on_progress is called with the number of commands written so far and the number to write.
+    """
+    with timing.phase(timing.PHASE_IGNORE_FILTER):
+        if ignore_file:
+            ignore_rules = create_ignore_rule(ignore_file)
+        else:
+            ignore_rules = IgnoreRules()
+        # get the max count
+        current_time = time.time()
+        kept_commands = []
+        for command_and_context in commands:
+            current_time += 1
+            command = Command(command_str=command_and_context.command_line(),
+                              last_used=current_time,
+                              directory_context=command_and_context.directory_context())
+            if ignore_rules.is_match(command.get_unique_command_id()):
+                continue
+            kept_commands.append(command)
+    with timing.phase(timing.PHASE_DB_WRITE):
+        for written, command in enumerate(kept_commands):
+            if on_progress:
+                on_progress(written, len(kept_commands))
+            store.add_command(command)
+        if on_progress:
+            on_progress(len(kept_commands), len(kept_commands))
 
 
 def get_file_path(directory_path: str) -> str:
@@ -219,25 +620,249 @@ def get_file_path(directory_path: str) -> str:
     return os.path.join(directory_path, REMEMBER_DB_FILE_NAME)
 
 
-def load_command_store(db_file_name: str) -> SqlCommandStore:
-    """Get the sql command store from the input file."""
+def load_command_store(db_file_name: str, sql_profile: bool = False,
+                       read_only: bool = False) -> SqlCommandStore:
+    """Get the sql command store from the input file, profiling its queries if asked.
+
+    Callers that only search should ask for a read only store, it is cheaper to open.
+    """
     if not os.path.exists(db_file_name):
         msg = f'db file: {db_file_name} does not exist. Please run remember_setup.py to create it.'
         raise Exception(msg)
-    return SqlCommandStore(db_file_name)
+    if sql_profile:
+        from remember.query_profiler import QueryProfiler
+        return SqlCommandStore(db_file_name, QueryProfiler(), read_only)
+    return SqlCommandStore(db_file_name, read_only=read_only)
+
+
+def report_query_profile(store: SqlCommandStore, save_directory: str) -> None:
+    """Print the profiled statements and save the query plans of the slowest ones."""
+    profiler = store.get_query_profiler()
+    if not profiler:
+        return
+    print(profiler.format_summary())
+    plans_file_path = os.path.join(save_directory, QUERY_PLANS_FILE_NAME)
+    store.write_query_plans(plans_file_path, SLOWEST_QUERY_PLAN_COUNT)
+    print(f'Query plans of the slowest statements written to: {plans_file_path}')
+
+
+def load_info_index(store: SqlCommandStore, save_directory: str) -> 'CommandInfoIndex':
+    """Load (building it if needed) the ranked command info index and attach it to the store."""
+    # Imported here so that numpy is only loaded when the ranked index is used.
+    from remember.info_index import CommandInfoIndex
+    info_index = CommandInfoIndex(os.path.join(save_directory, INFO_INDEX_FILE_NAME))
+    if not info_index.exists():
+        info_index.rebuild(store.get_info_index_documents())
+    store.set_info_index(info_index)
+    return info_index
+
+
+def _get_ignore_rule_file(save_directory: str) -> Optional[str]:
+    ignore_rule_file = os.path.join(save_directory, IGNORE_RULE_FILE_NAME)
+    return ignore_rule_file if os.path.isfile(ignore_rule_file) else None
+
+
+def has_info_index(save_directory: str) -> bool:
+    return os.path.isfile(os.path.join(save_directory, INFO_INDEX_FILE_NAME))
+
+
+def ranked_info_search(store: SqlCommandStore,
+                       save_directory: str,
+                       search_terms: List[str],
+                       max_results: int) -> List[Command]:
+    """Rank the annotated commands by TF-IDF similarity to the search terms."""
+    info_index = load_info_index(store, save_directory)
+    ranked = info_index.search(' '.join(search_terms), max_results)
+    return store.get_commands_by_rowids([row_id for row_id, _ in ranked])
 
 
 def save_last_search(file_path: str, last_search_result: List[Command]) -> None:
     if len(last_search_result) == 0:
         return
-    with open(file_path, 'w') as file_handler:
-        for search_command in last_search_result:
-            file_handler.write('%s\n' % search_command.get_unique_command_id())
+    with open(file_path, 'wb') as file_handler:
+        file_handler.write(encode_last_search(
+            [x.get_unique_command_id() for x in last_search_result]))
+
+
+def parse_history_source(history_file_path: str,
+                         ignore_rule_file: Optional[str],
+                         import_time: float,
+                         position: Optional[HistoryReadPosition] = None) -> ParsedHistorySource:
+    """Read, curate and filter the unread commands of a history file, runs in a worker process.
+
+    The commands without a timestamp of their own were typed before the file was last written,
+    they are timestamped back from then, or from import_time if that is earlier.
+    """
+    unread_history = read_unread_history(history_file_path, position)
+    ignore_rules = create_ignore_rule(ignore_rule_file) if ignore_rule_file else IgnoreRules()
+    end_time = min(os.path.getmtime(history_file_path), import_time)
+    aggregated = _aggregate_commands(unread_history.commands, ignore_rules, end_time)
+    return ParsedHistorySource(history_file_path, unread_history.file_type,
+                               len(unread_history.commands), aggregated, unread_history.read_end)
 
 
-def read_last_search(file_path: str) -> List[str]:
-    with open(file_path) as read_file:
-        return [x.strip() for x in read_file.readlines()]
+def _aggregate_commands(
+        commands: List[CommandAndContext],
+        ignore_rules: IgnoreRules,
+        end_time: float) -> Dict[Tuple[str, Optional[str]], Tuple[int, float]]:
+    """Count the curated commands that aren't ignored per directory, with their last use.
+
+    A zsh extended history command was used when its timestamp says, the others are stamped a
+    second apart in the order they were typed with the last one at end_time.
+    """
+    aggregated: Dict[Tuple[str, Optional[str]], Tuple[int, float]] = {}
+    for index, command_and_context in enumerate(commands):
+        command_line = command_and_context.command_line()
+        command_str = Command.get_curated_command(command_line)
+        if ignore_rules.is_match(command_str):
+            continue
+        last_used = end_time - (len(commands) - 1 - index)
+        history_timestamp = Command.get_history_timestamp(command_line)
+        if history_timestamp is not None:
+            last_used = min(history_timestamp, end_time)
+        key = (command_str, command_and_context.directory_context())
+        count, previous_last_used = aggregated.get(key, (0, last_used))
+        aggregated[key] = (count + 1, max(previous_last_used, last_used))
+    return aggregated
+
+
+def import_history_archive(store: SqlCommandStore,
+                           history_file_path: str,
+                           save_directory: str,
+                           chunk_size: int = DEFAULT_IMPORT_CHUNK_SIZE) -> int:
+    """Import a history file of any size chunk by chunk, resuming where the last import stopped.
+
+    Only one chunk of lines is in memory at a time. Every chunk is stored in its own
+    transaction together with the offset it ends at, so an interrupted import continues after
+    the last stored chunk. The file isn't marked as processed, archives are left untouched.
+    The commands without a timestamp of their own are stamped back from when the file was last
+    written, a second per line left after them. Returns the number of commands read.
+    """
+    stat_result = os.stat(history_file_path)
+    checkpoint = store.get_history_import_checkpoint(history_file_path)
+    if checkpoint is None or checkpoint.byte_offset > stat_result.st_size or \
+            (checkpoint.device, checkpoint.inode) != (stat_result.st_dev, stat_result.st_ino):
+        # Never imported or replaced since.
+        checkpoint = HistoryImportCheckpoint(
+            history_file_path, stat_result.st_dev, stat_result.st_ino, 0)
+    ignore_rule_file = _get_ignore_rule_file(save_directory)
+    ignore_rules = create_ignore_rule(ignore_rule_file) if ignore_rule_file else IgnoreRules()
+    end_time = min(stat_result.st_mtime, time.time())
+    commands_read = 0
+    with open(history_file_path, 'rb') as history_file:
+        file_type = HistoryFileType.STANDARD
+        if history_file.read(len(CUSTOM_HIST_HEAD)) == CUSTOM_HIST_HEAD.encode('utf-8'):
+            file_type = HistoryFileType.CUSTOM
+        history_file.seek(checkpoint.byte_offset)
+        with timing.phase(timing.PHASE_HISTORY_READ):
+            lines_left = _count_lines(history_file, chunk_size)
+        history_file.seek(checkpoint.byte_offset)
+        # The start of a line that continues in the next chunk.
+        remainder = b''
+        while True:
+            with timing.phase(timing.PHASE_HISTORY_READ):
+                chunk = history_file.read(chunk_size)
+            if chunk:
+                chunk = remainder + chunk
+                lines_end = len(_drop_partial_line(chunk))
+                remainder = chunk[lines_end:]
+                chunk = chunk[:lines_end]
+                if not chunk:
+                    continue
+            elif remainder:
+                # The last line has no line ending.
+                chunk, remainder = remainder, b''
+            else:
+                return commands_read
+            with timing.phase(timing.PHASE_PARSE):
+                commands = _get_line_commands(_decode_lines(chunk), file_type)
+                lines_left -= chunk.count(b'\n')
+                aggregated = _aggregate_commands(commands, ignore_rules, end_time - lines_left)
+            checkpoint = HistoryImportCheckpoint(
+                history_file_path, checkpoint.device, checkpoint.inode,
+                checkpoint.byte_offset + len(chunk))
+            with timing.phase(timing.PHASE_DB_WRITE):
+                store.add_commands(_create_commands(aggregated), checkpoint)
+            commands_read += len(commands)
+
+
+def _count_lines(history_file: BinaryIO, chunk_size: int) -> int:
+    """The line endings from the current position of the file to its end."""
+    line_count = 0
+    while True:
+        chunk = history_file.read(chunk_size)
+        if not chunk:
+            return line_count
+        line_count += chunk.count(b'\n')
+
+
+def _get_line_commands(lines: List[str], file_type: HistoryFileType) -> List[CommandAndContext]:
+    """The commands of the lines, skipping the header, processed markers and malformed lines."""
+    commands = []
+    for line_str in lines:
+        if not _is_history_command(line_str):
+            continue
+        if file_type == HistoryFileType.STANDARD:
+            commands.append(CommandAndContext(line_str.strip()))
+            continue
+        split_line = line_str.split(CUSTOM_HIST_SEPARATOR, 1)
+        if len(split_line) == 2:
+            commands.append(CommandAndContext(split_line[1].strip(), split_line[0]))
+    return commands
+
+
+def _create_commands(
+        aggregated: Dict[Tuple[str, Optional[str]], Tuple[int, float]]) -> List[Command]:
+    """The aggregated commands in the order they were last used."""
+    commands = [Command(command_str, last_used, count, directory_context=directory)
+                for (command_str, directory), (count, last_used) in aggregated.items()]
+    return sorted(commands, key=lambda x: x.last_used_time())
+
+
+def process_history_sources(store: SqlCommandStore,
+                            history_file_paths: List[str],
+                            save_directory: str,
+                            max_workers: Optional[int] = None) -> int:
+    """Ingest several history files, parsed in parallel and written in one transaction.
+
+    Files that don't exist or didn't change since they were last ingested are skipped. Returns
+    the number of distinct commands written.
+    """
+    sources = []
+    positions = []
+    for history_file_path in history_file_paths:
+        if not os.path.isfile(history_file_path):
+            print(f'Skipping {history_file_path}, it does not exist.')
+            continue
+        history_file_state = get_history_file_state(history_file_path)
+        if history_file_state != store.get_history_file_state(history_file_path):
+            sources.append(history_file_path)
+            positions.append(store.get_history_read_position(history_file_path))
+    ignore_rule_file = _get_ignore_rule_file(save_directory)
+    import_time = time.time()
+    with timing.phase(timing.PHASE_PARSE):
+        if len(sources) > 1 and max_workers != 1:
+            with ProcessPoolExecutor(max_workers) as executor:
+                parsed_sources = list(executor.map(
+                    parse_history_source, sources, repeat(ignore_rule_file), repeat(import_time),
+                    positions))
+        else:
+            parsed_sources = [parse_history_source(x, ignore_rule_file, import_time, y)
+                              for x, y in zip(sources, positions)]
+    merged: Dict[Tuple[str, Optional[str]], Tuple[int, float]] = {}
+    for parsed_source in parsed_sources:
+        for key, (count, last_used) in parsed_source.commands.items():
+            merged_count, merged_last_used = merged.get(key, (0, last_used))
+            merged[key] = (merged_count + count, max(merged_last_used, last_used))
+    with timing.phase(timing.PHASE_DB_WRITE):
+        store.add_commands(_create_commands(merged))
+    for parsed_source in parsed_sources:
+        read_end = parsed_source.read_end
+        if parsed_source.unread_count:
+            read_end = mark_history_file_processed(
+                parsed_source.history_file_path, parsed_source.file_type, read_end)
+        _record_history_read_end(store, parsed_source.history_file_path, read_end)
+    return len(merged)
 
 
 def generate_store_from_args(history_file_path: str, save_directory: str) -> None:
@@ -253,3 +878,28 @@ def start_history_processing(
     history_processor = HistoryProcessor(store, history_file_path, save_directory, threshold)
     history_processor.process_history_file()
     history_processor.update_history_file()
+
+
+def _restore_journal_mode(store: SqlCommandStore, journal_mode: str) -> None:
+    if journal_mode != store.get_journal_mode() and not store.set_journal_mode(journal_mode):
+        print(f'The store stays in {store.get_journal_mode()} mode, another remember command '
+              'still has it open.')
+
+
+def start_background_history_processing(
+        store: SqlCommandStore,
+        history_file_path: str,
+        save_directory: str,
+        threshold: int = 100) -> BackgroundHistoryProcessor:
+    """Start processing the history file into the store's file without waiting for it.
+
+    The store file is switched to WAL for the run and back to its journal mode on join, unless
+    another connection still has it open then.
+    """
+    journal_mode = store.get_journal_mode()
+    store.enable_write_ahead_log()
+    history_processor = BackgroundHistoryProcessor(
+        store.get_db_file_path(), history_file_path, save_directory, threshold,
+        lambda: _restore_journal_mode(store, journal_mode))
+    history_processor.start()
+    return history_processor
@@ -3,10 +3,39 @@ import os
 DEFAULT_REMEMBER_SAVE_DIR = os.path.expanduser("~/.remember3")
 CUSTOM_HISTORY_FILE_PATH = os.path.join(DEFAULT_REMEMBER_SAVE_DIR, '.histfile')
 
+# Width of the usage buckets and unit of the retention ages.
+SECONDS_PER_DAY = 24 * 60 * 60
+# Defaults of the retention policy, here so that parsing the arguments doesn't load the store.
+DEFAULT_SINGLE_USE_MAX_AGE_DAYS = 90.0
+DEFAULT_MAX_CONTEXTS_PER_DIRECTORY = 500
+DEFAULT_BATCH_SIZE = 1000
+# Bytes read and stored per transaction by the chunked import of history archives.
+DEFAULT_IMPORT_CHUNK_SIZE = 8 * 1024 * 1024
+# How the installed shell hook gets the last command, with shell builtins or by forking tail.
+# The buffered hook also keeps the commands in the shell and writes them every few prompts.
+HOOK_STYLE_BUILTIN = 'builtin'
+HOOK_STYLE_BUFFERED = 'buffered'
+HOOK_STYLE_TAIL = 'tail'
+HOOK_STYLES = [HOOK_STYLE_BUILTIN, HOOK_STYLE_BUFFERED, HOOK_STYLE_TAIL]
+# Put before the commands that read the context file when the buffered hook is installed.
+FLUSH_HOOK_BUFFER = '_remember_flush; '
+
 ALIASES = """
-alias re='python3 {remember_home}/remember_main.py {save_dir}'
-alias lh='python3 {remember_home}/local_history.py -q'
+alias re='{flush}python3 {remember_home}/remember_main.py {save_dir}'
+alias lh='{flush}python3 {remember_home}/local_history.py -q'
 alias rex='python3 {remember_home}/execute_last.py'
-alias rei='python3 {remember_home}/remember_main.py -e {save_dir}'
-alias ure='python3 {remember_home}/update_store.py {save_dir}'
+alias rei='{flush}python3 {remember_home}/remember_main.py -e {save_dir}'
+alias ure='{flush}python3 {remember_home}/update_store.py {save_dir}'
 """
+
+
+class BColors(object):
+    HEADER = '\033[95m'
+    OKBLUE = '\033[94m'
+    OKGREEN = '\033[92m'
+    YELLOW = '\033[33m'
+    WARNING = '\033[93m'
+    FAIL = '\033[91m'
+    ENDC = '\033[0m'
+    BOLD = '\033[1m'
+    UNDERLINE = '\033[4m'
@@ -0,0 +1,129 @@
+"""
+This module scores commands against a fuzzy (fzf style) query.
+
+Every query term has to appear as a subsequence of a command for it to match. Commands
+are cheaply prefiltered by the store and the survivors are scored here in batches using
+NumPy so that a large store stays interactive.
+"""
+import heapq
+from typing import List, Sequence, Tuple
+
+import numpy as np
+
+SCORE_MATCH = 16.0
+BONUS_BOUNDARY = 8.0
+BONUS_CONSECUTIVE = 12.0
+PENALTY_GAP = 1.0
+BOUNDARY_CHARS = ' /-_.:=;|,'
+# Commands longer than this are truncated before scoring.
+MAX_SCORED_WIDTH = 256
+BATCH_SIZE = 4096
+
+# (score, count_seen, last_used, index) where index refers to the candidate list.
+ScoredCandidate = Tuple[float, int, float, int]
+
+_ASCII_BOUNDARY_TABLE = np.zeros(128, dtype=bool)
+_ASCII_BOUNDARY_TABLE[[ord(x) for x in BOUNDARY_CHARS]] = True
+
+
+def is_case_sensitive(terms: List[str]) -> bool:
+    """Smart case: the search is only case sensitive when a term has an upper case letter."""
+    return any(term != term.lower() for term in terms)
+
+
+def top_k_matches(terms: List[str],
+                  candidates: Sequence[str],
+                  count_seen: Sequence[int],
+                  last_used: Sequence[float],
+                  k: int) -> List[ScoredCandidate]:
+    """Score the candidates and return the best k, best first.
+
+    Ties on score are broken by how often and how recently the command was used.
+    """
+    terms = [term for term in terms if term]
+    if k <= 0 or not candidates:
+        return []
+    case_sensitive = is_case_sensitive(terms)
+    heap: List[ScoredCandidate] = []
+    for start in range(0, len(candidates), BATCH_SIZE):
+        batch = candidates[start:start + BATCH_SIZE]
+        scores = score_candidates(terms, batch, case_sensitive)
+        for offset in _best_offsets(scores, k):
+            index = start + int(offset)
+            entry = (float(scores[offset]), count_seen[index], last_used[index], -index)
+            if len(heap) < k:
+                heapq.heappush(heap, entry)
+            elif entry > heap[0]:
+                heapq.heapreplace(heap, entry)
+    return [(score, count, used, -index)
+            for score, count, used, index in sorted(heap, reverse=True)]
+
+
+def _best_offsets(scores: np.ndarray, k: int) -> np.ndarray:
+    """Offsets of the matching scores that could make it into the top k, ties included."""
+    matched = np.flatnonzero(np.isfinite(scores))
+    if len(matched) <= k:
+        return matched
+    kth_best = np.partition(scores[matched], len(matched) - k)[len(matched) - k]
+    return matched[scores[matched] >= kth_best]
+
+
+def score_candidates(terms: List[str], candidates: Sequence[str],
+                     case_sensitive: bool = True) -> np.ndarray:
+    """Return the fuzzy score for each candidate, -inf when a term does not match."""
+    if not case_sensitive:
+        terms = [term.lower() for term in terms]
+        candidates = [candidate.lower() for candidate in candidates]
+    codes = _encode_candidates(candidates)
+    total = np.zeros(len(candidates), dtype=np.float64)
+    if codes.shape[1] == 0:
+        return total if not terms else np.full(len(candidates), -np.inf)
+    boundary = _boundary_mask(codes)
+    for term in terms:
+        total += _score_term(term, codes, boundary)
+    return total
+
+
+def _encode_candidates(candidates: Sequence[str]) -> np.ndarray:
+    """Encode the candidates as a (n, width) array of code points padded with zeros."""
+    width = min(max((len(x) for x in candidates), default=0), MAX_SCORED_WIDTH)
+    if width == 0:
+        return np.zeros((len(candidates), 0), dtype=np.uint32)
+    as_unicode = np.array([x[:width] for x in candidates], dtype=f'<U{width}')
+    return as_unicode.view(np.uint32).reshape(len(candidates), width)
+
+
+def _boundary_mask(codes: np.ndarray) -> np.ndarray:
+    """True where a character starts a word (start of string or after a separator)."""
+    boundary = np.ones(codes.shape, dtype=bool)
+    previous = codes[:, :-1]
+    boundary[:, 1:] = _ASCII_BOUNDARY_TABLE[np.minimum(previous, 127)] & (previous < 128)
+    return boundary
+
+
+def _score_term(term: str, codes: np.ndarray, boundary: np.ndarray) -> np.ndarray:
+    """Best subsequence alignment score of term in every row of codes.
+
+    scores[n, j] holds the best score of the term prefix processed so far when its last
+    character is matched at column j. The gap penalty is linear in the number of skipped
+    characters so the best predecessor can be found with a running maximum.
+    """
+    width = codes.shape[1]
+    positions = np.arange(width, dtype=np.float64)
+    char_scores = SCORE_MATCH + BONUS_BOUNDARY * boundary
+    scores = None
+    for char in term:
+        matched = codes == ord(char)
+        if scores is None:
+            best_previous = np.zeros(codes.shape, dtype=np.float64)
+        else:
+            consecutive = np.full(codes.shape, -np.inf)
+            consecutive[:, 1:] = scores[:, :-1] + BONUS_CONSECUTIVE
+            running_max = np.maximum.accumulate(scores + PENALTY_GAP * positions, axis=1)
+            gapped = np.full(codes.shape, -np.inf)
+            gapped[:, 2:] = running_max[:, :-2] - PENALTY_GAP * (positions[2:] - 1)
+            best_previous = np.maximum(consecutive, gapped)
+        scores = np.where(matched, best_previous + char_scores, -np.inf)
+    if scores is None:
+        return np.zeros(codes.shape[0], dtype=np.float64)
+    return scores.max(axis=1)
@@ -1,7 +1,17 @@
 import argparse
 import os
+import re
+import time
+from datetime import datetime
 
-from remember.constants import CUSTOM_HISTORY_FILE_PATH
+from remember.constants import CUSTOM_HISTORY_FILE_PATH, DEFAULT_BATCH_SIZE, \
+    DEFAULT_MAX_CONTEXTS_PER_DIRECTORY, DEFAULT_SINGLE_USE_MAX_AGE_DAYS, \
+    DEFAULT_IMPORT_CHUNK_SIZE, HOOK_STYLE_BUILTIN, HOOK_STYLES
+from remember.timing import TIMINGS_JSON, TIMINGS_TEXT
+
+# Units of the relative times, ex: 30m, 12h, 7d, 2w.
+TIME_UNIT_SECONDS = {'m': 60, 'h': 60 * 60, 'd': 24 * 60 * 60, 'w': 7 * 24 * 60 * 60}
+_RELATIVE_TIME_PATTERN = re.compile(r'(\d+(?:\.\d+)?)([mhdw])')
 
 
 def setup_for_execute_last() -> argparse.Namespace:
@@ -12,6 +22,7 @@ def setup_for_execute_last() -> argparse.Namespace:
         "index",
         type=int,
         help="The index for the command to re-execute")
+    add_profile(parser)
     return parser.parse_args()
 
 
@@ -28,6 +39,8 @@ def setup_args_for_update() -> argparse.Namespace:
         "--delete",
         help="Delete mode where you able to delete commands from the store.",
         action="store_true")
+    add_timings(parser)
+    add_profile(parser)
     add_required_terms(parser, False)
     return parser.parse_args()
 
@@ -40,7 +53,32 @@ def setup_args_for_search() -> argparse.Namespace:
         "--execute",
         help="Execute the searched commands.",
         action="store_true")
-    add_required_terms(parser, True)
+    parser.add_argument(
+        "-i",
+        "--incremental",
+        help="Refine the results as you type and execute the chosen command.",
+        action="store_true")
+    parser.add_argument(
+        "-r",
+        "--ranked",
+        help="Rank the commands you added info to by how well the info matches the terms.",
+        action="store_true")
+    parser.add_argument(
+        "-k",
+        "--tokens",
+        help="Match whole tokens, the first term is the primary command and the rest are "
+             "arguments. ex: -k -- docker --rm",
+        action="store_true")
+    parser.add_argument(
+        "--stats",
+        help="Show your most used primary commands, or the usage of the primary command "
+             "given as the query.",
+        action="store_true")
+    add_background(parser)
+    add_time_range(parser)
+    add_timings(parser)
+    add_profile(parser)
+    add_required_terms(parser, True, '*')
     return parser.parse_args()
 
 
@@ -51,12 +89,40 @@ def setup_args_for_setup() -> argparse.Namespace:
         "--rc_file",
         required=False,
         help="The path to you bash or zsh rc file.")
+    parser.add_argument(
+        "--hook_style",
+        choices=HOOK_STYLES,
+        default=HOOK_STYLE_BUILTIN,
+        help="How the prompt hook reads the last command. builtin doesn't fork a process on "
+             "every prompt, tail is the hook of older installs.")
+    add_profile(parser)
     return parser.parse_args()
 
 
 def setup_args_for_generate() -> argparse.Namespace:
     parser = argparse.ArgumentParser()
-    add_history_arg_to_parser(parser)
+    parser.add_argument(
+        "-p",
+        "--history_file_path",
+        action="append",
+        help="A history file to read, repeat it for every source. "
+             "ex: -p ~/.bash_history -p ~/.zsh_history")
+    parser.add_argument(
+        "-j",
+        "--jobs",
+        type=int,
+        help="The number of worker processes parsing the history files, one per CPU by default.")
+    parser.add_argument(
+        "-c",
+        "--chunked",
+        help="Import large history archives a chunk at a time, an interrupted import resumes "
+             "where it stopped. The files aren't marked as processed.",
+        action="store_true")
+    parser.add_argument(
+        "--chunk_mb",
+        type=float,
+        default=DEFAULT_IMPORT_CHUNK_SIZE / (1024 * 1024),
+        help="The megabytes read and stored per transaction by --chunked.")
     add_save_dir(parser)
     return parser.parse_args()
 
@@ -77,6 +143,44 @@ def setup_args_for_local_history() -> argparse.Namespace:
         "--execute",
         help="Execute the searched commands.",
         action="store_true")
+    parser.add_argument(
+        "-r",
+        "--recursive",
+        help="Include the commands run in the directories below the current one.",
+        action="store_true")
+    add_background(parser)
+    add_time_range(parser)
+    add_timings(parser)
+    add_profile(parser)
+    return parser.parse_args()
+
+
+def setup_args_for_compact() -> argparse.Namespace:
+    parser = argparse.ArgumentParser()
+    add_save_dir(parser)
+    parser.add_argument(
+        "-d",
+        "--days",
+        type=float,
+        default=DEFAULT_SINGLE_USE_MAX_AGE_DAYS,
+        help="Delete the commands seen only once that weren't used for this many days.")
+    parser.add_argument(
+        "-c",
+        "--max_contexts",
+        type=int,
+        default=DEFAULT_MAX_CONTEXTS_PER_DIRECTORY,
+        help="The maximum number of commands remembered per directory.")
+    parser.add_argument(
+        "-a",
+        "--include_annotated",
+        help="Also delete the old commands that have command info.",
+        action="store_true")
+    parser.add_argument(
+        "-b",
+        "--batch_size",
+        type=int,
+        default=DEFAULT_BATCH_SIZE,
+        help="The number of rows deleted per transaction.")
     return parser.parse_args()
 
 
@@ -99,9 +203,59 @@ def add_search(parser: argparse.ArgumentParser) -> None:
         "--startswith",
         help="Show only commands that strictly start with input command.",
         action="store_true")
+    parser.add_argument(
+        "-f",
+        "--fuzzy",
+        help="Fuzzy search where every term only has to appear in order, ex: 'gco mstr'.",
+        action="store_true")
+    parser.add_argument(
+        "--sql_profile",
+        help="Profile the SQL statements, print a summary and save the slowest query plans "
+             "in the save directory.",
+        action="store_true")
     add_result_count_max(parser)
 
 
+def add_background(parser: argparse.ArgumentParser) -> None:
+    parser.add_argument(
+        "-b",
+        "--background",
+        help="Search right away while the new history is stored in the background, the "
+             "results say how many commands they lag by. The store uses the write-ahead log "
+             "while it runs and goes back to its journal mode after.",
+        action="store_true")
+
+
+def add_time_range(parser: argparse.ArgumentParser) -> None:
+    parser.add_argument(
+        "--since",
+        type=parse_time,
+        help="Only the commands used since then, ex: 7d, 12h or 2026-01-01. Without a query "
+             "this lists your most used commands in that window.")
+    parser.add_argument(
+        "--before",
+        type=parse_time,
+        help="Only the commands last used before then, ex: 30d or 2026-01-01. Without a query "
+             "this lists your most used commands last used before then.")
+
+
+def add_timings(parser: argparse.ArgumentParser) -> None:
+    parser.add_argument(
+        "--timings",
+        nargs='?',
+        const=TIMINGS_TEXT,
+        choices=[TIMINGS_TEXT, TIMINGS_JSON],
+        help="Print how long each phase took, as a table or as json.")
+
+
+def add_profile(parser: argparse.ArgumentParser) -> None:
+    parser.add_argument(
+        "--profile",
+        help="Run under cProfile and tracemalloc and save the .prof file and the top "
+             "allocations in the save directory.",
+        action="store_true")
+
+
 def add_save_dir(parser: argparse.ArgumentParser) -> None:
     parser.add_argument(
         "-s"
@@ -119,11 +273,24 @@ def add_result_count_max(parser: argparse.ArgumentParser) -> None:
         help="the maximum number of returned results you want to see.")
 
 
-def add_required_terms(parser: argparse.ArgumentParser, add_history_arg: bool = False) -> None:
+def add_required_terms(parser: argparse.ArgumentParser, add_history_arg: bool = False,
+                       nargs: str = '+') -> None:
     add_save_dir(parser)
     if add_history_arg:
         add_history_arg_to_parser(parser)
     parser.add_argument(
         "query",
-        nargs='+',
+        nargs=nargs,
         help="The term to search for. ex: 'git pull', git")
+
+
+def parse_time(value: str) -> float:
+    """Parse a time ago (ex: '7d', '12h') or a date (ex: '2026-01-01') into a timestamp."""
+    match = _RELATIVE_TIME_PATTERN.fullmatch(value)
+    if match:
+        return time.time() - float(match.group(1)) * TIME_UNIT_SECONDS[match.group(2)]
+    try:
+        return datetime.fromisoformat(value).timestamp()
+    except ValueError:
+        raise argparse.ArgumentTypeError(
+            f"invalid time '{value}', ex: 30m, 12h, 7d, 2w or 2026-01-01")
@@ -0,0 +1,40 @@
+"""
+This module appends the commands remember runs to the shell history file.
+
+It only depends on the standard library so that rex can use it without loading the store.
+"""
+import os
+
+# Bytes read per step when seeking backwards from the end of the history file.
+TAIL_BLOCK_SIZE = 4096
+
+
+def write_to_hist_file(history_file_path: str, command_to_write: str) -> None:
+    last_line = _get_last_line(history_file_path)
+    if last_line.startswith(":"):
+        incremented_time = _get_history_line_time(last_line) + 1
+        line_to_write = f': {incremented_time}:0;{command_to_write}'
+    else:
+        line_to_write = command_to_write
+    with open(history_file_path, "a") as history_file:
+        history_file.write(line_to_write + '\n')
+
+
+def _get_history_line_time(history_file_entry: str) -> int:
+    return int(history_file_entry.split(':')[1].strip())
+
+
+def _get_last_line(history_file_path: str) -> str:
+    """Read the last line by seeking backwards from the end, the file size doesn't matter."""
+    with open(history_file_path, 'rb') as history_file:
+        position = history_file.seek(0, os.SEEK_END)
+        tail = b''
+        # The last line starts after the last newline that isn't its own line ending.
+        line_start = -1
+        while position > 0 and line_start == -1:
+            read_size = min(TAIL_BLOCK_SIZE, position)
+            position -= read_size
+            history_file.seek(position)
+            tail = history_file.read(read_size) + tail
+            line_start = tail.rfind(b'\n', 0, len(tail) - 1)
+        return tail[line_start + 1:].decode("utf-8")
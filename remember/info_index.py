@@ -0,0 +1,134 @@
+"""
+This module holds the ranked (TF-IDF) index over the annotated commands.
+
+Only commands with command info are indexed. Each document is the command info plus the
+command tokens. The term counts are kept as a sparse CSR matrix in NumPy arrays and persisted
+next to the db file so queries run offline in milliseconds. Updating a document only touches
+that document's row, the IDF weights are computed at query time.
+"""
+import os
+import re
+from typing import Dict, Iterable, List, Tuple
+
+import numpy as np
+
+_TOKEN_PATTERN = re.compile(r'\w+')
+
+
+class CommandInfoIndex(object):
+    """Sparse TF-IDF index keyed by the remember table rowid."""
+
+    def __init__(self, index_file_path: str) -> None:
+        self._index_file_path = index_file_path
+        self._doc_ids = np.zeros(0, dtype=np.int64)
+        self._indptr = np.zeros(1, dtype=np.int64)
+        self._term_ids = np.zeros(0, dtype=np.int64)
+        self._counts = np.zeros(0, dtype=np.float64)
+        self._vocabulary: Dict[str, int] = {}
+        if os.path.isfile(index_file_path):
+            self._load()
+
+    def exists(self) -> bool:
+        """True if the index has been persisted before."""
+        return os.path.isfile(self._index_file_path)
+
+    def num_documents(self) -> int:
+        return len(self._doc_ids)
+
+    def rebuild(self, documents: Iterable[Tuple[int, str]]) -> None:
+        """Replace the whole index with the (rowid, text) documents and save it."""
+        self._doc_ids = np.zeros(0, dtype=np.int64)
+        self._indptr = np.zeros(1, dtype=np.int64)
+        self._term_ids = np.zeros(0, dtype=np.int64)
+        self._counts = np.zeros(0, dtype=np.float64)
+        self._vocabulary = {}
+        for doc_id, text in documents:
+            self._append_document(doc_id, text)
+        self.save()
+
+    def update_document(self, doc_id: int, text: str) -> None:
+        """Re-index a single document, an empty text removes it. The index is saved."""
+        self._remove_document(doc_id)
+        if tokenize(text):
+            self._append_document(doc_id, text)
+        self.save()
+
+    def remove_document(self, doc_id: int) -> None:
+        """Drop a document from the index and save it."""
+        if self._remove_document(doc_id):
+            self.save()
+
+    def search(self, query: str, limit: int) -> List[Tuple[int, float]]:
+        """Return up to limit (rowid, score) pairs ranked by cosine similarity, best first."""
+        query_term_ids = [self._vocabulary[x] for x in set(tokenize(query))
+                          if x in self._vocabulary]
+        num_docs = len(self._doc_ids)
+        if not query_term_ids or num_docs == 0:
+            return []
+        rows = np.repeat(np.arange(num_docs), np.diff(self._indptr))
+        document_frequency = np.bincount(self._term_ids, minlength=len(self._vocabulary))
+        idf = np.log((1.0 + num_docs) / (1.0 + document_frequency)) + 1.0
+        weights = (1.0 + np.log(self._counts)) * idf[self._term_ids]
+        norms = np.sqrt(np.bincount(rows, weights=weights * weights, minlength=num_docs))
+        in_query = np.isin(self._term_ids, query_term_ids)
+        dot_products = np.bincount(rows[in_query],
+                                   weights=weights[in_query] * idf[self._term_ids[in_query]],
+                                   minlength=num_docs)
+        scores = dot_products / np.maximum(norms, 1e-12)
+        matched = np.flatnonzero(scores > 0)
+        best = matched[np.argsort(-scores[matched], kind='stable')][:limit]
+        return [(int(self._doc_ids[x]), float(scores[x])) for x in best]
+
+    def save(self) -> None:
+        """Atomically write the index next to the db file."""
+        vocabulary = np.array(sorted(self._vocabulary, key=self._vocabulary.__getitem__),
+                              dtype=str)
+        tmp_file_path = self._index_file_path + '.tmp'
+        with open(tmp_file_path, 'wb') as index_file:
+            np.savez(index_file, doc_ids=self._doc_ids, indptr=self._indptr,
+                     term_ids=self._term_ids, counts=self._counts, vocabulary=vocabulary)
+        os.replace(tmp_file_path, self._index_file_path)
+
+    def _load(self) -> None:
+        with np.load(self._index_file_path) as data:
+            self._doc_ids = data['doc_ids']
+            self._indptr = data['indptr']
+            self._term_ids = data['term_ids']
+            self._counts = data['counts']
+            self._vocabulary = {term: index for index, term in enumerate(data['vocabulary'])}
+
+    def _append_document(self, doc_id: int, text: str) -> None:
+        term_counts: Dict[int, int] = {}
+        for token in tokenize(text):
+            term_id = self._vocabulary.setdefault(token, len(self._vocabulary))
+            term_counts[term_id] = term_counts.get(term_id, 0) + 1
+        if not term_counts:
+            return
+        self._doc_ids = np.append(self._doc_ids, doc_id)
+        self._term_ids = np.append(self._term_ids, list(term_counts.keys()))
+        self._counts = np.append(self._counts, list(term_counts.values())).astype(np.float64)
+        self._indptr = np.append(self._indptr, len(self._term_ids))
+
+    def _remove_document(self, doc_id: int) -> bool:
+        positions = np.flatnonzero(self._doc_ids == doc_id)
+        if len(positions) == 0:
+            return False
+        row = int(positions[0])
+        start, end = int(self._indptr[row]), int(self._indptr[row + 1])
+        self._term_ids = np.concatenate((self._term_ids[:start], self._term_ids[end:]))
+        self._counts = np.concatenate((self._counts[:start], self._counts[end:]))
+        self._indptr = np.concatenate(
+            (self._indptr[:row + 1], self._indptr[row + 2:] - (end - start)))
+        self._doc_ids = np.delete(self._doc_ids, row)
+        return True
+
+
+def tokenize(text: str) -> List[str]:
+    """Lower case word tokens with a light plural stemming."""
+    return [_stem(x) for x in _TOKEN_PATTERN.findall(text.lower())]
+
+
+def _stem(token: str) -> str:
+    if len(token) > 3 and token.endswith('s') and not token.endswith('ss'):
+        return token[:-1]
+    return token
@@ -6,7 +6,9 @@ import subprocess
 from typing import List, Optional
 
 import remember.command_store_lib as command_store
+from remember import timing
 from remember.command_store_lib import BColors, SqlCommandStore
+from remember.history_file import write_to_hist_file
 from remember.sql_store import Command
 
 
@@ -23,19 +25,22 @@ class InteractiveCommandExecutor(object):
         user_input = get_user_input('Choose command by # or type anything else to quit: ')
         value = represents_int(user_input)
         if value and value <= len(command_results) > 0:
-            command = command_results[value - 1]
-            if self._history_file_path:
-                write_to_hist_file(self._history_file_path, command.get_unique_command_id())
-            shell_env = os.getenv('SHELL')
-            selected_command = command.get_unique_command_id()
-            if not shell_env:
-                subprocess.call(selected_command, shell=True)
-            else:
-                subprocess.call([shell_env, '-i', '-c', selected_command])
+            self.execute_command(command_results[value - 1])
             return True
         else:
             return False
 
+    def execute_command(self, command: command_store.Command) -> None:
+        """Run the command in the user's shell and record it in the history file."""
+        if self._history_file_path:
+            write_to_hist_file(self._history_file_path, command.get_unique_command_id())
+        shell_env = os.getenv('SHELL')
+        selected_command = command.get_unique_command_id()
+        if not shell_env:
+            subprocess.call(selected_command, shell=True)
+        else:
+            subprocess.call([shell_env, '-i', '-c', selected_command])
+
     def command_info_interaction(self,
                                  command_results: List[command_store.Command],
                                  store: SqlCommandStore) -> bool:
@@ -110,27 +115,6 @@ def represents_int(value: str) -> Optional[int]:
         return None
 
 
-def write_to_hist_file(history_file_path: str, command_to_write: str) -> None:
-    last_line = _get_last_line(history_file_path)
-    if last_line.startswith(":"):
-        incremented_time = _get_history_line_time(last_line) + 1
-        line_to_write = f': {incremented_time}:0;{command_to_write}'
-    else:
-        line_to_write = command_to_write
-    with open(history_file_path, "a") as history_file:
-        history_file.write(line_to_write + '\n')
-
-
-def _get_history_line_time(history_file_entry: str) -> int:
-    return int(history_file_entry.split(':')[1].strip())
-
-
-def _get_last_line(history_file_path: str) -> str:
-    with open(history_file_path, 'rb') as history_file:
-        last_line_binary = history_file.readlines()[-1]
-        return last_line_binary.decode("utf-8")
-
-
 def display_and_interact_results(result: List[Command],
                                  max_return_count: int,
                                  save_dir: str,
@@ -147,5 +131,6 @@ def display_and_interact_results(result: List[Command],
         command_executor = load_user_interactor(history_file_path)
         if not command_executor.run(result):
             return 'Exit'
-    command_store.print_commands(result, query)
+    with timing.phase(timing.PHASE_RENDER):
+        command_store.print_commands(result, query)
     return None
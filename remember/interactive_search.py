@@ -0,0 +1,186 @@
+"""
+This module handles the incremental (search as you type) interactive mode.
+
+Results are refined on every keystroke. When the new query only extends the previous one the
+previous candidates are narrowed in memory, otherwise the store is queried again once typing
+pauses. A store query that is still running when the next key arrives is interrupted.
+"""
+import curses
+import sqlite3
+import time
+from typing import Callable, List, Optional, Tuple
+
+from remember.sql_store import Command, SqlCommandStore
+
+# Wait this long after a keystroke before running a query against the store.
+DEBOUNCE_MS = 60
+# Cap on the candidates pulled from the store. Truncated candidate lists can't be narrowed.
+CANDIDATE_LIMIT = 5000
+KEY_ENTER_CODES = (curses.KEY_ENTER, 10, 13)
+KEY_BACKSPACE_CODES = (curses.KEY_BACKSPACE, 127, 8)
+KEY_ESCAPE = 27
+PROMPT = '> '
+# The message of the sqlite3.OperationalError raised by an interrupted query.
+INTERRUPTED_ERROR_MESSAGE = 'interrupted'
+
+
+class IncrementalSearcher(object):
+    """Keeps the results of the previous queries so extending a query never hits the store."""
+
+    def __init__(self, store: SqlCommandStore, search_info: bool = False,
+                 candidate_limit: int = CANDIDATE_LIMIT) -> None:
+        self._store = store
+        self._search_info = search_info
+        self._candidate_limit = candidate_limit
+        # Chain of (query, candidates) where every query extends the one before it.
+        self._cache: List[Tuple[str, List[Command]]] = []
+
+    def can_narrow(self, query: str) -> bool:
+        """True if the query can be answered from memory without querying the store."""
+        return not query.split() or self._find_cached_prefix(query) is not None
+
+    def search(self, query: str) -> List[Command]:
+        """Return the commands matching all the terms of the query.
+
+        Raises sqlite3.OperationalError if the store query was interrupted.
+        """
+        terms = query.split()
+        if not terms:
+            return []
+        cached = self._find_cached_prefix(query)
+        if cached is not None:
+            cached_query, candidates = self._cache[cached]
+            del self._cache[cached + 1:]
+            if cached_query == query:
+                return candidates
+            result = [x for x in candidates if _matches_all(x, terms, self._search_info)]
+        else:
+            self._cache = []
+            result = self._store.search_commands(
+                terms, search_info=self._search_info, match_all=True,
+                limit=self._candidate_limit)
+            if len(result) >= self._candidate_limit:
+                # The store had more matches than we kept so this can't be narrowed later.
+                return result
+        self._cache.append((query, result))
+        return result
+
+    def set_interrupt_check(self, should_interrupt: Optional[Callable[[], bool]]) -> None:
+        """Interrupt running store queries whenever should_interrupt returns true."""
+        self._store.set_interrupt_check(should_interrupt)
+
+    def _find_cached_prefix(self, query: str) -> Optional[int]:
+        for index in range(len(self._cache) - 1, -1, -1):
+            cached_query = self._cache[index][0]
+            if query.startswith(cached_query) and cached_query.split():
+                return index
+        return None
+
+
+class IncrementalSearchScreen(object):
+    """Curses front end around an IncrementalSearcher."""
+
+    def __init__(self, searcher: IncrementalSearcher, initial_query: str = '') -> None:
+        self._searcher = searcher
+        self._query = initial_query
+        self._results: List[Command] = []
+        self._selected = 0
+        self._search_pending = bool(initial_query)
+        self._last_search_ms = 0.0
+
+    def run(self, stdscr) -> Optional[Command]:
+        """Run the search loop until a command is chosen (returned) or the user quits."""
+        curses.use_default_colors()
+        self._render(stdscr)
+        while True:
+            stdscr.timeout(DEBOUNCE_MS if self._search_pending else -1)
+            key = stdscr.getch()
+            if key == -1:
+                self._run_store_search(stdscr)
+            elif key in KEY_ENTER_CODES:
+                return self._results[self._selected] if self._results else None
+            elif key == KEY_ESCAPE:
+                return None
+            elif key == curses.KEY_UP:
+                self._selected = max(self._selected - 1, 0)
+            elif key == curses.KEY_DOWN:
+                self._selected = min(self._selected + 1, max(len(self._results) - 1, 0))
+            elif key in KEY_BACKSPACE_CODES:
+                self._update_query(self._query[:-1])
+            elif 32 <= key < 256:
+                self._update_query(self._query + chr(key))
+            self._render(stdscr)
+
+    def _update_query(self, query: str) -> None:
+        self._query = query
+        self._selected = 0
+        if self._searcher.can_narrow(query):
+            self._timed_search()
+            self._search_pending = False
+        else:
+            self._search_pending = True
+
+    def _run_store_search(self, stdscr) -> None:
+        if not self._search_pending:
+            return
+        self._searcher.set_interrupt_check(lambda: _is_key_pending(stdscr))
+        try:
+            self._timed_search()
+            self._search_pending = False
+        except sqlite3.OperationalError as error:
+            if str(error) != INTERRUPTED_ERROR_MESSAGE:
+                raise
+            # A newer keystroke arrived, the stale query was dropped.
+        finally:
+            self._searcher.set_interrupt_check(None)
+
+    def _timed_search(self) -> None:
+        start_time = time.perf_counter()
+        self._results = self._searcher.search(self._query)
+        self._last_search_ms = (time.perf_counter() - start_time) * 1000
+
+    def _render(self, stdscr) -> None:
+        height, width = stdscr.getmaxyx()
+        stdscr.erase()
+        status = f'{len(self._results)} matches ({self._last_search_ms:.1f} ms)'
+        if self._search_pending:
+            status += ' searching...'
+        _add_line(stdscr, 1, status, width, curses.A_DIM)
+        for row, command in enumerate(self._results[:max(height - 2, 0)]):
+            attributes = curses.A_REVERSE if row == self._selected else curses.A_NORMAL
+            _add_line(stdscr, row + 2, command.get_unique_command_id(), width, attributes)
+        _add_line(stdscr, 0, PROMPT + self._query, width, curses.A_BOLD)
+        stdscr.move(0, min(len(PROMPT) + len(self._query), width - 1))
+        stdscr.refresh()
+
+
+def run_incremental_search(store: SqlCommandStore, initial_query: str,
+                           search_info: bool = False) -> Optional[Command]:
+    """Open the incremental search screen and return the chosen command, if any."""
+    screen = IncrementalSearchScreen(IncrementalSearcher(store, search_info), initial_query)
+    return curses.wrapper(screen.run)
+
+
+def _matches_all(command: Command, terms: List[str], search_info: bool) -> bool:
+    command_str = command.get_unique_command_id()
+    info_str = (command.get_command_info() or '') if search_info else ''
+    return all(term in command_str or term in info_str for term in terms)
+
+
+def _is_key_pending(stdscr) -> bool:
+    stdscr.nodelay(True)
+    try:
+        key = stdscr.getch()
+    finally:
+        stdscr.nodelay(False)
+    if key == -1:
+        return False
+    curses.ungetch(key)
+    return True
+
+
+def _add_line(stdscr, row: int, text: str, width: int, attributes: int) -> None:
+    try:
+        stdscr.addnstr(row, 0, text, max(width - 1, 0), attributes)
+    except curses.error:
+        pass
@@ -0,0 +1,58 @@
+"""
+This module reads and writes the results of the last search that rex executes from.
+
+The file is a fixed width offset table followed by the command strings, so reading the command
+at an index is a seek into the table and a seek into the payload no matter how many results
+were saved. It only depends on the standard library to keep rex fast to start.
+"""
+import struct
+from typing import BinaryIO, List, Optional
+
+LAST_SEARCH_FILE_NAME = 'last_search_results.bin'
+_MAGIC = b'RLS1'
+# The magic and the number of commands.
+_HEADER = struct.Struct('<4sI')
+# The offset and the length of each utf-8 encoded command.
+_ENTRY = struct.Struct('<II')
+
+
+def encode_last_search(commands: List[str]) -> bytes:
+    payloads = [x.encode('utf-8') for x in commands]
+    offset = _HEADER.size + _ENTRY.size * len(payloads)
+    entries = []
+    for payload in payloads:
+        entries.append(_ENTRY.pack(offset, len(payload)))
+        offset += len(payload)
+    return _HEADER.pack(_MAGIC, len(payloads)) + b''.join(entries) + b''.join(payloads)
+
+
+def read_last_search_command(file_path: str, index: int) -> Optional[str]:
+    """The command at the 1 based index of the last search, None if there is no such result."""
+    with open(file_path, 'rb') as last_search_file:
+        count = _read_count(last_search_file)
+        if not 0 < index <= count:
+            return None
+        return _read_command(last_search_file, index - 1)
+
+
+def read_last_search(file_path: str) -> List[str]:
+    with open(file_path, 'rb') as last_search_file:
+        count = _read_count(last_search_file)
+        return [_read_command(last_search_file, x) for x in range(count)]
+
+
+def _read_count(last_search_file: BinaryIO) -> int:
+    header = last_search_file.read(_HEADER.size)
+    if len(header) < _HEADER.size:
+        return 0
+    magic, count = _HEADER.unpack(header)
+    if magic != _MAGIC:
+        raise ValueError(f'{last_search_file.name} is not a last search file')
+    return count
+
+
+def _read_command(last_search_file: BinaryIO, position: int) -> str:
+    last_search_file.seek(_HEADER.size + _ENTRY.size * position)
+    offset, length = _ENTRY.unpack(last_search_file.read(_ENTRY.size))
+    last_search_file.seek(offset)
+    return last_search_file.read(length).decode('utf-8')
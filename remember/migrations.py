@@ -0,0 +1,178 @@
+"""
+This module brings the schema of a remember store up to date.
+
+The schema version of a store is its PRAGMA user_version, stores created before it was kept
+are at version 0. The migrations newer than the store run in order, each in a transaction that
+bumps the version too, so a migration never commits without it. Every migration is idempotent,
+it creates what is missing and rebuilds what it derives, so a version 0 store that an older
+release already gave some of the side tables is upgraded in place. Opening a store that is up to
+date costs a single pragma read.
+"""
+import sqlite3
+from dataclasses import dataclass
+from typing import Callable, Dict, List, Tuple
+
+from remember.constants import SECONDS_PER_DAY
+from remember.sql_query_constants import SQL_CREATE_REMEMBER_TABLE, SQL_CREATE_DIR_TABLE, \
+    CREATE_CONTEXT_COMMAND_TABLE, CREATE_COMMAND_TOKENS_TABLE, CREATE_PRIMARY_COMMANDS_TABLE, \
+    CREATE_USAGE_BUCKETS_TABLE, CREATE_HISTORY_FILE_STATE_TABLE, \
+    CREATE_HISTORY_IMPORT_CHECKPOINTS_TABLE, CREATE_HISTORY_READ_POSITIONS_TABLE, \
+    CREATE_LAST_USED_INDEX, DIRECTORY_COLUMNS_QUERY, FOREIGN_KEY_OFF_PRAGMA, FOREIGN_KEY_PRAGMA, \
+    SELECT_LEGACY_DIRECTORIES, CREATE_MIGRATED_DIR_TABLE, INSERT_INTO_MIGRATED_DIRECTORIES, \
+    UPDATE_COMMAND_CONTEXT_DIRECTORY, DROP_LEGACY_DIR_TABLE, RENAME_MIGRATED_DIR_TABLE, \
+    SELECT_ALL_COMMAND_STRINGS, INSERT_INTO_COMMAND_TOKENS, SELECT_ALL_COMMAND_USAGE, \
+    DELETE_ALL_PRIMARY_COMMANDS, INSERT_OR_ADD_PRIMARY_COMMAND, BACKFILL_USAGE_BUCKETS, \
+    USER_VERSION_PRAGMA, SET_USER_VERSION_PRAGMA, DROP_PRIMARY_COMMANDS_DELETE_TRIGGER, \
+    HISTORY_IMPORT_CHECKPOINT_COLUMNS_QUERY, CREATE_MIGRATED_HISTORY_IMPORT_CHECKPOINTS_TABLE, \
+    COPY_HISTORY_IMPORT_CHECKPOINTS, DROP_LEGACY_HISTORY_IMPORT_CHECKPOINTS_TABLE, \
+    RENAME_MIGRATED_HISTORY_IMPORT_CHECKPOINTS_TABLE
+
+
+@dataclass(frozen=True)
+class Migration:
+    version: int
+    description: str
+    # Runs in the transaction of the migration, it must not commit.
+    apply: Callable[[sqlite3.Connection], None]
+
+
+def get_schema_version(db_conn: sqlite3.Connection) -> int:
+    return db_conn.execute(USER_VERSION_PRAGMA).fetchone()[0]
+
+
+def migrate(db_conn: sqlite3.Connection) -> List[Migration]:
+    """Run the migrations the store is missing and return them, a newer store is left alone."""
+    version = get_schema_version(db_conn)
+    pending = [x for x in MIGRATIONS if x.version > version]
+    if not pending:
+        return pending
+    # Foreign key enforcement can only be switched outside of a transaction, the directory
+    # migration drops a table the command contexts point to.
+    db_conn.execute(FOREIGN_KEY_OFF_PRAGMA)
+    try:
+        for migration in pending:
+            with db_conn:
+                db_conn.execute('BEGIN')
+                migration.apply(db_conn)
+                db_conn.execute(SET_USER_VERSION_PRAGMA.format(migration.version))
+    finally:
+        db_conn.execute(FOREIGN_KEY_PRAGMA)
+    return pending
+
+
+def _execute_script(db_conn: sqlite3.Connection, script: str) -> None:
+    """Run the statements of the script one by one, executescript would commit first."""
+    statement = ''
+    for part in script.split(';'):
+        statement += part + ';'
+        if sqlite3.complete_statement(statement):
+            if statement.strip(' \n;'):
+                db_conn.execute(statement)
+            statement = ''
+
+
+def _create(*create_scripts: str) -> Callable[[sqlite3.Connection], None]:
+    def apply(db_conn: sqlite3.Connection) -> None:
+        for create_script in create_scripts:
+            _execute_script(db_conn, create_script)
+    return apply
+
+
+def _migrate_legacy_directories(db_conn: sqlite3.Connection) -> None:
+    """Convert a directories table of full dir_path strings to the component tree.
+
+    The new rows get ids above every old one so the command contexts can be repointed
+    without clashing with the ids they still hold.
+    """
+    # sql_store runs the migrations, it can't be imported before this module is.
+    from remember.sql_store import PATH_SEPARATOR, ROOT_DIRECTORY_ID
+    columns = [row[1] for row in db_conn.execute(DIRECTORY_COLUMNS_QUERY)]
+    if 'dir_path' not in columns:
+        return
+    legacy_rows = db_conn.execute(SELECT_LEGACY_DIRECTORIES).fetchall()
+    next_id = max((row[0] for row in legacy_rows), default=0) + 1
+    tree_ids: Dict[Tuple[int, str], int] = {}
+    new_rows = []
+    context_updates = []
+    for legacy_id, dir_path in legacy_rows:
+        directory_id = ROOT_DIRECTORY_ID
+        for name in (dir_path or '').split(PATH_SEPARATOR):
+            key = (directory_id, name)
+            if key not in tree_ids:
+                tree_ids[key] = next_id
+                new_rows.append((next_id, directory_id, name))
+                next_id += 1
+            directory_id = tree_ids[key]
+        context_updates.append((directory_id, legacy_id))
+    db_conn.execute(CREATE_MIGRATED_DIR_TABLE)
+    db_conn.executemany(INSERT_INTO_MIGRATED_DIRECTORIES, new_rows)
+    db_conn.executemany(UPDATE_COMMAND_CONTEXT_DIRECTORY, context_updates)
+    db_conn.execute(DROP_LEGACY_DIR_TABLE)
+    db_conn.execute(RENAME_MIGRATED_DIR_TABLE)
+
+
+def _create_command_tokens(db_conn: sqlite3.Connection) -> None:
+    from remember.sql_store import Command, _get_command_tokens
+    _execute_script(db_conn, CREATE_COMMAND_TOKENS_TABLE)
+    rows = db_conn.execute(SELECT_ALL_COMMAND_STRINGS).fetchall()
+    db_conn.executemany(INSERT_INTO_COMMAND_TOKENS,
+                        [(token, position, row_id) for row_id, command_str in rows
+                         for token, position in _get_command_tokens(Command(command_str))])
+
+
+def _create_primary_commands(db_conn: sqlite3.Connection) -> None:
+    """The aggregate is rebuilt from scratch, adding to rows that are already there would
+    count their commands twice."""
+    from remember.sql_store import Command, PrimaryCommandStats
+    _execute_script(db_conn, CREATE_PRIMARY_COMMANDS_TABLE)
+    stats: Dict[str, PrimaryCommandStats] = {}
+    for command_str, count_seen, last_used in db_conn.execute(SELECT_ALL_COMMAND_USAGE):
+        primary_command = Command(command_str).get_primary_command()
+        if not primary_command:
+            continue
+        stat = stats.setdefault(
+            primary_command, PrimaryCommandStats(primary_command, 0, 0, last_used))
+        stat.total_count += count_seen
+        stat.distinct_variants += 1
+        stat.last_used = max(stat.last_used, last_used)
+    db_conn.execute(DELETE_ALL_PRIMARY_COMMANDS)
+    db_conn.executemany(INSERT_OR_ADD_PRIMARY_COMMAND,
+                        [(x.primary_command, x.total_count, x.distinct_variants,
+                          x.last_used) for x in stats.values()])
+
+
+def _create_usage_buckets(db_conn: sqlite3.Connection) -> None:
+    _execute_script(db_conn, CREATE_USAGE_BUCKETS_TABLE)
+    db_conn.execute(BACKFILL_USAGE_BUCKETS, (SECONDS_PER_DAY,))
+
+
+def _drop_checkpoint_line_count(db_conn: sqlite3.Connection) -> None:
+    """Rebuild the history import checkpoints without the line_count column nothing reads."""
+    columns = [row[1] for row in db_conn.execute(HISTORY_IMPORT_CHECKPOINT_COLUMNS_QUERY)]
+    if 'line_count' not in columns:
+        return
+    db_conn.execute(CREATE_MIGRATED_HISTORY_IMPORT_CHECKPOINTS_TABLE)
+    db_conn.execute(COPY_HISTORY_IMPORT_CHECKPOINTS)
+    db_conn.execute(DROP_LEGACY_HISTORY_IMPORT_CHECKPOINTS_TABLE)
+    db_conn.execute(RENAME_MIGRATED_HISTORY_IMPORT_CHECKPOINTS_TABLE)
+
+
+# Append only, a released version must keep meaning the same schema.
+MIGRATIONS = [
+    Migration(1, 'commands, directories and their contexts',
+              _create(SQL_CREATE_REMEMBER_TABLE, SQL_CREATE_DIR_TABLE,
+                      CREATE_CONTEXT_COMMAND_TABLE)),
+    Migration(2, 'directories as a tree of path components', _migrate_legacy_directories),
+    Migration(3, 'command token index', _create_command_tokens),
+    Migration(4, 'primary command aggregates', _create_primary_commands),
+    Migration(5, 'daily usage buckets', _create_usage_buckets),
+    Migration(6, 'last_used index', _create(CREATE_LAST_USED_INDEX)),
+    Migration(7, 'history file state', _create(CREATE_HISTORY_FILE_STATE_TABLE)),
+    Migration(8, 'history import checkpoints', _create(CREATE_HISTORY_IMPORT_CHECKPOINTS_TABLE)),
+    Migration(9, 'history read positions', _create(CREATE_HISTORY_READ_POSITIONS_TABLE)),
+    Migration(10, 'primary command delete trigger keyed on the primary command',
+              _create(DROP_PRIMARY_COMMANDS_DELETE_TRIGGER, CREATE_PRIMARY_COMMANDS_TABLE)),
+    Migration(11, 'history import checkpoints without the line count',
+              _drop_checkpoint_line_count),
+]
+SCHEMA_VERSION = MIGRATIONS[-1].version
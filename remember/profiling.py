@@ -0,0 +1,72 @@
+"""
+This module runs an entry point under cProfile and tracemalloc for --profile.
+
+The call profile is written as a .prof file that pstats, snakeviz and friends can read and the
+allocation report lists the source lines holding the most memory when the command finished.
+Both go into the save directory so they can be attached when reporting a slow command.
+cProfile and tracemalloc are only imported once profiling is enabled, every entry point imports
+this module and they would add to the start up of each command.
+"""
+import os
+from contextlib import contextmanager
+from typing import TYPE_CHECKING, Iterator
+
+if TYPE_CHECKING:
+    import tracemalloc
+
+PROFILE_FILE_NAME = 'remember_profile_{name}.prof'
+ALLOCATIONS_FILE_NAME = 'remember_profile_{name}_allocations.txt'
+DEFAULT_TOP_ALLOCATIONS = 25
+# Frames kept per allocation, one is enough to group them by source line and keeps the
+# overhead low.
+_TRACEMALLOC_FRAMES = 1
+
+
+@contextmanager
+def profile(enabled: bool, save_directory: str, name: str,
+            top_allocations: int = DEFAULT_TOP_ALLOCATIONS) -> Iterator[None]:
+    """Profile the with block when enabled and write the reports for the entry point name."""
+    if not enabled:
+        yield
+        return
+    import cProfile
+    import tracemalloc
+    profiler = cProfile.Profile()
+    started_tracemalloc = not tracemalloc.is_tracing()
+    if started_tracemalloc:
+        tracemalloc.start(_TRACEMALLOC_FRAMES)
+    profiler.enable()
+    try:
+        yield
+    finally:
+        profiler.disable()
+        snapshot = tracemalloc.take_snapshot()
+        _, peak_bytes = tracemalloc.get_traced_memory()
+        if started_tracemalloc:
+            tracemalloc.stop()
+        os.makedirs(save_directory, exist_ok=True)
+        profile_file_path = os.path.join(save_directory, PROFILE_FILE_NAME.format(name=name))
+        profiler.dump_stats(profile_file_path)
+        allocations_file_path = os.path.join(
+            save_directory, ALLOCATIONS_FILE_NAME.format(name=name))
+        with open(allocations_file_path, 'w', encoding='utf8') as allocations_file:
+            allocations_file.write(format_allocations(snapshot, peak_bytes, top_allocations))
+        print(f'Profile written to: {profile_file_path}')
+        print(f'Allocations written to: {allocations_file_path}')
+
+
+def format_allocations(snapshot: 'tracemalloc.Snapshot', peak_bytes: int, count: int) -> str:
+    """The count source lines holding the most memory, biggest first."""
+    import tracemalloc
+    snapshot = snapshot.filter_traces([
+        tracemalloc.Filter(False, tracemalloc.__file__),
+        tracemalloc.Filter(False, '<frozen importlib._bootstrap*>'),
+    ])
+    statistics = snapshot.statistics('lineno')
+    lines = [f'peak traced: {peak_bytes / 1024:.1f} KiB, '
+             f'still allocated: {sum(x.size for x in statistics) / 1024:.1f} KiB',
+             f'{"KiB":>10}{"blocks":>9}  line']
+    for stat in statistics[:count]:
+        frame = stat.traceback[0]
+        lines.append(f'{stat.size / 1024:>10.1f}{stat.count:>9}  {frame.filename}:{frame.lineno}')
+    return '\n'.join(lines) + '\n'
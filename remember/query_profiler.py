@@ -0,0 +1,199 @@
+"""
+This module profiles the SQL statements a SqlCommandStore runs.
+
+The profiled connection hands out cursors that time every execute and fetch and count the
+rows returned. The progress handler counts the virtual machine steps of the statement that is
+running and the trace callback counts the statement programs SQLite runs for it, which
+includes every trigger invocation. Statements are aggregated by their SQL text so the summary
+shows which query is to blame, and the slowest ones can be explained with EXPLAIN QUERY PLAN.
+"""
+import sqlite3
+import time
+from dataclasses import dataclass, field
+from typing import Any, Dict, List, Optional, Sequence
+
+# The progress handler runs every this many virtual machine steps, the step counts are
+# rounded to it.
+DEFAULT_STEPS_PER_CALLBACK = 100
+SUMMARY_SQL_WIDTH = 60
+# Only these statements can be explained, the rest would be executed by EXPLAIN.
+_EXPLAINABLE_PREFIXES = ('select', 'with', 'insert', 'update', 'delete', 'replace')
+
+
+@dataclass
+class StatementStats:
+    """Aggregated cost of one SQL statement text."""
+    sql: str
+    calls: int = 0
+    total_seconds: float = 0.0
+    # Slowest single execute, the fetches are only part of the total.
+    max_seconds: float = 0.0
+    rows: int = 0
+    steps: int = 0
+    # Statement programs traced while it ran, more than calls when triggers fired.
+    traced: int = 0
+    # Parameters of the slowest call, used to explain it.
+    slowest_params: Sequence[Any] = field(default_factory=tuple)
+
+
+class QueryProfiler(object):
+    """Collects the statement stats of the connections created with connection_factory."""
+
+    def __init__(self, steps_per_callback: int = DEFAULT_STEPS_PER_CALLBACK) -> None:
+        self.steps_per_callback = steps_per_callback
+        self._stats: Dict[str, StatementStats] = {}
+        self._active: Optional[StatementStats] = None
+
+    @property
+    def connection_factory(self):
+        """The factory argument of sqlite3.connect that profiles the connection."""
+        cursor_class = _create_cursor_class(self)
+
+        class ProfiledConnection(sqlite3.Connection):
+            def cursor(self, factory=None):  # type: ignore[override]
+                return super().cursor(factory or cursor_class)
+
+            # The execute shortcuts don't go through cursor().
+            def execute(self, sql, parameters=()):  # type: ignore[override]
+                return self.cursor().execute(sql, parameters)
+
+            def executemany(self, sql, seq_of_parameters):  # type: ignore[override]
+                return self.cursor().executemany(sql, seq_of_parameters)
+
+            def executescript(self, sql_script):  # type: ignore[override]
+                return self.cursor().executescript(sql_script)
+
+        return ProfiledConnection
+
+    def install(self, db_conn: sqlite3.Connection) -> None:
+        db_conn.set_trace_callback(self.on_trace)
+
+    def get_stats(self) -> List[StatementStats]:
+        """The statements sorted by cumulative time, most expensive first."""
+        return sorted(self._stats.values(), key=lambda x: x.total_seconds, reverse=True)
+
+    def reset(self) -> None:
+        self._stats = {}
+        self._active = None
+
+    def on_progress(self) -> None:
+        if self._active:
+            self._active.steps += self.steps_per_callback
+
+    def on_trace(self, _: str) -> None:
+        if self._active:
+            self._active.traced += 1
+
+    def begin(self, sql: str) -> StatementStats:
+        key = ' '.join(sql.split())
+        stats = self._stats.get(key)
+        if stats is None:
+            stats = self._stats[key] = StatementStats(key)
+        stats.calls += 1
+        return stats
+
+    def run(self, stats: StatementStats, function, *args):
+        """Run a cursor call on behalf of the statement and add its time to it."""
+        previous, self._active = self._active, stats
+        start_time = time.perf_counter()
+        try:
+            return function(*args)
+        finally:
+            self._active = previous
+            stats.total_seconds += time.perf_counter() - start_time
+
+    def format_summary(self, limit: int = 20) -> str:
+        lines = [f'{"calls":>6}{"total ms":>11}{"max ms":>9}{"rows":>8}{"steps":>10}'
+                 f'{"traced":>8}  sql']
+        for stats in self.get_stats()[:limit]:
+            lines.append(f'{stats.calls:>6}{stats.total_seconds * 1000:>11.2f}'
+                         f'{stats.max_seconds * 1000:>9.2f}{stats.rows:>8}{stats.steps:>10}'
+                         f'{stats.traced:>8}  {stats.sql[:SUMMARY_SQL_WIDTH]}')
+        return '\n'.join(lines)
+
+    def explain_slowest(self, db_conn: sqlite3.Connection, count: int) -> str:
+        """EXPLAIN QUERY PLAN of the count statements with the slowest single call."""
+        explainable = [x for x in self._stats.values()
+                       if x.sql.lower().startswith(_EXPLAINABLE_PREFIXES)]
+        slowest = sorted(explainable, key=lambda x: x.max_seconds, reverse=True)
+        sections = []
+        for stats in slowest[:count]:
+            try:
+                # A plain cursor so that explaining doesn't show up in the stats.
+                plan = db_conn.cursor(sqlite3.Cursor).execute(
+                    'EXPLAIN QUERY PLAN ' + stats.sql, stats.slowest_params).fetchall()
+                plan_lines = [f'{"  " * _get_plan_depth(row, plan)}{row[3]}' for row in plan]
+            except sqlite3.Error as error:
+                plan_lines = [f'not explainable: {error}']
+            sections.append(f'-- {stats.max_seconds * 1000:.2f} ms, {stats.calls} calls\n'
+                            f'{stats.sql}\n' + '\n'.join(plan_lines))
+        return '\n\n'.join(sections) + '\n'
+
+
+def _create_cursor_class(profiler: QueryProfiler):
+    class ProfiledCursor(sqlite3.Cursor):
+        _stats: Optional[StatementStats] = None
+
+        def execute(self, sql, parameters=()):  # type: ignore[override]
+            return self._run_statement(sql, parameters, super().execute, sql, parameters)
+
+        def executemany(self, sql, seq_of_parameters):  # type: ignore[override]
+            seq_of_parameters = list(seq_of_parameters)
+            # The first parameters stand in for all of them, nothing ran when there are none.
+            return self._run_statement(sql, seq_of_parameters[0] if seq_of_parameters else None,
+                                       super().executemany, sql, seq_of_parameters)
+
+        def executescript(self, sql_script):  # type: ignore[override]
+            return self._run_statement(sql_script, (), super().executescript, sql_script)
+
+        def fetchone(self):
+            row = self._fetch(super().fetchone)
+            self._add_rows(0 if row is None else 1)
+            return row
+
+        def fetchmany(self, size=None):
+            rows = self._fetch(super().fetchmany, size or self.arraysize)
+            self._add_rows(len(rows))
+            return rows
+
+        def fetchall(self):
+            rows = self._fetch(super().fetchall)
+            self._add_rows(len(rows))
+            return rows
+
+        def __next__(self):
+            row = self._fetch(super().__next__)
+            self._add_rows(1)
+            return row
+
+        def _run_statement(self, sql, parameters, function, *args):
+            self._stats = profiler.begin(sql)
+            start_time = time.perf_counter()
+            try:
+                return profiler.run(self._stats, function, *args)
+            finally:
+                elapsed = time.perf_counter() - start_time
+                if parameters is not None and elapsed >= self._stats.max_seconds:
+                    self._stats.max_seconds = elapsed
+                    self._stats.slowest_params = parameters
+
+        def _fetch(self, function, *args):
+            if self._stats is None:
+                return function(*args)
+            return profiler.run(self._stats, function, *args)
+
+        def _add_rows(self, count: int) -> None:
+            if self._stats is not None:
+                self._stats.rows += count
+
+    return ProfiledCursor
+
+
+def _get_plan_depth(row: Sequence, plan: List[Sequence]) -> int:
+    parents = {x[0]: x[1] for x in plan}
+    depth = 0
+    parent = row[1]
+    while parent in parents:
+        depth += 1
+        parent = parents[parent]
+    return depth
@@ -0,0 +1,69 @@
+"""
+This module holds the retention policy that keeps the command store from growing forever.
+
+Most of a long lived store is one-off commands and typos that were only ever seen once. The
+policy drops those once they are old enough, caps the number of commands remembered per
+directory and then gives the freed space back to the file system.
+"""
+import time
+from dataclasses import dataclass
+from typing import Optional
+
+from remember.constants import DEFAULT_BATCH_SIZE, DEFAULT_MAX_CONTEXTS_PER_DIRECTORY, \
+    DEFAULT_SINGLE_USE_MAX_AGE_DAYS, SECONDS_PER_DAY
+from remember.sql_store import SqlCommandStore, StorageStats
+
+
+@dataclass
+class RetentionPolicy:
+    """The rules applied to the store, a rule set to None is skipped."""
+    # Commands seen only once and not used for this many days are deleted.
+    single_use_max_age_days: Optional[float] = DEFAULT_SINGLE_USE_MAX_AGE_DAYS
+    # Only this many of the most recently used commands are remembered per directory.
+    max_contexts_per_directory: Optional[int] = DEFAULT_MAX_CONTEXTS_PER_DIRECTORY
+    # Commands with command info are never deleted.
+    keep_annotated: bool = True
+    # Rows deleted per transaction.
+    batch_size: int = DEFAULT_BATCH_SIZE
+    # Free pages released per compaction, None releases all of them.
+    max_vacuum_pages: Optional[int] = None
+
+
+@dataclass
+class RetentionReport:
+    """What applying a retention policy removed and reclaimed."""
+    commands_deleted: int
+    contexts_deleted: int
+    before: StorageStats
+    after: StorageStats
+
+    @property
+    def bytes_reclaimed(self) -> int:
+        return self.before.size_bytes - self.after.size_bytes
+
+    def __str__(self) -> str:
+        return (f'Deleted {self.commands_deleted} commands and {self.contexts_deleted} '
+                f'directory entries.\n'
+                f'Commands: {self.before.num_commands} -> {self.after.num_commands}\n'
+                f'Directory entries: {self.before.num_contexts} -> {self.after.num_contexts}\n'
+                f'Size: {self.before.size_bytes} -> {self.after.size_bytes} bytes '
+                f'({self.bytes_reclaimed} bytes reclaimed)')
+
+
+def apply_retention_policy(store: SqlCommandStore, policy: RetentionPolicy,
+                           now: Optional[float] = None) -> RetentionReport:
+    """Delete what the policy doesn't keep, compact the store and report the difference."""
+    if now is None:
+        now = time.time()
+    before = store.get_storage_stats()
+    commands_deleted = 0
+    if policy.single_use_max_age_days is not None:
+        used_before = now - policy.single_use_max_age_days * SECONDS_PER_DAY
+        commands_deleted = store.delete_stale_commands(
+            used_before, policy.keep_annotated, policy.batch_size)
+    contexts_deleted = 0
+    if policy.max_contexts_per_directory is not None:
+        contexts_deleted = store.delete_excess_directory_contexts(
+            policy.max_contexts_per_directory, policy.batch_size)
+    store.compact(policy.max_vacuum_pages)
+    return RetentionReport(commands_deleted, contexts_deleted, before, store.get_storage_stats())
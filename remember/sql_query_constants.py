@@ -1,6 +1,14 @@
 _REMEMBER = 'remember'
 _DIRECTORIES = 'directories'
+_MIGRATED_DIRECTORIES = 'directories_tree'
 _COMMAND_CONTEXT = 'command_context'
+_COMMAND_TOKENS = 'command_tokens'
+_PRIMARY_COMMANDS = 'primary_commands'
+_USAGE_BUCKETS = 'usage_buckets'
+_HISTORY_FILE_STATE = 'history_file_state'
+_HISTORY_IMPORT_CHECKPOINTS = 'history_import_checkpoints'
+_MIGRATED_HISTORY_IMPORT_CHECKPOINTS = 'history_import_checkpoints_migrated'
+_HISTORY_READ_POSITIONS = 'history_read_positions'
 
 # Create table statements
 SQL_CREATE_REMEMBER_TABLE = \
@@ -12,11 +20,16 @@ CREATE TABLE IF NOT EXISTS {_REMEMBER}(
     last_used REAL NOT NULL ,
     command_info TEXT);"""
 
-SQL_CREATE_DIR_TABLE = \
-    f"""
-CREATE TABLE IF NOT EXISTS {_DIRECTORIES} (
+# Directories are stored as a tree of path components. Each row is one component pointing at
+# its parent, top level components have parent_id 0. The full path is the names from the top
+# down joined by '/'.
+_DIRECTORY_TREE_COLUMNS = """(
   rowid INTEGER PRIMARY KEY AUTOINCREMENT,
-  dir_path TEXT UNIQUE); """
+  parent_id INTEGER NOT NULL,
+  name TEXT NOT NULL,
+  UNIQUE(parent_id, name))"""
+
+SQL_CREATE_DIR_TABLE = f"CREATE TABLE IF NOT EXISTS {_DIRECTORIES} {_DIRECTORY_TREE_COLUMNS};"
 
 CREATE_CONTEXT_COMMAND_TABLE = \
     f"""
@@ -29,9 +42,116 @@ CREATE TABLE IF NOT EXISTS {_COMMAND_CONTEXT} (
   FOREIGN KEY(context_id) REFERENCES {_DIRECTORIES}(rowid) ON DELETE CASCADE
 );"""
 
-CREATE_TABLES = {_REMEMBER: SQL_CREATE_REMEMBER_TABLE,
-                 _DIRECTORIES: SQL_CREATE_DIR_TABLE,
-                 _COMMAND_CONTEXT: CREATE_CONTEXT_COMMAND_TABLE}
+# Inverted index from the primary command (position 0) and argument tokens to the command.
+# Rows are removed by a trigger rather than a foreign key so that stores whose remember table
+# has no explicit rowid column keep working.
+CREATE_COMMAND_TOKENS_TABLE = \
+    f"""
+CREATE TABLE IF NOT EXISTS {_COMMAND_TOKENS} (
+  token TEXT NOT NULL,
+  position INTEGER NOT NULL,
+  command_id INTEGER NOT NULL,
+  PRIMARY KEY(token, position, command_id)
+) WITHOUT ROWID;
+CREATE INDEX IF NOT EXISTS {_COMMAND_TOKENS}_command_id ON {_COMMAND_TOKENS}(command_id);
+CREATE TRIGGER IF NOT EXISTS {_REMEMBER}_delete_{_COMMAND_TOKENS}
+AFTER DELETE ON {_REMEMBER}
+BEGIN
+  DELETE FROM {_COMMAND_TOKENS} WHERE command_id = old.rowid;
+END;"""
+
+_PRIMARY_COMMANDS_DELETE_TRIGGER = f'{_REMEMBER}_delete_{_PRIMARY_COMMANDS}'
+# The primary command of a deleted row, looked up in the token index before its trigger clears it.
+_DELETED_PRIMARY_COMMAND = \
+    f'SELECT token FROM {_COMMAND_TOKENS} WHERE command_id = old.rowid AND position = 0'
+
+# Usage aggregated per primary command, kept up to date as commands are added. Deleting a
+# command only touches the row of its primary command, last_used is taken again from the
+# other variants of it through the token index.
+CREATE_PRIMARY_COMMANDS_TABLE = \
+    f"""
+CREATE TABLE IF NOT EXISTS {_PRIMARY_COMMANDS} (
+  primary_command TEXT PRIMARY KEY,
+  total_count INTEGER NOT NULL,
+  distinct_variants INTEGER NOT NULL,
+  last_used REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS {_PRIMARY_COMMANDS}_total_count
+ON {_PRIMARY_COMMANDS}(total_count DESC);
+CREATE TRIGGER IF NOT EXISTS {_PRIMARY_COMMANDS_DELETE_TRIGGER}
+BEFORE DELETE ON {_REMEMBER}
+BEGIN
+  UPDATE {_PRIMARY_COMMANDS}
+  SET total_count = total_count - old.count_seen,
+      distinct_variants = distinct_variants - 1,
+      last_used = coalesce((
+        SELECT max({_REMEMBER}.last_used) FROM {_COMMAND_TOKENS}
+        JOIN {_REMEMBER} ON {_REMEMBER}.rowid = {_COMMAND_TOKENS}.command_id
+        WHERE {_COMMAND_TOKENS}.token = {_PRIMARY_COMMANDS}.primary_command
+          AND {_COMMAND_TOKENS}.position = 0 AND {_COMMAND_TOKENS}.command_id != old.rowid),
+        last_used)
+  WHERE primary_command = ({_DELETED_PRIMARY_COMMAND});
+  DELETE FROM {_PRIMARY_COMMANDS}
+  WHERE primary_command = ({_DELETED_PRIMARY_COMMAND}) AND distinct_variants <= 0;
+END;"""
+# Stores created before the delete trigger was keyed on the primary command.
+DROP_PRIMARY_COMMANDS_DELETE_TRIGGER = f'DROP TRIGGER IF EXISTS {_PRIMARY_COMMANDS_DELETE_TRIGGER};'
+
+# How often each command was used per day (days since the epoch, UTC). The (day, command_id)
+# index serves the time window queries without touching older buckets.
+CREATE_USAGE_BUCKETS_TABLE = \
+    f"""
+CREATE TABLE IF NOT EXISTS {_USAGE_BUCKETS} (
+  command_id INTEGER NOT NULL,
+  day INTEGER NOT NULL,
+  count INTEGER NOT NULL,
+  PRIMARY KEY(command_id, day)
+) WITHOUT ROWID;
+CREATE INDEX IF NOT EXISTS {_USAGE_BUCKETS}_day ON {_USAGE_BUCKETS}(day, command_id, count);
+CREATE TRIGGER IF NOT EXISTS {_REMEMBER}_delete_{_USAGE_BUCKETS}
+AFTER DELETE ON {_REMEMBER}
+BEGIN
+  DELETE FROM {_USAGE_BUCKETS} WHERE command_id = old.rowid;
+END;"""
+
+# The stat of each history file when it was last fully ingested, used to skip reading a
+# history file that hasn't changed since.
+CREATE_HISTORY_FILE_STATE_TABLE = \
+    f"""
+CREATE TABLE IF NOT EXISTS {_HISTORY_FILE_STATE} (
+  path TEXT PRIMARY KEY,
+  device INTEGER NOT NULL,
+  inode INTEGER NOT NULL,
+  size INTEGER NOT NULL,
+  mtime_ns INTEGER NOT NULL
+);"""
+
+# How far the chunked import of each history archive got. It is written in the transaction of
+# the chunk it follows so an interrupted import resumes right after the last stored chunk.
+_HISTORY_IMPORT_CHECKPOINT_COLUMNS = """(
+  path TEXT PRIMARY KEY,
+  device INTEGER NOT NULL,
+  inode INTEGER NOT NULL,
+  byte_offset INTEGER NOT NULL)"""
+CREATE_HISTORY_IMPORT_CHECKPOINTS_TABLE = \
+    f"""
+CREATE TABLE IF NOT EXISTS {_HISTORY_IMPORT_CHECKPOINTS} {_HISTORY_IMPORT_CHECKPOINT_COLUMNS};"""
+
+# Where incremental ingestion of each history file stopped. The fingerprint hashes the last
+# commands read so the same spot can be found again after the file is truncated or replaced.
+CREATE_HISTORY_READ_POSITIONS_TABLE = \
+    f"""
+CREATE TABLE IF NOT EXISTS {_HISTORY_READ_POSITIONS} (
+  path TEXT PRIMARY KEY,
+  device INTEGER NOT NULL,
+  inode INTEGER NOT NULL,
+  byte_offset INTEGER NOT NULL,
+  anchor_lines INTEGER NOT NULL,
+  fingerprint TEXT NOT NULL
+);"""
+
+CREATE_LAST_USED_INDEX = \
+    f'CREATE INDEX IF NOT EXISTS {_REMEMBER}_last_used ON {_REMEMBER}(last_used);'
 
 # Insert statements
 INSERT_INTO_REMEMBER_QUERY = f''' INSERT INTO {_REMEMBER}(
@@ -40,21 +160,40 @@ INSERT_INTO_REMEMBER_QUERY = f''' INSERT INTO {_REMEMBER}(
                                     last_used,
                                     command_info) VALUES(?,?,?,?) '''
 
-INSERT_INTO_DIRECTORIES_QUERY = f'''INSERT INTO {_DIRECTORIES}(dir_path) VALUES(?)'''
-INSERT_INTO_COMMAND_CONTEXT = f'INSERT INTO {_COMMAND_CONTEXT} VALUES(?,?,1);'
+INSERT_INTO_DIRECTORIES_QUERY = f'''INSERT INTO {_DIRECTORIES}(parent_id, name) VALUES(?,?)'''
+INSERT_INTO_COMMAND_CONTEXT = f'INSERT INTO {_COMMAND_CONTEXT} VALUES(?,?,?);'
+INSERT_INTO_COMMAND_TOKENS = f'INSERT OR IGNORE INTO {_COMMAND_TOKENS} VALUES(?,?,?);'
+INSERT_OR_ADD_PRIMARY_COMMAND = f'''INSERT INTO {_PRIMARY_COMMANDS} VALUES(?,?,?,?)
+                                   ON CONFLICT(primary_command) DO UPDATE SET
+                                     total_count = total_count + excluded.total_count,
+                                     distinct_variants =
+                                       distinct_variants + excluded.distinct_variants,
+                                     last_used = max(last_used, excluded.last_used)'''
+INSERT_OR_ADD_USAGE_BUCKET = f'''INSERT INTO {_USAGE_BUCKETS} VALUES(?,?,?)
+                                ON CONFLICT(command_id, day) DO UPDATE SET
+                                  count = count + excluded.count'''
+# Only the last day a command was used on is known for the commands stored before the buckets.
+BACKFILL_USAGE_BUCKETS = f'''INSERT OR IGNORE INTO {_USAGE_BUCKETS}
+                            SELECT rowid, CAST(last_used / ? AS INTEGER), 1 FROM {_REMEMBER}'''
 
 # Delete statements
 DELETE_FROM_REMEMBER = f' DELETE FROM {_REMEMBER} WHERE full_command=?'
+DELETE_ALL_PRIMARY_COMMANDS = f'DELETE FROM {_PRIMARY_COMMANDS}'
 
 # Update statements
 UPDATE_REMEMBER_COUNT_QUERY = f'''UPDATE {_REMEMBER}
-                                 SET count_seen = count_seen + 1,
+                                 SET count_seen = count_seen + ?,
                                      last_used = ?
                                  WHERE rowid = ?'''
 UPDATE_COMMAND_CONTEXT_COUNT_QUERY = f'''UPDATE {_COMMAND_CONTEXT}
-                                     SET num_occurrences = num_occurrences + 1
+                                     SET num_occurrences = num_occurrences + ?
                                      WHERE rowid = ?;'''
 
+UPDATE_PRIMARY_COMMAND_COUNT_QUERY = f'''UPDATE {_PRIMARY_COMMANDS}
+                                        SET total_count = total_count + ?,
+                                            last_used = max(last_used, ?)
+                                        WHERE primary_command = ?'''
+
 UPDATE_COMMAND_INFO_QUERY = f''' UPDATE {_REMEMBER}
                                  SET command_info = ?
                                  WHERE full_command = ?'''
@@ -62,7 +201,18 @@ UPDATE_COMMAND_INFO_QUERY = f''' UPDATE {_REMEMBER}
 # Simple select statements
 SIMPLE_SELECT_COMMAND_QUERY = f"SELECT rowid FROM {_REMEMBER} WHERE full_command = ?"
 
-GET_ROWID_FROM_DIRECTORIES = f"SELECT rowid FROM {_DIRECTORIES} WHERE dir_path = ?"
+GET_ROWID_FROM_DIRECTORIES = \
+    f"SELECT rowid FROM {_DIRECTORIES} WHERE parent_id = ? AND name = ?"
+
+# Path components from the top level directory down to the given directory.
+SELECT_DIRECTORY_ANCESTORS = f"""
+WITH RECURSIVE ancestors(id, parent_id, name, depth) AS (
+  SELECT rowid, parent_id, name, 0 FROM {_DIRECTORIES} WHERE rowid = ?
+  UNION ALL
+  SELECT {_DIRECTORIES}.rowid, {_DIRECTORIES}.parent_id, {_DIRECTORIES}.name, ancestors.depth + 1
+  FROM {_DIRECTORIES}
+  INNER JOIN ancestors ON {_DIRECTORIES}.rowid = ancestors.parent_id)
+SELECT name FROM ancestors ORDER BY depth DESC"""
 
 GET_ROWID_FROM_COMMAND_CONTEXT = \
     f"""
@@ -78,28 +228,224 @@ SELECT
     command_info
 FROM """ + _REMEMBER + ' {} '
 
-TABLE_EXISTS_QUERY = ''' SELECT count(name) FROM sqlite_master WHERE type='table' AND name='{}' '''
+SELECT_ANNOTATED_COMMANDS = f"""
+SELECT rowid, full_command, count_seen, last_used, command_info
+FROM {_REMEMBER}
+WHERE command_info IS NOT NULL AND command_info != ''"""
+
+SELECT_COMMANDS_BY_ROWIDS = f"""
+SELECT rowid, full_command, count_seen, last_used, command_info
+FROM {_REMEMBER}
+WHERE rowid IN ({{}})"""
+
+SELECT_ALL_COMMAND_STRINGS = f'SELECT rowid, full_command FROM {_REMEMBER}'
+SELECT_HISTORY_FILE_STATE = \
+    f'SELECT device, inode, size, mtime_ns FROM {_HISTORY_FILE_STATE} WHERE path = ?'
+INSERT_OR_REPLACE_HISTORY_FILE_STATE = \
+    f'INSERT OR REPLACE INTO {_HISTORY_FILE_STATE} VALUES(?,?,?,?,?)'
+SELECT_HISTORY_IMPORT_CHECKPOINT = f'''SELECT device, inode, byte_offset
+                                      FROM {_HISTORY_IMPORT_CHECKPOINTS} WHERE path = ?'''
+INSERT_OR_REPLACE_HISTORY_IMPORT_CHECKPOINT = \
+    f'INSERT OR REPLACE INTO {_HISTORY_IMPORT_CHECKPOINTS} VALUES(?,?,?,?)'
+SELECT_HISTORY_READ_POSITION = f'''SELECT device, inode, byte_offset, anchor_lines, fingerprint
+                                   FROM {_HISTORY_READ_POSITIONS} WHERE path = ?'''
+INSERT_OR_REPLACE_HISTORY_READ_POSITION = \
+    f'INSERT OR REPLACE INTO {_HISTORY_READ_POSITIONS} VALUES(?,?,?,?,?,?)'
+SELECT_ALL_COMMAND_USAGE = f'SELECT full_command, count_seen, last_used FROM {_REMEMBER}'
+
+SELECT_TOP_PRIMARY_COMMANDS = f"""
+SELECT primary_command, total_count, distinct_variants, last_used
+FROM {_PRIMARY_COMMANDS}
+ORDER BY total_count DESC
+LIMIT ?"""
+
+SELECT_PRIMARY_COMMAND = f"""
+SELECT primary_command, total_count, distinct_variants, last_used
+FROM {_PRIMARY_COMMANDS}
+WHERE primary_command = ?"""
+
+# The commands used the most since a day, counting only the uses in that window. The day
+# index is forced, grouping by command would otherwise make the planner scan every bucket.
+SELECT_WINDOW_USAGE_COMMANDS = f"""
+SELECT
+    {_REMEMBER}.full_command,
+    SUM({_USAGE_BUCKETS}.count) AS window_count,
+    {_REMEMBER}.last_used,
+    {_REMEMBER}.command_info
+FROM {_USAGE_BUCKETS} INDEXED BY {_USAGE_BUCKETS}_day
+INNER JOIN {_REMEMBER} ON {_REMEMBER}.rowid = {_USAGE_BUCKETS}.command_id
+WHERE {_USAGE_BUCKETS}.day >= ? {{}}
+GROUP BY {_USAGE_BUCKETS}.command_id
+ORDER BY window_count DESC, {_REMEMBER}.last_used DESC
+LIMIT ?"""
+
+SELECT_WINDOW_PRIMARY_COMMANDS = f"""
+SELECT
+    {_COMMAND_TOKENS}.token,
+    SUM({_USAGE_BUCKETS}.count) AS window_count,
+    COUNT(DISTINCT {_USAGE_BUCKETS}.command_id),
+    MAX({_REMEMBER}.last_used) AS window_last_used
+FROM {_USAGE_BUCKETS} INDEXED BY {_USAGE_BUCKETS}_day
+INNER JOIN {_COMMAND_TOKENS}
+  ON {_COMMAND_TOKENS}.command_id = {_USAGE_BUCKETS}.command_id AND {_COMMAND_TOKENS}.position = 0
+INNER JOIN {_REMEMBER} ON {_REMEMBER}.rowid = {_USAGE_BUCKETS}.command_id
+WHERE {_USAGE_BUCKETS}.day >= ? {{}}
+GROUP BY {_COMMAND_TOKENS}.token
+ORDER BY window_count DESC, window_last_used DESC
+LIMIT ?"""
+
+# Posting lists of the token index, intersected to find commands with all the tokens.
+SELECT_PRIMARY_TOKEN_POSTINGS = \
+    f'SELECT command_id FROM {_COMMAND_TOKENS} WHERE token = ? AND position = 0'
+SELECT_ARGUMENT_TOKEN_POSTINGS = \
+    f'SELECT command_id FROM {_COMMAND_TOKENS} WHERE token = ? AND position > 0'
+
+WINDOW_PRIMARY_COMMAND_CLAUSE = f'AND {_COMMAND_TOKENS}.token = ?'
+WINDOW_USAGE_PRIMARY_COMMAND_CLAUSE = \
+    f'AND {_USAGE_BUCKETS}.command_id IN ({SELECT_PRIMARY_TOKEN_POSTINGS})'
+
+SEARCH_COMMANDS_BY_TOKENS_QUERY = f"""
+SELECT
+    full_command,
+    count_seen,
+    last_used,
+    command_info
+FROM {_REMEMBER}
+WHERE rowid IN ({{}}) {{}}
+ORDER BY count_seen DESC, last_used DESC"""
+
+# The escape character has to match sql_store.LIKE_ESCAPE_CHAR.
+ESCAPED_LIKE_CLAUSE = "{} LIKE ? ESCAPE '\\'"
+
+# Time range predicates on remember.last_used, served by the last_used index.
+LAST_USED_SINCE_CLAUSE = 'last_used >= ?'
+LAST_USED_BEFORE_CLAUSE = 'last_used < ?'
 
 # Join select statements
 SELECT_CONTEXT_COMMANDS = \
+    f"""
+    SELECT
+      {_REMEMBER}.full_command,
+      {_REMEMBER}.last_used,
+      {_COMMAND_CONTEXT}.num_occurrences,
+      {_REMEMBER}.command_info,
+      {_COMMAND_CONTEXT}.context_id
+    FROM
+      {_COMMAND_CONTEXT}
+    INNER JOIN
+      {_REMEMBER} ON {_REMEMBER}.rowid = {_COMMAND_CONTEXT}.command_id
+    WHERE
+      {_COMMAND_CONTEXT}.context_id = ? {{}}
+    ORDER BY
+      {_REMEMBER}.last_used DESC;
     """
+
+# Same as SELECT_CONTEXT_COMMANDS but for the directory and everything below it. A command
+# used in several of those directories is returned once, with the directory it was used the
+# most in.
+SELECT_SUBTREE_CONTEXT_COMMANDS = \
+    f"""
+    WITH RECURSIVE subtree(id) AS (
+      SELECT ?
+      UNION ALL
+      SELECT {_DIRECTORIES}.rowid
+      FROM {_DIRECTORIES}
+      INNER JOIN subtree ON {_DIRECTORIES}.parent_id = subtree.id)
     SELECT
-      remember.full_command,
-      remember.last_used,
-      command_context.num_occurrences,
-      remember.command_info,
-      directories.dir_path as dir_path
+      {_REMEMBER}.full_command,
+      {_REMEMBER}.last_used,
+      SUM({_COMMAND_CONTEXT}.num_occurrences),
+      {_REMEMBER}.command_info,
+      {_COMMAND_CONTEXT}.context_id,
+      MAX({_COMMAND_CONTEXT}.num_occurrences)
     FROM
-      directories
+      subtree
     INNER JOIN
-      command_context ON directories.rowid = command_context.context_id
+      {_COMMAND_CONTEXT} ON {_COMMAND_CONTEXT}.context_id = subtree.id
     INNER JOIN
-      remember ON remember.rowid = command_context.command_id
+      {_REMEMBER} ON {_REMEMBER}.rowid = {_COMMAND_CONTEXT}.command_id
     WHERE
-      directories.dir_path= ? {}
+      1 {{}}
+    GROUP BY
+      {_REMEMBER}.rowid
     ORDER BY
-      remember.last_used DESC;
+      {_REMEMBER}.last_used DESC;
     """
 
+# Retention, rows are selected in bounded batches and then deleted by rowid.
+SELECT_STALE_COMMANDS = f"""
+SELECT rowid
+FROM {_REMEMBER}
+WHERE count_seen <= 1 AND last_used < ? {{}}
+LIMIT ?"""
+NOT_ANNOTATED_CLAUSE = "AND (command_info IS NULL OR command_info = '')"
+DELETE_COMMANDS_BY_ROWIDS = f'DELETE FROM {_REMEMBER} WHERE rowid IN ({{}})'
+
+# Context rows past the most recently used max_per_directory of their directory.
+SELECT_EXCESS_CONTEXTS = f"""
+SELECT id
+FROM (
+  SELECT
+    {_COMMAND_CONTEXT}.rowid AS id,
+    ROW_NUMBER() OVER (
+      PARTITION BY {_COMMAND_CONTEXT}.context_id
+      ORDER BY {_REMEMBER}.last_used DESC, {_COMMAND_CONTEXT}.num_occurrences DESC) AS position
+  FROM {_COMMAND_CONTEXT}
+  INNER JOIN {_REMEMBER} ON {_REMEMBER}.rowid = {_COMMAND_CONTEXT}.command_id)
+WHERE position > ?"""
+DELETE_CONTEXTS_BY_ROWIDS = f'DELETE FROM {_COMMAND_CONTEXT} WHERE rowid IN ({{}})'
+
+COUNT_COMMANDS_QUERY = f'SELECT COUNT(*) FROM {_REMEMBER}'
+COUNT_COMMAND_CONTEXTS_QUERY = f'SELECT COUNT(*) FROM {_COMMAND_CONTEXT}'
+PAGE_COUNT_PRAGMA = 'PRAGMA page_count;'
+PAGE_SIZE_PRAGMA = 'PRAGMA page_size;'
+FREELIST_COUNT_PRAGMA = 'PRAGMA freelist_count;'
+AUTO_VACUUM_PRAGMA = 'PRAGMA auto_vacuum;'
+# Values of PRAGMA auto_vacuum.
+AUTO_VACUUM_INCREMENTAL = 2
+SET_AUTO_VACUUM_INCREMENTAL_PRAGMA = 'PRAGMA auto_vacuum = INCREMENTAL;'
+INCREMENTAL_VACUUM_PRAGMA = 'PRAGMA incremental_vacuum({});'
+VACUUM_STATEMENT = 'VACUUM;'
+ANALYZE_STATEMENT = 'ANALYZE;'
+
+# Migration of the directories table from full dir_path strings to the component tree.
+SELECT_LEGACY_DIRECTORIES = f'SELECT rowid, dir_path FROM {_DIRECTORIES}'
+CREATE_MIGRATED_DIR_TABLE = f"CREATE TABLE {_MIGRATED_DIRECTORIES} {_DIRECTORY_TREE_COLUMNS};"
+INSERT_INTO_MIGRATED_DIRECTORIES = \
+    f'INSERT INTO {_MIGRATED_DIRECTORIES}(rowid, parent_id, name) VALUES(?,?,?)'
+UPDATE_COMMAND_CONTEXT_DIRECTORY = \
+    f'UPDATE {_COMMAND_CONTEXT} SET context_id = ? WHERE context_id = ?'
+DROP_LEGACY_DIR_TABLE = f'DROP TABLE {_DIRECTORIES}'
+RENAME_MIGRATED_DIR_TABLE = f'ALTER TABLE {_MIGRATED_DIRECTORIES} RENAME TO {_DIRECTORIES}'
+DIRECTORY_COLUMNS_QUERY = f'PRAGMA table_info({_DIRECTORIES})'
+
+# Migration of the history import checkpoints to a table without the unused line_count column.
+HISTORY_IMPORT_CHECKPOINT_COLUMNS_QUERY = f'PRAGMA table_info({_HISTORY_IMPORT_CHECKPOINTS})'
+CREATE_MIGRATED_HISTORY_IMPORT_CHECKPOINTS_TABLE = \
+    f'CREATE TABLE {_MIGRATED_HISTORY_IMPORT_CHECKPOINTS} {_HISTORY_IMPORT_CHECKPOINT_COLUMNS};'
+COPY_HISTORY_IMPORT_CHECKPOINTS = f'''INSERT INTO {_MIGRATED_HISTORY_IMPORT_CHECKPOINTS}
+SELECT path, device, inode, byte_offset FROM {_HISTORY_IMPORT_CHECKPOINTS}'''
+DROP_LEGACY_HISTORY_IMPORT_CHECKPOINTS_TABLE = f'DROP TABLE {_HISTORY_IMPORT_CHECKPOINTS}'
+RENAME_MIGRATED_HISTORY_IMPORT_CHECKPOINTS_TABLE = \
+    f'ALTER TABLE {_MIGRATED_HISTORY_IMPORT_CHECKPOINTS} RENAME TO {_HISTORY_IMPORT_CHECKPOINTS}'
+
 PRAGMA_STR = 'PRAGMA case_sensitive_like = true;'
+# The schema version of the store, see migrations.py.
+USER_VERSION_PRAGMA = 'PRAGMA user_version;'
+SET_USER_VERSION_PRAGMA = 'PRAGMA user_version = {};'
 FOREIGN_KEY_PRAGMA = 'PRAGMA foreign_keys = ON;'
+FOREIGN_KEY_OFF_PRAGMA = 'PRAGMA foreign_keys = OFF;'
+# Readers of a write-ahead log store don't block on, or get blocked by, the writer.
+JOURNAL_MODE_WAL_PRAGMA = 'PRAGMA journal_mode = WAL;'
+JOURNAL_MODE_WAL = 'wal'
+JOURNAL_MODE_PRAGMA = 'PRAGMA journal_mode;'
+SET_JOURNAL_MODE_PRAGMA = 'PRAGMA journal_mode = {};'
+# A negative cache size is in KiB rather than pages.
+CACHE_SIZE_PRAGMA = 'PRAGMA cache_size = -{};'
+MMAP_SIZE_PRAGMA = 'PRAGMA mmap_size = {};'
+# Changes when another connection commits to the store.
+DATA_VERSION_PRAGMA = 'PRAGMA data_version;'
+# Keeps the locks of the connection until it is set back to normal and the file is next read.
+EXCLUSIVE_LOCKING_MODE_PRAGMA = 'PRAGMA locking_mode = EXCLUSIVE;'
+NORMAL_LOCKING_MODE_PRAGMA = 'PRAGMA locking_mode = NORMAL;'
+BEGIN_IMMEDIATE = 'BEGIN IMMEDIATE;'
@@ -1,14 +1,55 @@
+import os
 import sqlite3
 import time
 import re
-from typing import List, Set, Optional
-
+import urllib.parse
+from contextlib import contextmanager
+from dataclasses import dataclass
+from typing import TYPE_CHECKING, Callable, Dict, Iterator, List, Set, Optional, Tuple
+
+from remember import timing
+from remember.constants import SECONDS_PER_DAY
+from remember.migrations import SCHEMA_VERSION, get_schema_version, migrate
 from remember.sql_query_constants import SEARCH_COMMANDS_QUERY, DELETE_FROM_REMEMBER, \
-    INSERT_INTO_REMEMBER_QUERY, UPDATE_REMEMBER_COUNT_QUERY, TABLE_EXISTS_QUERY, PRAGMA_STR, \
-    UPDATE_COMMAND_INFO_QUERY, CREATE_TABLES, GET_ROWID_FROM_DIRECTORIES, \
-    INSERT_INTO_DIRECTORIES_QUERY, SIMPLE_SELECT_COMMAND_QUERY, GET_ROWID_FROM_COMMAND_CONTEXT, \
-    INSERT_INTO_COMMAND_CONTEXT, UPDATE_COMMAND_CONTEXT_COUNT_QUERY, \
-    SELECT_CONTEXT_COMMANDS, FOREIGN_KEY_PRAGMA
+    INSERT_INTO_REMEMBER_QUERY, UPDATE_REMEMBER_COUNT_QUERY, PRAGMA_STR, \
+    UPDATE_COMMAND_INFO_QUERY, GET_ROWID_FROM_DIRECTORIES, INSERT_INTO_DIRECTORIES_QUERY, \
+    SIMPLE_SELECT_COMMAND_QUERY, GET_ROWID_FROM_COMMAND_CONTEXT, INSERT_INTO_COMMAND_CONTEXT, \
+    UPDATE_COMMAND_CONTEXT_COUNT_QUERY, SELECT_CONTEXT_COMMANDS, FOREIGN_KEY_PRAGMA, \
+    ESCAPED_LIKE_CLAUSE, SELECT_ANNOTATED_COMMANDS, SELECT_COMMANDS_BY_ROWIDS, \
+    INSERT_INTO_COMMAND_TOKENS, SELECT_PRIMARY_TOKEN_POSTINGS, SELECT_ARGUMENT_TOKEN_POSTINGS, \
+    SEARCH_COMMANDS_BY_TOKENS_QUERY, INSERT_OR_ADD_PRIMARY_COMMAND, \
+    UPDATE_PRIMARY_COMMAND_COUNT_QUERY, SELECT_TOP_PRIMARY_COMMANDS, SELECT_PRIMARY_COMMAND, \
+    SELECT_DIRECTORY_ANCESTORS, SELECT_SUBTREE_CONTEXT_COMMANDS, SELECT_STALE_COMMANDS, \
+    NOT_ANNOTATED_CLAUSE, DELETE_COMMANDS_BY_ROWIDS, SELECT_EXCESS_CONTEXTS, \
+    DELETE_CONTEXTS_BY_ROWIDS, COUNT_COMMANDS_QUERY, COUNT_COMMAND_CONTEXTS_QUERY, \
+    PAGE_COUNT_PRAGMA, PAGE_SIZE_PRAGMA, FREELIST_COUNT_PRAGMA, AUTO_VACUUM_PRAGMA, \
+    AUTO_VACUUM_INCREMENTAL, SET_AUTO_VACUUM_INCREMENTAL_PRAGMA, INCREMENTAL_VACUUM_PRAGMA, \
+    VACUUM_STATEMENT, ANALYZE_STATEMENT, INSERT_OR_ADD_USAGE_BUCKET, SELECT_WINDOW_USAGE_COMMANDS, \
+    SELECT_WINDOW_PRIMARY_COMMANDS, WINDOW_PRIMARY_COMMAND_CLAUSE, \
+    WINDOW_USAGE_PRIMARY_COMMAND_CLAUSE, LAST_USED_SINCE_CLAUSE, LAST_USED_BEFORE_CLAUSE, \
+    JOURNAL_MODE_WAL_PRAGMA, JOURNAL_MODE_WAL, JOURNAL_MODE_PRAGMA, SET_JOURNAL_MODE_PRAGMA, \
+    SELECT_HISTORY_FILE_STATE, \
+    INSERT_OR_REPLACE_HISTORY_FILE_STATE, SELECT_HISTORY_IMPORT_CHECKPOINT, \
+    INSERT_OR_REPLACE_HISTORY_IMPORT_CHECKPOINT, SELECT_HISTORY_READ_POSITION, \
+    INSERT_OR_REPLACE_HISTORY_READ_POSITION, CACHE_SIZE_PRAGMA, MMAP_SIZE_PRAGMA, \
+    DATA_VERSION_PRAGMA, EXCLUSIVE_LOCKING_MODE_PRAGMA, NORMAL_LOCKING_MODE_PRAGMA, BEGIN_IMMEDIATE
+
+if TYPE_CHECKING:
+    from remember.info_index import CommandInfoIndex
+    from remember.query_profiler import QueryProfiler
+
+DEFAULT_FUZZY_LIMIT = 100
+INTERRUPT_CHECK_STEPS = 1000
+# Page cache and memory map of read only stores, SQLite's defaults are 2 MiB and none.
+READ_ONLY_CACHE_SIZE_KIB = 16 * 1024
+READ_ONLY_MMAP_SIZE = 256 * 1024 * 1024
+LIKE_ESCAPE_CHAR = '\\'
+# Directory paths are split into and rebuilt from their components with this separator.
+PATH_SEPARATOR = '/'
+# Parent id of the top level directory components.
+ROOT_DIRECTORY_ID = 0
+# The zsh extended history prefix, ': <start epoch>:<elapsed seconds>;'.
+ZSH_EXTENDED_HISTORY_PATTERN = re.compile(r': *(\d+):\d+;')
 
 
 class Command(object):
@@ -84,31 +125,130 @@ class Command(object):
                 curated_command = curated_command[m.start() + 1:].strip()
         return curated_command
 
+    @classmethod
+    def get_history_timestamp(cls, command_str: str) -> Optional[float]:
+        """The time a zsh extended history command was started at, None for other lines."""
+        match = ZSH_EXTENDED_HISTORY_PATTERN.match(command_str.strip())
+        return float(match.group(1)) if match else None
+
+
+@dataclass
+class PrimaryCommandStats:
+    """Usage aggregated over every command sharing a primary command."""
+    primary_command: str
+    total_count: int
+    distinct_variants: int
+    last_used: float
+
+
+@dataclass
+class StorageStats:
+    """Row counts and on disk size of a store."""
+    num_commands: int
+    num_contexts: int
+    size_bytes: int
+    free_bytes: int
+
+
+@dataclass(frozen=True)
+class HistoryFileState:
+    """The stat fields of a history file that change when it is written or replaced."""
+    device: int
+    inode: int
+    size: int
+    mtime_ns: int
+
+    @classmethod
+    def from_stat(cls, stat_result: os.stat_result) -> 'HistoryFileState':
+        return cls(stat_result.st_dev, stat_result.st_ino, stat_result.st_size,
+                   stat_result.st_mtime_ns)
+
+
+@dataclass(frozen=True)
+class HistoryImportCheckpoint:
+    """Where the chunked import of a history file stopped."""
+    history_file_path: str
+    device: int
+    inode: int
+    # Everything before it is stored, it always falls right after a line.
+    byte_offset: int
+
+
+@dataclass(frozen=True)
+class HistoryReadPosition:
+    """Where the incremental ingestion of a history file stopped."""
+    device: int
+    inode: int
+    # Everything before it was read, it always falls right after a line.
+    byte_offset: int
+    # Number of commands right before byte_offset that the fingerprint hashes.
+    anchor_lines: int
+    fingerprint: str
+
 
 class SqlCommandStore(object):
-    def __init__(self, db_file: str = ':memory:') -> None:
+    def __init__(self, db_file: str = ':memory:',
+                 profiler: Optional['QueryProfiler'] = None,
+                 read_only: bool = False) -> None:
+        """A read only store can only be searched. It maps the file into memory with a bigger
+        page cache and only checks the schema version, an outdated store is opened for writing."""
         self._db_file = db_file
-        self._table_creation_verified = False
+        self._profiler = profiler
+        self._read_only = read_only
+        self._should_interrupt: Optional[Callable[[], bool]] = None
+        self._interrupt_check_steps = INTERRUPT_CHECK_STEPS
+        self._schema_migrated = False
         self._db_conn: Optional[sqlite3.Connection] = None
+        self._info_index: Optional['CommandInfoIndex'] = None
+        # Materialized path cache of the directory tree, both directions.
+        self._directory_ids: Dict[str, int] = {}
+        self._directory_paths: Dict[int, str] = {}
+
+    def get_db_file_path(self) -> str:
+        return self._db_file
+
+    def set_info_index(self, info_index: Optional['CommandInfoIndex']) -> None:
+        """Keep the ranked command info index in sync with info updates and deletes."""
+        self._info_index = info_index
 
     def add_command(self, command: Command) -> None:
+        """Add the command, or add its count to the stored one."""
+        self.add_commands([command])
+
+    def add_commands(self, commands: List[Command],
+                     checkpoint: Optional[HistoryImportCheckpoint] = None) -> None:
+        """Add every command in a single transaction, along with the import checkpoint."""
         db_connection = self._get_initialized_db_connection()
-        with db_connection:
-            command_rowid = self._create_or_update_command(command)
-            dir_context = command.get_directory_context()
-            if dir_context is not None:
-                context_rowid = self._create_or_insert_directory_context(dir_context)
-                self._insert_into_command_context(command_rowid, context_rowid)
+        try:
+            with db_connection:
+                if checkpoint:
+                    db_connection.execute(INSERT_OR_REPLACE_HISTORY_IMPORT_CHECKPOINT, (
+                        checkpoint.history_file_path, checkpoint.device, checkpoint.inode,
+                        checkpoint.byte_offset))
+                for command in commands:
+                    command_rowid = self._create_or_update_command(command)
+                    dir_context = command.get_directory_context()
+                    if dir_context is not None:
+                        context_rowid = self._create_or_insert_directory_context(dir_context)
+                        self._insert_into_command_context(
+                            command_rowid, context_rowid, command.get_count_seen())
+        except sqlite3.Error:
+            # Directories inserted by the rolled back transaction may be cached.
+            self._clear_directory_cache()
+            raise
 
     def delete_command(self, command_str: str) -> Optional[str]:
         db_conn = self._get_initialized_db_connection()
         with db_conn:
+            row_id = self._get_rowid_of_command(command_str)
             cur = db_conn.cursor()
             cur.execute(DELETE_FROM_REMEMBER, (command_str,))
             db_conn.commit()
             if cur.rowcount == 0:
                 return None
-            return command_str
+        if self._info_index and row_id is not None:
+            self._info_index.remove_document(row_id)
+        return command_str
 
     def update_command_info(self, command: Command) -> None:
         db_connection = self._get_initialized_db_connection()
@@ -116,6 +256,31 @@ class SqlCommandStore(object):
             cursor = db_connection.cursor()
             cursor.execute(UPDATE_COMMAND_INFO_QUERY,
                            (command.get_command_info(), command.get_unique_command_id(),))
+            row_id = self._get_rowid_of_command(command.get_unique_command_id())
+        if self._info_index and row_id is not None:
+            self._info_index.update_document(row_id, _get_info_index_text(command))
+
+    def get_info_index_documents(self) -> List[Tuple[int, str]]:
+        """Return the (rowid, text) documents the ranked command info index is built from."""
+        db_conn = self._get_initialized_db_connection()
+        with db_conn:
+            cursor = db_conn.cursor()
+            cursor.execute(SELECT_ANNOTATED_COMMANDS)
+            return [(row[0], _get_info_index_text(Command(row[1], row[3], row[2], row[4])))
+                    for row in cursor.fetchall()]
+
+    def get_commands_by_rowids(self, row_ids: List[int]) -> List[Command]:
+        """Return the commands for the rowids in the same order, unknown rowids are skipped."""
+        if not row_ids:
+            return []
+        db_conn = self._get_initialized_db_connection()
+        with db_conn:
+            cursor = db_conn.cursor()
+            placeholders = ','.join('?' * len(row_ids))
+            cursor.execute(SELECT_COMMANDS_BY_ROWIDS.format(placeholders), row_ids)
+            commands = {row[0]: Command(row[1], row[3], row[2], row[4])
+                        for row in cursor.fetchall()}
+        return [commands[x] for x in row_ids if x in commands]
 
     def has_command(self, command: Command) -> bool:
         """This method checks to see if a command is in the store. """
@@ -147,35 +312,387 @@ class SqlCommandStore(object):
                         search_terms: List[str],
                         starts_with: bool = False,
                         sort: bool = True,
-                        search_info: bool = False) -> List[Command]:
-        """This method searches the command store for the command given."""
-        search_query = _create_command_search_select_query(
-            search_terms, starts_with, sort, search_info)
+                        search_info: bool = False,
+                        fuzzy: bool = False,
+                        fuzzy_limit: int = DEFAULT_FUZZY_LIMIT,
+                        match_all: bool = False,
+                        limit: Optional[int] = None,
+                        since: Optional[float] = None,
+                        before: Optional[float] = None) -> List[Command]:
+        """This method searches the command store for the command given.
+
+        By default a command matches if any of the terms match, match_all requires all of them.
+        since and before restrict the results to the commands last used in that time range.
+        """
+        time_range_clause, time_range_params = _get_time_range_clause(since, before)
+        if fuzzy:
+            return self._fuzzy_search_commands(
+                search_terms, fuzzy_limit, time_range_clause, time_range_params)
+        search_query, params = _create_command_search_select_query(
+            search_terms, starts_with, sort, search_info, match_all, time_range_clause)
+        params.extend(time_range_params)
+        if limit is not None:
+            search_query += f' LIMIT {int(limit)}'
         matches = []
         db_conn = self._get_initialized_db_connection()
         with db_conn:
             cursor = db_conn.cursor()
-            cursor.execute(search_query)
+            cursor.execute(search_query, params)
             rows = cursor.fetchall()
             for row in rows:
                 command = Command(row[0], row[2], row[1], row[3])
                 matches.append(command)
-        return _rerank_matches(matches, search_terms)
+        with timing.phase(timing.PHASE_RERANK):
+            return _rerank_matches(matches, search_terms)
+
+    def set_interrupt_check(self, should_interrupt: Optional[Callable[[], bool]],
+                            num_steps: int = INTERRUPT_CHECK_STEPS) -> None:
+        """Abort running queries with sqlite3.OperationalError when should_interrupt is true.
+
+        Passing None removes the check.
+        """
+        self._should_interrupt = should_interrupt
+        self._interrupt_check_steps = num_steps
+        self._update_progress_handler(self._get_initialized_db_connection())
+
+    def get_query_profiler(self) -> Optional['QueryProfiler']:
+        return self._profiler
+
+    def write_query_plans(self, file_path: str, count: int) -> None:
+        """Save the EXPLAIN QUERY PLAN of the count slowest profiled statements."""
+        assert self._profiler
+        plans = self._profiler.explain_slowest(self._get_initialized_db_connection(), count)
+        with open(file_path, 'w') as plans_file:
+            plans_file.write(plans)
+
+    def _update_progress_handler(self, db_conn: sqlite3.Connection) -> None:
+        """One progress handler serves both the interrupt check and the profiler."""
+        profiler = self._profiler
+        should_interrupt = self._should_interrupt
+        if not profiler and not should_interrupt:
+            db_conn.set_progress_handler(None, self._interrupt_check_steps)
+            return
+
+        def on_progress() -> int:
+            if profiler:
+                profiler.on_progress()
+            return 1 if should_interrupt and should_interrupt() else 0
+
+        num_steps = profiler.steps_per_callback if profiler else self._interrupt_check_steps
+        db_conn.set_progress_handler(on_progress, num_steps)
+
+    def _fuzzy_search_commands(self, search_terms: List[str], limit: int,
+                               time_range_clause: str = '',
+                               time_range_params: Optional[List[float]] = None) -> List[Command]:
+        # Imported here so that numpy is only loaded when a fuzzy search is requested.
+        from remember import fuzzy_search
+        terms = [term for term in search_terms if term]
+        search_query, params = _create_fuzzy_prefilter_query(
+            terms, fuzzy_search.is_case_sensitive(terms), time_range_clause)
+        params.extend(time_range_params or [])
+        db_conn = self._get_initialized_db_connection()
+        with db_conn:
+            cursor = db_conn.cursor()
+            cursor.execute(search_query, params)
+            rows = cursor.fetchall()
+        with timing.phase(timing.PHASE_RERANK):
+            top_matches = fuzzy_search.top_k_matches(
+                terms, [row[0] for row in rows], [row[1] for row in rows],
+                [row[2] for row in rows], limit)
+        return [Command(rows[index][0], rows[index][2], rows[index][1], rows[index][3])
+                for _, _, _, index in top_matches]
+
+    def search_commands_by_tokens(self,
+                                  primary_command: Optional[str],
+                                  argument_tokens: List[str],
+                                  since: Optional[float] = None,
+                                  before: Optional[float] = None) -> List[Command]:
+        """Find the commands with the exact primary command and argument tokens.
+
+        ex: primary_command 'docker' with argument_tokens ['--rm']. The token index posting
+        lists are intersected instead of scanning the command strings. since and before
+        restrict the results to the commands last used in that time range.
+        """
+        postings = []
+        params: List = []
+        if primary_command:
+            postings.append(SELECT_PRIMARY_TOKEN_POSTINGS)
+            params.append(primary_command)
+        for token in argument_tokens:
+            postings.append(SELECT_ARGUMENT_TOKEN_POSTINGS)
+            params.append(token)
+        if not postings:
+            return []
+        time_range_clause, time_range_params = _get_time_range_clause(since, before)
+        search_query = SEARCH_COMMANDS_BY_TOKENS_QUERY.format(
+            ' INTERSECT '.join(postings), 'AND ' + time_range_clause if time_range_clause else '')
+        params.extend(time_range_params)
+        db_conn = self._get_initialized_db_connection()
+        with db_conn:
+            cursor = db_conn.cursor()
+            cursor.execute(search_query, params)
+            return [Command(row[0], row[2], row[1], row[3]) for row in cursor.fetchall()]
+
+    def get_primary_command_stats(self, limit: int) -> List[PrimaryCommandStats]:
+        """The most used primary commands, read from the aggregate table."""
+        db_conn = self._get_initialized_db_connection()
+        with db_conn:
+            cursor = db_conn.cursor()
+            cursor.execute(SELECT_TOP_PRIMARY_COMMANDS, (limit,))
+            return [PrimaryCommandStats(*row) for row in cursor.fetchall()]
+
+    def get_primary_command_stat(self, primary_command: str) -> Optional[PrimaryCommandStats]:
+        db_conn = self._get_initialized_db_connection()
+        with db_conn:
+            cursor = db_conn.cursor()
+            cursor.execute(SELECT_PRIMARY_COMMAND, (primary_command,))
+            row = cursor.fetchone()
+            return PrimaryCommandStats(*row) if row else None
+
+    def delete_stale_commands(self, used_before: float, keep_annotated: bool,
+                              batch_size: int) -> int:
+        """Delete the commands only ever seen once and last used before used_before.
+
+        Every batch is its own transaction so the store is never locked for long. Returns the
+        number of deleted commands.
+        """
+        select_query = SELECT_STALE_COMMANDS.format(NOT_ANNOTATED_CLAUSE if keep_annotated else '')
+        db_conn = self._get_initialized_db_connection()
+        total_deleted = 0
+        while True:
+            with db_conn:
+                row_ids = [row[0] for row in
+                           db_conn.execute(select_query, (used_before, batch_size)).fetchall()]
+                if row_ids:
+                    db_conn.execute(
+                        DELETE_COMMANDS_BY_ROWIDS.format(','.join('?' * len(row_ids))), row_ids)
+            if self._info_index:
+                for row_id in row_ids:
+                    self._info_index.remove_document(row_id)
+            total_deleted += len(row_ids)
+            if len(row_ids) < batch_size:
+                return total_deleted
+
+    def delete_excess_directory_contexts(self, max_per_directory: int, batch_size: int) -> int:
+        """Keep only the max_per_directory most recently used commands of every directory.
+
+        The excess rows are ranked once and deleted batch_size rows per transaction, returns
+        the number of deleted context rows.
+        """
+        db_conn = self._get_initialized_db_connection()
+        row_ids = [row[0] for row in db_conn.execute(SELECT_EXCESS_CONTEXTS, (max_per_directory,))]
+        for start in range(0, len(row_ids), batch_size):
+            batch = row_ids[start:start + batch_size]
+            with db_conn:
+                db_conn.execute(DELETE_CONTEXTS_BY_ROWIDS.format(','.join('?' * len(batch))), batch)
+        return len(row_ids)
+
+    def compact(self, max_pages: Optional[int] = None) -> None:
+        """Return free pages to the file system and refresh the query planner statistics.
+
+        A store that wasn't created with incremental auto vacuum is converted with one full
+        VACUUM, afterwards only up to max_pages free pages (all when None) are released.
+        """
+        db_conn = self._get_initialized_db_connection()
+        if db_conn.execute(AUTO_VACUUM_PRAGMA).fetchone()[0] != AUTO_VACUUM_INCREMENTAL:
+            db_conn.execute(SET_AUTO_VACUUM_INCREMENTAL_PRAGMA)
+            db_conn.execute(VACUUM_STATEMENT)
+        else:
+            db_conn.execute(INCREMENTAL_VACUUM_PRAGMA.format(max_pages or 0)).fetchall()
+        db_conn.execute(ANALYZE_STATEMENT)
+        db_conn.commit()
+
+    def enable_write_ahead_log(self) -> bool:
+        """Switch the store file to WAL so searches can run while another connection writes.
+
+        The journal mode is persistent, returns False for in memory stores which can't use it.
+        """
+        db_conn = self._get_initialized_db_connection()
+        return db_conn.execute(JOURNAL_MODE_WAL_PRAGMA).fetchone()[0] == JOURNAL_MODE_WAL
+
+    def get_journal_mode(self) -> str:
+        return self._get_initialized_db_connection().execute(JOURNAL_MODE_PRAGMA).fetchone()[0]
+
+    def set_journal_mode(self, journal_mode: str) -> bool:
+        """Switch the journal mode back, ex: after enable_write_ahead_log.
+
+        Leaving WAL needs every other connection to the file closed, returns False when the
+        mode couldn't be changed. The switch is made on a new connection, WAL commits don't bump
+        the file change counter so the pages this one cached could be stale in the old mode.
+        """
+        self.close()
+        db_conn = self._get_initialized_db_connection()
+        try:
+            new_mode = db_conn.execute(SET_JOURNAL_MODE_PRAGMA.format(journal_mode)).fetchone()[0]
+        except sqlite3.OperationalError:
+            return False
+        return new_mode == journal_mode.lower()
+
+    @contextmanager
+    def in_memory_snapshot(self, write_back: bool = False) -> Iterator['SqlCommandStore']:
+        """Run the with block against an in memory copy of the store.
+
+        Bursts of queries then skip the file locking and page reads of the store file. With
+        write_back the copy replaces the store file in a single transaction when the block
+        succeeds, unless another connection changed the file since the copy was made.
+        """
+        db_conn = self._get_initialized_db_connection()
+        db_conn.commit()
+        data_version = db_conn.execute(DATA_VERSION_PRAGMA).fetchone()[0]
+        if self._profiler:
+            memory_conn = _create_db_connection(':memory:', self._profiler.connection_factory)
+            self._profiler.install(memory_conn)
+        else:
+            memory_conn = _create_db_connection(':memory:')
+        self._update_progress_handler(memory_conn)
+        db_conn.backup(memory_conn)
+        memory_conn.execute(PRAGMA_STR)
+        memory_conn.execute(FOREIGN_KEY_PRAGMA)
+        self._db_conn = memory_conn
+        try:
+            yield self
+            if write_back:
+                memory_conn.commit()
+                self._write_back(memory_conn, db_conn, data_version)
+        finally:
+            self._db_conn = db_conn
+            memory_conn.close()
+            # Directories created in the snapshot may not exist in the store file.
+            self._clear_directory_cache()
+
+    def _write_back(self, memory_conn: sqlite3.Connection, db_conn: sqlite3.Connection,
+                    data_version: int) -> None:
+        # The backup can't run in a transaction of the store file, in exclusive locking mode the
+        # write lock of the check is kept until the backup is done so no commit slips in between.
+        db_conn.execute(EXCLUSIVE_LOCKING_MODE_PRAGMA)
+        try:
+            db_conn.execute(BEGIN_IMMEDIATE)
+            changed = db_conn.execute(DATA_VERSION_PRAGMA).fetchone()[0] != data_version
+            db_conn.commit()
+            if changed:
+                raise RuntimeError(f'{self._db_file} changed while the snapshot was in use, '
+                                   'the snapshot was not written back.')
+            memory_conn.backup(db_conn)
+        finally:
+            db_conn.execute(NORMAL_LOCKING_MODE_PRAGMA)
+            # The locks are only released on the next access.
+            db_conn.execute(DATA_VERSION_PRAGMA)
+
+    def close(self) -> None:
+        if self._db_conn:
+            self._db_conn.close()
+            self._db_conn = None
+
+    def get_history_file_state(self, history_file_path: str) -> Optional[HistoryFileState]:
+        """The state of the history file when it was last fully ingested, if ever."""
+        db_conn = self._get_initialized_db_connection()
+        row = db_conn.execute(SELECT_HISTORY_FILE_STATE, (history_file_path,)).fetchone()
+        return HistoryFileState(*row) if row else None
+
+    def set_history_file_state(self, history_file_path: str, state: HistoryFileState) -> None:
+        db_conn = self._get_initialized_db_connection()
+        with db_conn:
+            db_conn.execute(INSERT_OR_REPLACE_HISTORY_FILE_STATE,
+                            (history_file_path, state.device, state.inode, state.size,
+                             state.mtime_ns))
+
+    def get_history_import_checkpoint(
+            self, history_file_path: str) -> Optional[HistoryImportCheckpoint]:
+        db_conn = self._get_initialized_db_connection()
+        row = db_conn.execute(SELECT_HISTORY_IMPORT_CHECKPOINT, (history_file_path,)).fetchone()
+        return HistoryImportCheckpoint(history_file_path, *row) if row else None
+
+    def get_history_read_position(self, history_file_path: str) -> Optional[HistoryReadPosition]:
+        db_conn = self._get_initialized_db_connection()
+        row = db_conn.execute(SELECT_HISTORY_READ_POSITION, (history_file_path,)).fetchone()
+        return HistoryReadPosition(*row) if row else None
+
+    def set_history_read_position(self, history_file_path: str,
+                                  position: HistoryReadPosition) -> None:
+        db_conn = self._get_initialized_db_connection()
+        with db_conn:
+            db_conn.execute(INSERT_OR_REPLACE_HISTORY_READ_POSITION,
+                            (history_file_path, position.device, position.inode,
+                             position.byte_offset, position.anchor_lines, position.fingerprint))
+
+    def get_storage_stats(self) -> StorageStats:
+        db_conn = self._get_initialized_db_connection()
+        page_size = db_conn.execute(PAGE_SIZE_PRAGMA).fetchone()[0]
+        return StorageStats(db_conn.execute(COUNT_COMMANDS_QUERY).fetchone()[0],
+                            db_conn.execute(COUNT_COMMAND_CONTEXTS_QUERY).fetchone()[0],
+                            db_conn.execute(PAGE_COUNT_PRAGMA).fetchone()[0] * page_size,
+                            db_conn.execute(FREELIST_COUNT_PRAGMA).fetchone()[0] * page_size)
+
+    def get_most_used_commands_since(self, since: float, search_terms: List[str], limit: int,
+                                     starts_with: bool = False, search_info: bool = False,
+                                     primary_command: Optional[str] = None,
+                                     before: Optional[float] = None) -> List[Command]:
+        """The commands used the most since the given time, best first.
+
+        The count of every returned command is its number of uses in the window. The window
+        starts at the beginning of the day (UTC) of since. before keeps only the commands last
+        used before then.
+        """
+        or_chain, or_params = _get_sql_or_chain(search_terms, starts_with, search_info)
+        where_clause = 'AND ' + or_chain if or_chain else ''
+        params: List = [_get_day(since), *or_params]
+        if primary_command:
+            where_clause += ' ' + WINDOW_USAGE_PRIMARY_COMMAND_CLAUSE
+            params.append(primary_command)
+        if before is not None:
+            where_clause += ' AND ' + LAST_USED_BEFORE_CLAUSE
+            params.append(before)
+        params.append(limit)
+        db_conn = self._get_initialized_db_connection()
+        with db_conn:
+            cursor = db_conn.cursor()
+            cursor.execute(SELECT_WINDOW_USAGE_COMMANDS.format(where_clause), params)
+            return [Command(row[0], row[2], row[1], row[3]) for row in cursor.fetchall()]
+
+    def get_primary_command_stats_since(
+            self, since: float, limit: int,
+            primary_command: Optional[str] = None) -> List[PrimaryCommandStats]:
+        """Like get_primary_command_stats but only counting the uses since the given time."""
+        select_command = SELECT_WINDOW_PRIMARY_COMMANDS.format(
+            WINDOW_PRIMARY_COMMAND_CLAUSE if primary_command else '')
+        params: List = [_get_day(since)]
+        if primary_command:
+            params.append(primary_command)
+        params.append(limit)
+        db_conn = self._get_initialized_db_connection()
+        with db_conn:
+            cursor = db_conn.cursor()
+            cursor.execute(select_command, params)
+            return [PrimaryCommandStats(*row) for row in cursor.fetchall()]
+
+    def get_command_with_context(self, directory_path: str, search_terms: List[str],
+                                 recursive: bool = False, since: Optional[float] = None,
+                                 before: Optional[float] = None) -> List[Command]:
+        """The commands run in the directory, newest first.
 
-    def get_command_with_context(
-            self, directory_path: str, search_terms: List[str]) -> List[Command]:
-        or_chain = _get_sql_or_chain(search_terms, False, False)
+        When recursive the commands run anywhere below the directory are included too. since
+        and before restrict the results to the commands last used in that time range.
+        """
+        or_chain, or_params = _get_sql_or_chain(search_terms, False, False)
         if or_chain:
             or_chain = 'AND ' + or_chain
-        select_command = SELECT_CONTEXT_COMMANDS.format(or_chain)
+        time_range_clause, time_range_params = _get_time_range_clause(since, before)
+        if time_range_clause:
+            or_chain += ' AND ' + time_range_clause
+        query = SELECT_SUBTREE_CONTEXT_COMMANDS if recursive else SELECT_CONTEXT_COMMANDS
+        select_command = query.format(or_chain)
         matches = []
         db_conn = self._get_initialized_db_connection()
         with db_conn:
+            directory_id = self._get_directory_id(directory_path)
+            if directory_id is None:
+                return []
             cursor = db_conn.cursor()
-            cursor.execute(select_command, (directory_path,))
+            cursor.execute(select_command, (directory_id, *or_params, *time_range_params))
             rows = cursor.fetchall()
             for row in rows:
-                command = Command(row[0], row[1], row[2], row[3], row[4])
+                command = Command(row[0], row[1], row[2], row[3],
+                                  self._get_directory_path(row[4]))
                 matches.append(command)
         return matches
 
@@ -196,50 +713,124 @@ class SqlCommandStore(object):
                                  command.last_used_time(), command.get_command_info())
             cursor.execute(INSERT_INTO_REMEMBER_QUERY, row_insert_values)
             row_id = cursor.lastrowid
+            assert row_id is not None
+            self._insert_command_tokens(row_id, command)
+            if command.get_primary_command():
+                cursor.execute(INSERT_OR_ADD_PRIMARY_COMMAND,
+                               (command.get_primary_command(), command.get_count_seen(), 1,
+                                command.last_used_time()))
+            cursor.execute(INSERT_OR_ADD_USAGE_BUCKET,
+                           (row_id, _get_day(command.last_used_time()), command.get_count_seen()))
         else:
-            cursor.execute(UPDATE_REMEMBER_COUNT_QUERY, (command.last_used_time(), row_id,))
+            cursor.execute(UPDATE_REMEMBER_COUNT_QUERY,
+                           (command.get_count_seen(), command.last_used_time(), row_id,))
+            cursor.execute(UPDATE_PRIMARY_COMMAND_COUNT_QUERY,
+                           (command.get_count_seen(), command.last_used_time(),
+                            command.get_primary_command()))
+            cursor.execute(INSERT_OR_ADD_USAGE_BUCKET,
+                           (row_id, _get_day(command.last_used_time()), command.get_count_seen()))
         assert(row_id is not None)
         return row_id
 
-    def _get_directory_context_row(self, dir_context: str) -> Optional[int]:
-        # This should just insert if not there and return the rowid
+    def _insert_command_tokens(self, command_rowid: int, command: Command) -> None:
         cursor = self._get_initialized_db_connection().cursor()
-        cursor.execute(GET_ROWID_FROM_DIRECTORIES, (dir_context,))
-        data = cursor.fetchone()
-        return data[0] if data else None
+        cursor.executemany(INSERT_INTO_COMMAND_TOKENS,
+                           [(token, position, command_rowid)
+                            for token, position in _get_command_tokens(command)])
+
+    def _get_directory_id(self, directory_path: str, create: bool = False) -> Optional[int]:
+        """Walk the directory tree down to the path, creating the missing components if asked."""
+        if directory_path in self._directory_ids:
+            return self._directory_ids[directory_path]
+        cursor = self._get_initialized_db_connection().cursor()
+        components = directory_path.split(PATH_SEPARATOR)
+        directory_id = ROOT_DIRECTORY_ID
+        for depth, name in enumerate(components):
+            prefix = PATH_SEPARATOR.join(components[:depth + 1])
+            cached_id = self._directory_ids.get(prefix)
+            if cached_id is not None:
+                directory_id = cached_id
+                continue
+            cursor.execute(GET_ROWID_FROM_DIRECTORIES, (directory_id, name))
+            data = cursor.fetchone()
+            if data:
+                directory_id = data[0]
+            elif create:
+                cursor.execute(INSERT_INTO_DIRECTORIES_QUERY, (directory_id, name))
+                assert cursor.lastrowid is not None
+                directory_id = cursor.lastrowid
+            else:
+                return None
+            self._cache_directory(prefix, directory_id)
+        return directory_id
+
+    def _get_directory_path(self, directory_id: int) -> str:
+        """Rebuild the full path of a directory from its ancestors."""
+        directory_path = self._directory_paths.get(directory_id)
+        if directory_path is None:
+            cursor = self._get_initialized_db_connection().cursor()
+            cursor.execute(SELECT_DIRECTORY_ANCESTORS, (directory_id,))
+            directory_path = PATH_SEPARATOR.join(row[0] for row in cursor.fetchall())
+            self._cache_directory(directory_path, directory_id)
+        return directory_path
+
+    def _cache_directory(self, directory_path: str, directory_id: int) -> None:
+        self._directory_ids[directory_path] = directory_id
+        self._directory_paths[directory_id] = directory_path
+
+    def _clear_directory_cache(self) -> None:
+        self._directory_ids = {}
+        self._directory_paths = {}
 
     def _create_or_insert_directory_context(self, directory_path: str) -> int:
         assert(directory_path is not None)
-        directory_row_id = self._get_directory_context_row(directory_path)
-        if not directory_row_id:
-            cursor = self._get_initialized_db_connection().cursor()
-            cursor.execute(INSERT_INTO_DIRECTORIES_QUERY, (directory_path,))
-            directory_row_id = cursor.lastrowid
+        directory_row_id = self._get_directory_id(directory_path, create=True)
         assert(directory_row_id is not None)
         return directory_row_id
 
     def _get_initialized_db_connection(self) -> sqlite3.Connection:
         if not self._db_conn:
-            self._db_conn = _create_db_connection(self._db_file)
-            assert self._db_conn
-            self._db_conn.execute(PRAGMA_STR)
-            self._db_conn.execute(FOREIGN_KEY_PRAGMA)
-            if not self._table_creation_verified:
-                for table_name, create_statement in CREATE_TABLES.items():
-                    _init_tables_if_not_exists(self._db_conn, table_name, create_statement)
-                self._table_creation_verified = True
+            with timing.phase(timing.PHASE_CONNECT):
+                if self._profiler:
+                    self._db_conn = _create_db_connection(
+                        self._db_file, self._profiler.connection_factory, self._read_only)
+                    self._profiler.install(self._db_conn)
+                    self._update_progress_handler(self._db_conn)
+                else:
+                    self._db_conn = _create_db_connection(self._db_file,
+                                                          read_only=self._read_only)
+                assert self._db_conn
+                self._db_conn.execute(PRAGMA_STR)
+                self._db_conn.execute(FOREIGN_KEY_PRAGMA)
+                if self._read_only:
+                    self._db_conn.execute(CACHE_SIZE_PRAGMA.format(READ_ONLY_CACHE_SIZE_KIB))
+                    self._db_conn.execute(MMAP_SIZE_PRAGMA.format(READ_ONLY_MMAP_SIZE))
+            if not self._schema_migrated:
+                with timing.phase(timing.PHASE_TABLE_CHECK):
+                    if self._read_only:
+                        if get_schema_version(self._db_conn) < SCHEMA_VERSION:
+                            # A store from an older release is opened for writing once so it
+                            # can be migrated.
+                            self.close()
+                            self._read_only = False
+                            return self._get_initialized_db_connection()
+                    else:
+                        migrate(self._db_conn)
+                self._schema_migrated = True
         return self._db_conn
 
-    def _insert_into_command_context(self, command_rowid: int, context_rowid: int) -> None:
+    def _insert_into_command_context(self, command_rowid: int, context_rowid: int,
+                                     count: int = 1) -> None:
         # This should just insert if not there and return the rowid
         db_conn = self._get_initialized_db_connection()
         cursor = db_conn.cursor()
         cursor.execute(GET_ROWID_FROM_COMMAND_CONTEXT, (command_rowid, context_rowid,))
         data = cursor.fetchone()
         if data is None:
-            db_conn.cursor().execute(INSERT_INTO_COMMAND_CONTEXT, [command_rowid, context_rowid])
+            db_conn.cursor().execute(INSERT_INTO_COMMAND_CONTEXT,
+                                     [command_rowid, context_rowid, count])
         else:
-            db_conn.cursor().execute(UPDATE_COMMAND_CONTEXT_COUNT_QUERY, (data[0],))
+            db_conn.cursor().execute(UPDATE_COMMAND_CONTEXT_COUNT_QUERY, (count, data[0],))
 
 
 class IgnoreRules(object):
@@ -281,7 +872,22 @@ class IgnoreRules(object):
         return len(self._matches)
 
 
+def _get_command_tokens(command: Command) -> List[Tuple[str, int]]:
+    """(token, position) pairs where position 0 is the primary command."""
+    tokens = [(command.get_primary_command(), 0)]
+    tokens.extend((arg, index + 1) for index, arg in enumerate(command.get_command_args()))
+    return [(token, position) for token, position in tokens if token]
+
+
+def _get_info_index_text(command: Command) -> str:
+    if not command.get_command_info():
+        return ''
+    return f'{command.get_command_info()} {command.get_unique_command_id()}'
+
+
 def _rerank_matches(commands: List[Command], terms: List[str]) -> List[Command]:
+    if not terms:
+        return commands
     results: List[List[Command]] = [[] for _ in range(len(terms))]
     for command in commands:
         index = _num_terms_matched_in_command(command, terms) - 1
@@ -302,53 +908,103 @@ def _num_terms_matched_in_command(command: Command, terms: List[str]) -> int:
     return count
 
 
-def _get_sql_or_chain(search_terms: List, starts_with: bool, search_info: bool) -> str:
+def _get_day(timestamp: float) -> int:
+    """The usage bucket (days since the epoch, UTC) of a timestamp."""
+    return int(timestamp // SECONDS_PER_DAY)
+
+
+def _get_sql_or_chain(search_terms: List, starts_with: bool,
+                      search_info: bool) -> Tuple[str, List[str]]:
+    """The predicate matching any of the terms literally and its LIKE patterns."""
     if len(search_terms) == 0:
-        return ''
+        return '', []
     where_terms = []
+    params = []
     prepend_term = '' if starts_with else '%'
     for term in search_terms:
-        like_term = prepend_term + term + '%'
-        where_terms.append("full_command LIKE '{}'".format(like_term))
+        like_term = prepend_term + _escape_like_term(term) + '%'
+        where_terms.append(ESCAPED_LIKE_CLAUSE.format('full_command'))
+        params.append(like_term)
         if search_info:
-            where_terms.append("command_info LIKE '{}'".format(like_term))
-    return f'({" OR ".join(where_terms)})'
+            where_terms.append(ESCAPED_LIKE_CLAUSE.format('command_info'))
+            params.append(like_term)
+    return f'({" OR ".join(where_terms)})', params
 
 
-def _create_command_search_select_query(search_term: List, starts_with: bool, sort: bool,
-                                        search_info: bool) -> str:
-    where_clause = 'WHERE ' + _get_sql_or_chain(search_term, starts_with, search_info)
-    query = SEARCH_COMMANDS_QUERY.format(where_clause)
-    if sort:
-        query = query + ' ORDER BY count_seen DESC, last_used DESC'
-    return query
+def _get_sql_and_chain(search_terms: List, starts_with: bool,
+                       search_info: bool) -> Tuple[str, List[str]]:
+    """The predicate matching all of the terms literally and its LIKE patterns."""
+    if len(search_terms) == 0:
+        return '', []
+    where_terms = []
+    params: List[str] = []
+    for term in search_terms:
+        or_chain, or_params = _get_sql_or_chain([term], starts_with, search_info)
+        where_terms.append(or_chain)
+        params.extend(or_params)
+    return f'({" AND ".join(where_terms)})', params
 
 
-def _init_tables_if_not_exists(db_conn: sqlite3.Connection,
-                               table_name: str,
-                               sql_create_statement: str) -> None:
-    """ Create the table if it doesn't exist in the DB."""
-    if not _table_exists(db_conn, table_name):
-        _create_db_table(db_conn, table_name, sql_create_statement)
+def _escape_like_term(term: str) -> str:
+    """The term with the LIKE wildcards and the escape character escaped."""
+    return ''.join(LIKE_ESCAPE_CHAR + x if x in ('%', '_', LIKE_ESCAPE_CHAR) else x
+                   for x in term)
 
 
-def _create_db_connection(db_file_path: str) -> sqlite3.Connection:
-    """Create and return the DB connection."""
-    return sqlite3.connect(db_file_path)
+def _get_time_range_clause(since: Optional[float],
+                           before: Optional[float]) -> Tuple[str, List[float]]:
+    """The last_used predicate and its parameters for the time range, empty when unbounded."""
+    where_terms = []
+    params = []
+    if since is not None:
+        where_terms.append(LAST_USED_SINCE_CLAUSE)
+        params.append(since)
+    if before is not None:
+        where_terms.append(LAST_USED_BEFORE_CLAUSE)
+        params.append(before)
+    return ' AND '.join(where_terms), params
+
+
+def _create_fuzzy_prefilter_query(search_terms: List[str], case_sensitive: bool,
+                                  time_range_clause: str = '') -> Tuple[str, List]:
+    column = 'full_command' if case_sensitive else 'lower(full_command)'
+    where_terms = []
+    params: List = []
+    for term in search_terms:
+        term = term if case_sensitive else term.lower()
+        where_terms.append(ESCAPED_LIKE_CLAUSE.format(column))
+        params.append(_create_subsequence_like_pattern(term))
+    if time_range_clause:
+        # Its parameters are appended after the term patterns by the caller.
+        where_terms.append(time_range_clause)
+    where_clause = f'WHERE {" AND ".join(where_terms)}' if where_terms else ''
+    return SEARCH_COMMANDS_QUERY.format(where_clause), params
 
 
-def _table_exists(db_conn: sqlite3.Connection, table_name: str) -> bool:
-    """Check if the sql table exists."""
-    c = db_conn.cursor()
-    c.execute(TABLE_EXISTS_QUERY.format(table_name))
-    db_conn.commit()
-    if c.fetchone()[0] == 1:
-        return True
-    return False
+def _create_subsequence_like_pattern(term: str) -> str:
+    """Create a LIKE pattern that only matches strings containing term as a subsequence."""
+    return '%' + '%'.join(_escape_like_term(x) for x in term) + '%'
 
 
-def _create_db_table(db_conn: sqlite3.Connection, table_name: str, create_statement: str) -> None:
-    """ create a database connection to a SQLite database """
-    print(f'Creating {table_name} table')
-    c = db_conn.cursor()
-    c.execute(create_statement.format(table_name))
+def _create_command_search_select_query(search_term: List, starts_with: bool, sort: bool,
+                                        search_info: bool, match_all: bool = False,
+                                        time_range_clause: str = '') -> Tuple[str, List]:
+    create_chain = _get_sql_and_chain if match_all else _get_sql_or_chain
+    chain, params = create_chain(search_term, starts_with, search_info)
+    conditions = [x for x in (chain, time_range_clause) if x]
+    where_clause = 'WHERE ' + ' AND '.join(conditions) if conditions else ''
+    query = SEARCH_COMMANDS_QUERY.format(where_clause)
+    if sort:
+        query = query + ' ORDER BY count_seen DESC, last_used DESC'
+    # The parameters of the time range clause are appended by the caller.
+    return query, params
+
+
+def _create_db_connection(db_file_path: str,
+                          factory: type = sqlite3.Connection,
+                          read_only: bool = False) -> sqlite3.Connection:
+    """Create and return the DB connection."""
+    if read_only:
+        db_uri = f'file:{urllib.parse.quote(os.path.abspath(db_file_path))}?mode=ro'
+        return sqlite3.connect(db_uri, factory=factory, uri=True)
+    return sqlite3.connect(db_file_path, factory=factory)
@@ -1,6 +1,9 @@
 # flake8: noqa
 import io
 import os
+import shutil
+import tempfile
+import time
 import unittest
 from unittest import mock
 
@@ -125,8 +128,20 @@ class TestCommandStoreLib(unittest.TestCase):
             if file_path:
                 os.remove(file_path)
 
+    def setUp(self) -> None:
+        self._tmp_dir = tempfile.TemporaryDirectory()
+
+    def tearDown(self) -> None:
+        self._tmp_dir.cleanup()
+
+    def _copy_test_db(self) -> str:
+        """Opening a store can add tables so tests work on a copy of the checked in db."""
+        file_name = os.path.join(self._tmp_dir.name, "test_remember.db")
+        shutil.copyfile(os.path.join(TEST_FILES_PATH, "test_remember.db"), file_name)
+        return file_name
+
     def test_verify_read_sql_file(self) -> None:
-        file_name = os.path.join(TEST_FILES_PATH, "test_remember.db")
+        file_name = self._copy_test_db()
         store = command_store_lib.load_command_store(file_name)
         matches = store.search_commands([""], False)
         self.assertTrue(len(matches) > 0)
@@ -136,13 +151,25 @@ class TestCommandStoreLib(unittest.TestCase):
         self.assertEqual(matches[0].get_count_seen(), 2)
 
     def test_verify_read_sql_file_time(self) -> None:
-        file_name = os.path.join(TEST_FILES_PATH, "test_remember.db")
+        file_name = self._copy_test_db()
         self.assertTrue(os.path.isfile(file_name))
         store = command_store_lib.load_command_store(file_name)
         matches = store.search_commands([""], False)
         for m in matches:
             self.assertEqual(0, m.last_used_time())
 
+    def test_verify_read_sql_file_whenOpened_shouldBackfillTokenIndex(self) -> None:
+        store = command_store_lib.load_command_store(self._copy_test_db())
+        matches = store.search_commands_by_tokens('rm', ['somefile.txt'])
+        self.assertEqual(['rm somefile.txt'], [x.get_unique_command_id() for x in matches])
+
+    def test_verify_read_sql_file_whenOpened_shouldBackfillPrimaryCommands(self) -> None:
+        store = command_store_lib.load_command_store(self._copy_test_db())
+        stat = store.get_primary_command_stat('rm')
+        assert stat is not None
+        self.assertEqual(1, stat.distinct_variants)
+        self.assertEqual(2, stat.total_count)
+
     def test_readUnprocessedLinesOnly(self) -> None:
         file_name = os.path.join(TEST_FILES_PATH, "test_2unprocessed.txt")
         lines = command_store_lib.get_string_file_lines(file_name)
@@ -204,6 +231,11 @@ class TestCommandStoreLib(unittest.TestCase):
         self.assertEqual(": 1503848500:0;", command_store_lib.Command.get_curated_command(
             ": 1503848500:0; "))
 
+    def test_get_history_timestamp_whenZshExtendedHistory_shouldReturnItsStart(self) -> None:
+        self.assertEqual(1503848943.0, command_store_lib.Command.get_history_timestamp(
+            ": 1503848943:12;setopt SHARE_HISTORY"))
+        self.assertIsNone(command_store_lib.Command.get_history_timestamp("git status"))
+
     def test_delete_sql_whenExists_shouldDeleteFromStore(self) -> None:
         file_name = os.path.join(TEST_FILES_PATH, "test_input.txt")
         self.assertTrue(os.path.isfile(file_name))
@@ -298,9 +330,8 @@ class TestCommandStoreLib(unittest.TestCase):
     def test_when_generate_from_args_should_call_into_command_store_lib(
             self, mock_read_file: Mock) -> None:
         history_file_path = 'some/path'
-        return_result_list = ['1', '2']
         store = command_store_lib.SqlCommandStore()
-        with patch('remember.command_store_lib.get_string_file_lines', return_value=return_result_list):
+        with patch('remember.command_store_lib.get_file_bytes', return_value=b'1\n2\n'):
             with patch('remember.command_store_lib.load_command_store', return_value=store) :
                 command_store_lib.generate_store_from_args(history_file_path, TEST_FILES_PATH)
                 mock_read_file.assert_called_once_with()
@@ -331,7 +362,7 @@ class TestCommandStoreLib(unittest.TestCase):
         with patch('remember.command_store_lib.open', mock_open(read_data=hist_file_content)) as m:
             command_store_lib.start_history_processing(store, file_name, 'doesntmatter', 1)
         handle = m()
-        handle.write.assert_called_with(f'{command_store_lib.CUSTOM_HIST_HEAD}')
+        handle.write.assert_not_called()
         matches = store.search_commands(["add"], search_info=True)
         self.assertIsNotNone(matches)
         matches = store.search_commands(["add"], True)
@@ -339,6 +370,369 @@ class TestCommandStoreLib(unittest.TestCase):
         matches = store.search_commands(["vim"], True)
         self.assertTrue(len(matches) == 1)
 
+    def test_start_background_history_processing_whenJoined_shouldAddToStoreAndReport(
+            self) -> None:
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            history_file_path = os.path.join(tmp_dir, 'history.txt')
+            shutil.copyfile(os.path.join(TEST_FILES_PATH, 'custom_history_file.txt'),
+                            history_file_path)
+            store = SqlCommandStore(os.path.join(tmp_dir, 'remember.db'))
+            journal_mode = store.get_journal_mode()
+            history_processor = command_store_lib.start_background_history_processing(
+                store, history_file_path, tmp_dir, 1)
+            history_processor.join()
+            self.assertEqual(journal_mode, store.get_journal_mode())
+            self.assertFalse(os.path.exists(os.path.join(tmp_dir, 'remember.db-wal')))
+            self.assertEqual('Results include the latest commands.',
+                             history_processor.get_lag_message())
+            self.assertEqual(0, history_processor.get_unprocessed_count())
+            self.assertEqual(1, len(store.search_commands(['vim'], True)))
+            position = store.get_history_read_position(history_file_path)
+            assert position is not None
+            self.assertEqual(os.path.getsize(history_file_path), position.byte_offset)
+            store.close()
+
+    def test_start_history_processing_whenFileUnchanged_shouldNotReadIt(self) -> None:
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            history_file_path = os.path.join(tmp_dir, 'history.txt')
+            shutil.copyfile(os.path.join(TEST_FILES_PATH, 'test_input.txt'), history_file_path)
+            store = SqlCommandStore(':memory:')
+            command_store_lib.start_history_processing(store, history_file_path, tmp_dir, 1)
+            self.assertIsNotNone(store.get_history_file_state(history_file_path))
+            with patch('remember.command_store_lib.get_file_bytes') as read_mock:
+                command_store_lib.start_history_processing(store, history_file_path, tmp_dir, 1)
+                read_mock.assert_not_called()
+            with open(history_file_path, 'a') as history_file:
+                history_file.write('brand new command\n')
+            command_store_lib.start_history_processing(store, history_file_path, tmp_dir, 0)
+            self.assertEqual(1, len(store.search_commands(['brand new'])))
+
+    def test_start_history_processing_whenUnderThreshold_shouldReadTheFileAgainOnceAppended(
+            self) -> None:
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            history_file_path = os.path.join(tmp_dir, 'history.txt')
+            shutil.copyfile(os.path.join(TEST_FILES_PATH, 'test_input.txt'), history_file_path)
+            store = SqlCommandStore(':memory:')
+            command_store_lib.start_history_processing(store, history_file_path, tmp_dir, 1000)
+            self.assertIsNotNone(store.get_history_file_state(history_file_path))
+            self.assertIsNone(store.get_history_read_position(history_file_path))
+            with patch('remember.command_store_lib.get_file_bytes') as read_mock:
+                command_store_lib.start_history_processing(store, history_file_path, tmp_dir, 1)
+                read_mock.assert_not_called()
+            self.assertEqual([], store.search_commands(['subl'], True))
+            with open(history_file_path, 'a') as history_file:
+                history_file.write('brand new command\n')
+            command_store_lib.start_history_processing(store, history_file_path, tmp_dir, 1)
+            self.assertEqual(1, len(store.search_commands(['subl'], True)))
+            self.assertEqual(1, len(store.search_commands(['brand new'])))
+
+    def _get_counts(self, store: SqlCommandStore) -> dict:
+        return {x.get_unique_command_id(): x.get_count_seen() for x in store.search_commands([''])}
+
+    def test_start_history_processing_whenAppended_shouldOnlyReadNewCommands(self) -> None:
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            history_file_path = os.path.join(tmp_dir, 'history.txt')
+            with open(history_file_path, 'w') as history_file:
+                history_file.write('ls\ngit status\nmake\n')
+            store = SqlCommandStore(':memory:')
+            command_store_lib.start_history_processing(store, history_file_path, tmp_dir, 0)
+            position = store.get_history_read_position(history_file_path)
+            assert position is not None
+            self.assertEqual(os.path.getsize(history_file_path), position.byte_offset)
+            self.assertEqual(3, position.anchor_lines)
+            with open(history_file_path, 'a') as history_file:
+                history_file.write('make\nls -la\n')
+            with patch('remember.command_store_lib.get_file_bytes') as read_mock:
+                command_store_lib.start_history_processing(store, history_file_path, tmp_dir, 0)
+                read_mock.assert_not_called()
+            self.assertEqual({'ls': 1, 'git status': 1, 'make': 2, 'ls -la': 1},
+                             self._get_counts(store))
+
+    def test_start_history_processing_whenTruncatedInPlace_shouldOnlyReadNewCommands(self) -> None:
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            history_file_path = os.path.join(tmp_dir, 'history.txt')
+            with open(history_file_path, 'w') as history_file:
+                history_file.write(''.join(f'echo {x}\n' for x in range(20)))
+            store = SqlCommandStore(':memory:')
+            command_store_lib.start_history_processing(store, history_file_path, tmp_dir, 0)
+            inode = os.stat(history_file_path).st_ino
+            # The shell keeps the last commands it knows of, without the processed marker.
+            with open(history_file_path, 'w') as history_file:
+                history_file.write(''.join(f'echo {x}\n' for x in range(15, 20)) + 'vim new\n')
+            self.assertEqual(inode, os.stat(history_file_path).st_ino)
+            command_store_lib.start_history_processing(store, history_file_path, tmp_dir, 0)
+            counts = self._get_counts(store)
+            self.assertEqual(1, counts['vim new'])
+            self.assertEqual([1] * 20, [counts[f'echo {x}'] for x in range(20)])
+
+    def test_start_history_processing_whenReplaced_shouldReadTheNewFile(self) -> None:
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            history_file_path = os.path.join(tmp_dir, 'history.txt')
+            with open(history_file_path, 'w') as history_file:
+                history_file.write('ls\ngit status\nmake\n')
+            store = SqlCommandStore(':memory:')
+            command_store_lib.start_history_processing(store, history_file_path, tmp_dir, 0)
+            os.rename(history_file_path, history_file_path + '.1')
+            with open(history_file_path, 'w') as history_file:
+                history_file.write('make\nmake test\n')
+            command_store_lib.start_history_processing(store, history_file_path, tmp_dir, 0)
+            self.assertEqual({'ls': 1, 'git status': 1, 'make': 2, 'make test': 1},
+                             self._get_counts(store))
+
+    def test_start_history_processing_whenRewrittenWithRepeatedCommands_shouldReadThemAll(
+            self) -> None:
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            history_file_path = os.path.join(tmp_dir, 'history.txt')
+            with open(history_file_path, 'w') as history_file:
+                history_file.write('make\nls\nls\nls\n')
+            store = SqlCommandStore(':memory:')
+            command_store_lib.start_history_processing(store, history_file_path, tmp_dir, 0)
+            # Written to a new file and moved over the history, as zsh does.
+            with open(history_file_path + '.new', 'w') as history_file:
+                history_file.write('make\nls\nls\nls\nls\nls\n')
+            os.replace(history_file_path + '.new', history_file_path)
+            command_store_lib.start_history_processing(store, history_file_path, tmp_dir, 0)
+            self.assertEqual({'make': 1, 'ls': 5}, self._get_counts(store))
+
+    def test_read_unread_history_whenRewrittenAndGrown_shouldContinueAfterAnchor(self) -> None:
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            history_file_path = os.path.join(tmp_dir, 'history.txt')
+            with open(history_file_path, 'w') as history_file:
+                history_file.write('a\nb\nc\nd\n')
+            first_read = command_store_lib.read_unread_history(history_file_path, None)
+            self.assertEqual(['b', 'c', 'd'], first_read.read_end.anchor)
+            stat_result = os.stat(history_file_path)
+            position = command_store_lib.HistoryReadPosition(
+                stat_result.st_dev, stat_result.st_ino, stat_result.st_size, 3,
+                command_store_lib._get_fingerprint(first_read.read_end.anchor))
+            with open(history_file_path, 'w') as history_file:
+                history_file.write('c\nd\nb\nc\nd\ne\nf\n')
+            unread_history = command_store_lib.read_unread_history(history_file_path, position)
+            self.assertEqual(['e', 'f'], [x.command_line() for x in unread_history.commands])
+            self.assertEqual(['d', 'e', 'f'], unread_history.read_end.anchor)
+
+    def test_read_unread_history_whenFramedRecords_shouldJoinLinesAndKeepUnclosedRecord(
+            self) -> None:
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            history_file_path = os.path.join(tmp_dir, 'histcontext')
+            closed = '\x1e/src<<!>>for x in a b\ndo echo $x\ndone\x1f\n\x1e/src<<!>>ls\x1f\n'
+            with open(history_file_path, 'w') as history_file:
+                history_file.write(command_store_lib.CUSTOM_HIST_HEAD + closed +
+                                   '\x1e/src<<!>>make\nmake te')
+            unread_history = command_store_lib.read_unread_history(history_file_path, None)
+            self.assertEqual(['for x in a b\ndo echo $x\ndone', 'ls'],
+                             [x.command_line() for x in unread_history.commands])
+            self.assertEqual(['/src', '/src'], [x.directory_context() for x in unread_history.commands])
+            self.assertEqual(len((command_store_lib.CUSTOM_HIST_HEAD + closed).encode()),
+                             unread_history.read_end.byte_offset)
+
+    def test_start_history_processing_whenCustomFileAppendedWhileIngesting_shouldReadAppendOnce(
+            self) -> None:
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            history_file_path = os.path.join(tmp_dir, 'histcontext')
+            with open(history_file_path, 'w') as history_file:
+                history_file.write(command_store_lib.CUSTOM_HIST_HEAD + '/src<<!>>make\n'
+                                   '/src<<!>>make te')
+            store = SqlCommandStore(':memory:')
+            history_processor = command_store_lib.HistoryProcessor(store, history_file_path, tmp_dir, 0)
+            history_processor.process_history_file()
+            # The hook finishes its line and appends another before the file is updated.
+            with open(history_file_path, 'a') as history_file:
+                history_file.write('st\n/src<<!>>ls\n')
+            history_processor.update_history_file()
+            self.assertIsNone(store.get_history_file_state(history_file_path))
+            command_store_lib.start_history_processing(store, history_file_path, tmp_dir, 0)
+            command_store_lib.start_history_processing(store, history_file_path, tmp_dir, 0)
+            self.assertEqual({'make': 1, 'make test': 1, 'ls': 1}, self._get_counts(store))
+            self.assertIsNotNone(store.get_history_file_state(history_file_path))
+
+    def test_start_history_processing_whenCustomFileReadPastCompactSize_shouldSwapInNewFile(
+            self) -> None:
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            history_file_path = os.path.join(tmp_dir, 'histcontext')
+            with open(history_file_path, 'w') as history_file:
+                history_file.write(command_store_lib.CUSTOM_HIST_HEAD + '/src<<!>>make\n')
+            inode = os.stat(history_file_path).st_ino
+            store = SqlCommandStore(':memory:')
+            with patch.object(command_store_lib, 'CUSTOM_HISTORY_COMPACT_SIZE', 1):
+                command_store_lib.start_history_processing(store, history_file_path, tmp_dir, 0)
+            with open(history_file_path) as history_file:
+                self.assertEqual(command_store_lib.CUSTOM_HIST_HEAD, history_file.read())
+            self.assertNotEqual(inode, os.stat(history_file_path).st_ino)
+            self.assertFalse(os.path.exists(history_file_path + '.swap'))
+            with open(history_file_path, 'a') as history_file:
+                history_file.write('/src<<!>>make\n')
+            command_store_lib.start_history_processing(store, history_file_path, tmp_dir, 0)
+            self.assertEqual({'make': 2}, self._get_counts(store))
+
+    def test_compact_custom_history_file_whenUnreadLines_shouldKeepThem(self) -> None:
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            history_file_path = os.path.join(tmp_dir, 'histcontext')
+            read_lines = command_store_lib.CUSTOM_HIST_HEAD + '/src<<!>>make\n'
+            with open(history_file_path, 'w') as history_file:
+                history_file.write(read_lines + '/src<<!>>ls\n')
+            command_store_lib.compact_custom_history_file(history_file_path, len(read_lines))
+            with open(history_file_path) as history_file:
+                self.assertEqual(command_store_lib.CUSTOM_HIST_HEAD + '/src<<!>>ls\n',
+                                 history_file.read())
+
+    def test_compact_custom_history_file_whenAppendedAfterSwap_shouldCopyTheAppends(
+            self) -> None:
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            history_file_path = os.path.join(tmp_dir, 'histcontext')
+            read_lines = command_store_lib.CUSTOM_HIST_HEAD + '/src<<!>>make\n'
+            with open(history_file_path, 'w') as history_file:
+                history_file.write(read_lines + '/src<<!>>ls\n')
+            # A hook that opened the file before it was replaced.
+            with open(history_file_path, 'a') as late_hook:
+                def append_late(_) -> None:
+                    if not late_hook.closed:
+                        late_hook.write('/src<<!>>git status\n')
+                        late_hook.close()
+
+                with patch('remember.command_store_lib.time.sleep', side_effect=append_late):
+                    command_store_lib.compact_custom_history_file(
+                        history_file_path, len(read_lines))
+            with open(history_file_path) as history_file:
+                self.assertEqual(command_store_lib.CUSTOM_HIST_HEAD + '/src<<!>>ls\n'
+                                 '/src<<!>>git status\n', history_file.read())
+
+    def test_process_history_sources_whenSeveralFiles_shouldMergeThemInOneStore(self) -> None:
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            bash_history_path = os.path.join(tmp_dir, 'bash_history')
+            with open(bash_history_path, 'w') as history_file:
+                history_file.write('vim somefile.txt\ngit  status\nvim somefile.txt\nls\n')
+            custom_history_path = os.path.join(tmp_dir, 'histcontext')
+            shutil.copyfile(os.path.join(TEST_FILES_PATH, 'custom_history_file.txt'),
+                            custom_history_path)
+            with open(os.path.join(tmp_dir, command_store_lib.IGNORE_RULE_FILE_NAME), 'w') as f:
+                f.write('m: ls\n')
+            store = SqlCommandStore(':memory:')
+            num_commands = command_store_lib.process_history_sources(
+                store, [bash_history_path, custom_history_path,
+                        os.path.join(tmp_dir, 'missing')], tmp_dir, 2)
+            self.assertEqual(5, num_commands)
+            counts = {x.get_unique_command_id(): x.get_count_seen()
+                      for x in store.search_commands([''])}
+            self.assertEqual(3, counts['vim somefile.txt'])
+            self.assertEqual(1, counts['git status'])
+            self.assertNotIn('ls', counts)
+            self.assertEqual(['vim somefile.txt'], [
+                x.get_unique_command_id()
+                for x in store.get_command_with_context('/github/remember3', ['vim'])])
+            position = store.get_history_read_position(custom_history_path)
+            assert position is not None
+            self.assertEqual(os.path.getsize(custom_history_path), position.byte_offset)
+            with open(bash_history_path) as history_file:
+                self.assertTrue(history_file.read().endswith(
+                    command_store_lib.PROCESSED_TO_TAG + '\n'))
+            with patch('remember.command_store_lib.parse_history_source') as parse_mock:
+                self.assertEqual(0, command_store_lib.process_history_sources(
+                    store, [bash_history_path, custom_history_path], tmp_dir, 2))
+                parse_mock.assert_not_called()
+
+    def test_process_history_sources_whenNoTimestamps_shouldStampThemBeforeTheImport(
+            self) -> None:
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            bash_history_path = os.path.join(tmp_dir, 'bash_history')
+            with open(bash_history_path, 'w') as history_file:
+                history_file.write('git status\nmake\n: 1503848943:0;ls -la\n')
+            store = SqlCommandStore(':memory:')
+            import_time = time.time()
+            command_store_lib.process_history_sources(store, [bash_history_path], tmp_dir)
+            last_used = {x.get_unique_command_id(): x.last_used_time()
+                         for x in store.search_commands([''])}
+            self.assertLessEqual(max(last_used.values()), import_time)
+            self.assertLess(last_used['git status'], last_used['make'])
+            self.assertEqual(1503848943.0, last_used['ls -la'])
+
+    def test_import_history_archive_whenSmallChunks_shouldSplitLinesAcrossChunks(self) -> None:
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            history_file_path = os.path.join(tmp_dir, 'histcontext')
+            with open(history_file_path, 'w') as history_file:
+                history_file.write(command_store_lib.CUSTOM_HIST_HEAD)
+                for index in range(30):
+                    history_file.write(f'/src/dir{index % 3}<<!>>: 1589958292:0;make target{index % 4}\n')
+                history_file.write('/src/dir0<<!>>git  status')
+            store = SqlCommandStore(':memory:')
+            self.assertEqual(31, command_store_lib.import_history_archive(
+                store, history_file_path, tmp_dir, 17))
+            counts = {x.get_unique_command_id(): x.get_count_seen()
+                      for x in store.search_commands([''])}
+            self.assertEqual({'make target0': 8, 'make target1': 8, 'make target2': 7,
+                              'make target3': 7, 'git status': 1}, counts)
+            self.assertEqual({'git status', 'make target0', 'make target1', 'make target2',
+                              'make target3'}, {
+                x.get_unique_command_id() for x in store.get_command_with_context('/src/dir0', [])})
+            checkpoint = store.get_history_import_checkpoint(history_file_path)
+            assert checkpoint is not None
+            self.assertEqual(os.path.getsize(history_file_path), checkpoint.byte_offset)
+            # Already imported, only what is appended later gets read.
+            self.assertEqual(0, command_store_lib.import_history_archive(
+                store, history_file_path, tmp_dir, 17))
+
+    def test_import_history_archive_whenInterrupted_shouldResumeAfterLastChunk(self) -> None:
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            history_file_path = os.path.join(tmp_dir, 'bash_history')
+            with open(history_file_path, 'w') as history_file:
+                for index in range(100):
+                    history_file.write(f'echo {index % 10}\n')
+            store = SqlCommandStore(':memory:')
+            add_commands = store.add_commands
+            calls = []
+
+            def fail_on_third_chunk(*args) -> None:
+                calls.append(args)
+                if len(calls) == 3:
+                    raise KeyboardInterrupt()
+                add_commands(*args)
+
+            with patch.object(store, 'add_commands', side_effect=fail_on_third_chunk):
+                with self.assertRaises(KeyboardInterrupt):
+                    command_store_lib.import_history_archive(store, history_file_path, tmp_dir, 64)
+            checkpoint = store.get_history_import_checkpoint(history_file_path)
+            assert checkpoint is not None
+            self.assertGreater(checkpoint.byte_offset, 0)
+            self.assertLess(checkpoint.byte_offset, os.path.getsize(history_file_path))
+            command_store_lib.import_history_archive(store, history_file_path, tmp_dir, 64)
+            counts = [x.get_count_seen() for x in store.search_commands(['echo'])]
+            self.assertEqual([10] * 10, counts)
+
+    def test_import_history_archive_whenImported_shouldStampCommandsBeforeTheImport(
+            self) -> None:
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            history_file_path = os.path.join(tmp_dir, 'zsh_history')
+            with open(history_file_path, 'w') as history_file:
+                history_file.write(': 1589958292:0;make test\n')
+                for index in range(20):
+                    history_file.write(f'echo {index}\n')
+            store = SqlCommandStore(':memory:')
+            import_time = time.time()
+            command_store_lib.import_history_archive(store, history_file_path, tmp_dir, 32)
+            last_used = {x.get_unique_command_id(): x.last_used_time()
+                         for x in store.search_commands([''])}
+            self.assertEqual(1589958292.0, last_used.pop('make test'))
+            self.assertLessEqual(max(last_used.values()), import_time)
+            self.assertEqual(sorted(last_used.values()),
+                             [last_used[f'echo {index}'] for index in range(20)])
+
+    def test_BackgroundHistoryProcessor_whenStillWriting_shouldReportTheLag(self) -> None:
+        history_processor = command_store_lib.BackgroundHistoryProcessor('', '', '')
+        with patch.object(history_processor, 'is_done', return_value=False):
+            self.assertIn('still being read', history_processor.get_lag_message())
+            history_processor._on_progress(3, 10)
+            self.assertEqual('Results lag by 7 unprocessed commands.',
+                             history_processor.get_lag_message())
+
+    def test_process_history_commands_whenProgressCallback_shouldReportEveryWrite(self) -> None:
+        store = SqlCommandStore(':memory:')
+        progress = []
+        command_store_lib.process_history_commands(
+            store, [command_store_lib.CommandAndContext('ls'),
+                    command_store_lib.CommandAndContext('git log')],
+            on_progress=lambda written, total: progress.append((written, total)))
+        self.assertEqual([(0, 2), (1, 2), (2, 2)], progress)
+
     def test_HistoryProcessor_when_process_history_fileOnProcessedFile_shouldNotRun(self) -> None:
         file_name = os.path.join(TEST_FILES_PATH, "test_processed.txt")
         with open(file_name, 'rb') as hist_file:
@@ -355,3 +749,20 @@ class TestCommandStoreLib(unittest.TestCase):
             handle = m()
             handle.write.assert_not_called()
 
+
+    def test_ranked_info_search_whenInfoUpdated_shouldReturnAnnotatedCommands(self) -> None:
+        with tempfile.TemporaryDirectory() as save_dir:
+            store = command_store_lib.SqlCommandStore()
+            disk_command = command_store_lib.Command('qemu-img resize vm.qcow2 +10G')
+            store.add_command(disk_command)
+            store.add_command(command_store_lib.Command('qemu-img info vm.qcow2'))
+            command_store_lib.load_info_index(store, save_dir)
+            disk_command.set_command_info('grow the disk image of the vm')
+            store.update_command_info(disk_command)
+            result = command_store_lib.ranked_info_search(
+                store, save_dir, ['resize', 'disk', 'image'], 10)
+            self.assertEqual(['qemu-img resize vm.qcow2 +10G'],
+                             [x.get_unique_command_id() for x in result])
+            store.delete_command('qemu-img resize vm.qcow2 +10G')
+            self.assertEqual([], command_store_lib.ranked_info_search(
+                store, save_dir, ['disk'], 10))
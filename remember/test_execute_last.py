@@ -1,37 +1,60 @@
 import argparse
 import os
+import tempfile
 from unittest import TestCase, mock
 from unittest.mock import patch
 
 import execute_last
-from remember.command_store_lib import DEFAULT_LAST_SAVE_FILE_NAME
+from remember.last_search import LAST_SEARCH_FILE_NAME, encode_last_search
 
 
 class TestMain(TestCase):
     @patch('os.getenv', return_value='/bin/zsh')
     @patch('subprocess.call')
     @patch('builtins.input', side_effect=[''])
-    @patch('remember.command_store_lib.open', mock.mock_open(read_data='some command'))
-    @patch('remember.interactive.open', mock.mock_open(read_data=b'some command'))
     def test_run_remember_command_whenLoadLast_shouldReadFile(
             self, _, mock_subproc_call, mock_env) -> None:
-        argparse_args = argparse.Namespace(save_dir="test", history_file_path='whatever', index=1)
         shell_env = os.getenv('SHELL')
         call_args = [shell_env, '-i', '-c', 'some command']
-        with mock.patch('argparse.ArgumentParser.parse_args', return_value=argparse_args):
-            execute_last.main()
-            mock_subproc_call.assert_called_once_with(call_args)
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            history_file_path = os.path.join(tmp_dir, 'whatever')
+            with open(history_file_path, 'w') as history_file:
+                history_file.write('some command\n')
+            with open(os.path.join(tmp_dir, LAST_SEARCH_FILE_NAME), 'wb') as last_search_file:
+                last_search_file.write(encode_last_search(['other command', 'some command']))
+            argparse_args = argparse.Namespace(
+                save_dir=tmp_dir, history_file_path=history_file_path, index=2, profile=False)
+            with mock.patch('argparse.ArgumentParser.parse_args', return_value=argparse_args):
+                execute_last.main()
+                mock_subproc_call.assert_called_once_with(call_args)
+            with open(history_file_path) as history_file:
+                self.assertEqual(['some command\n', 'some command\n'], history_file.readlines())
 
     @mock.patch('subprocess.call')
     def test_run_remember_command_whenSaveDirAndNoNumSelected_shouldReturn(
             self, mock_subproc_call: mock.Mock) -> None:
         user_input = ['no']
-        argparse_args = argparse.Namespace(save_dir="test", history_file_path='', index=1)
-        with mock.patch('builtins.input', side_effect=user_input):
-            with mock.patch('argparse.ArgumentParser.parse_args', return_value=argparse_args):
-                with mock.patch('remember.command_store_lib.open',
-                                mock.mock_open(read_data='some command')) as read_mock:
+        with tempfile.TemporaryDirectory() as save_dir:
+            with open(os.path.join(save_dir, LAST_SEARCH_FILE_NAME), 'wb') as last_search_file:
+                last_search_file.write(encode_last_search(['some command']))
+            argparse_args = argparse.Namespace(save_dir=save_dir, history_file_path='', index=1,
+                                               profile=False)
+            with mock.patch('builtins.input', side_effect=user_input) as input_mock:
+                with mock.patch('argparse.ArgumentParser.parse_args', return_value=argparse_args):
+                    execute_last.main()
+                    self.assertIn('some command', input_mock.call_args[0][0])
+                    mock_subproc_call.assert_not_called()
+
+    @mock.patch('subprocess.call')
+    def test_run_remember_command_whenIndexOutOfRange_shouldNotAsk(
+            self, mock_subproc_call: mock.Mock) -> None:
+        with tempfile.TemporaryDirectory() as save_dir:
+            with open(os.path.join(save_dir, LAST_SEARCH_FILE_NAME), 'wb') as last_search_file:
+                last_search_file.write(encode_last_search(['some command']))
+            argparse_args = argparse.Namespace(save_dir=save_dir, history_file_path='', index=2,
+                                               profile=False)
+            with mock.patch('builtins.input') as input_mock:
+                with mock.patch('argparse.ArgumentParser.parse_args', return_value=argparse_args):
                     execute_last.main()
-                    read_mock.assert_called_once_with(os.path.join(
-                        'test', DEFAULT_LAST_SAVE_FILE_NAME))
+                    input_mock.assert_not_called()
                     mock_subproc_call.assert_not_called()
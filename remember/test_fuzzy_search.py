@@ -0,0 +1,39 @@
+# flake8: noqa
+import unittest
+
+import numpy as np
+
+from remember import fuzzy_search
+
+
+class FuzzySearchTests(unittest.TestCase):
+    def test_score_candidates_whenAbbreviation_shouldMatchSubsequence(self) -> None:
+        scores = fuzzy_search.score_candidates(
+            ['gco', 'mstr'], ['git checkout master', 'git commit', 'ls'])
+        self.assertTrue(np.isfinite(scores[0]))
+        self.assertFalse(np.isfinite(scores[1]))
+        self.assertFalse(np.isfinite(scores[2]))
+
+    def test_score_candidates_whenConsecutiveMatch_shouldScoreHigher(self) -> None:
+        scores = fuzzy_search.score_candidates(['stat'], ['git status', 'sxtxaxt'])
+        self.assertGreater(scores[0], scores[1])
+
+    def test_score_candidates_whenWordBoundary_shouldScoreHigher(self) -> None:
+        scores = fuzzy_search.score_candidates(['gc'], ['git checkout', 'logic'])
+        self.assertGreater(scores[0], scores[1])
+
+    def test_is_case_sensitive_whenUpperCaseTerm_shouldBeCaseSensitive(self) -> None:
+        self.assertFalse(fuzzy_search.is_case_sensitive(['git']))
+        self.assertTrue(fuzzy_search.is_case_sensitive(['HEAD']))
+
+    def test_top_k_matches_whenMoreMatchesThanK_shouldReturnBestK(self) -> None:
+        candidates = ['git checkout master', 'git cherry-pick master', 'git commit', 'gcc main.c']
+        result = fuzzy_search.top_k_matches(
+            ['gco', 'mstr'], candidates, [1, 1, 1, 1], [1.0, 2.0, 3.0, 4.0], 1)
+        self.assertEqual(1, len(result))
+        self.assertEqual(0, result[0][3])
+
+    def test_top_k_matches_whenScoresTie_shouldPreferMoreUsed(self) -> None:
+        candidates = ['ls -la', 'ls -la']
+        result = fuzzy_search.top_k_matches(['ls'], candidates, [1, 5], [1.0, 1.0], 2)
+        self.assertEqual([1, 0], [x[3] for x in result])
@@ -1,5 +1,6 @@
 # flake8: noqa
 import argparse
+from datetime import datetime
 from unittest import TestCase
 
 import mock
@@ -57,3 +58,23 @@ class TestHandleArgs(TestCase):
         assert args.execute == True
         assert args.save_dir == 'save_dir'
         assert args.history_file_path == 'hist'
+
+    def test_setup_args_for_update_whenRanked_shouldRejectIt(self) -> None:
+        with mock.patch('sys.argv', ['ure', '-r', 'docker']), \
+                mock.patch('sys.stderr'), self.assertRaises(SystemExit):
+            handle_args.setup_args_for_update()
+
+    def test_setup_args_for_update_whenTokens_shouldRejectIt(self) -> None:
+        with mock.patch('sys.argv', ['ure', '-k', 'docker']), \
+                mock.patch('sys.stderr'), self.assertRaises(SystemExit):
+            handle_args.setup_args_for_update()
+
+    def test_parse_time_whenRelative_shouldReturnTimeAgo(self) -> None:
+        with mock.patch('time.time', return_value=1000000.0):
+            self.assertEqual(1000000.0 - 7 * 86400, handle_args.parse_time('7d'))
+            self.assertEqual(1000000.0 - 90 * 60, handle_args.parse_time('1.5h'))
+
+    def test_parse_time_whenDate_shouldReturnItsTimestamp(self) -> None:
+        self.assertEqual(datetime(2026, 1, 1).timestamp(), handle_args.parse_time('2026-01-01'))
+        with self.assertRaises(argparse.ArgumentTypeError):
+            handle_args.parse_time('yesterday')
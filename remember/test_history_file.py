@@ -0,0 +1,28 @@
+# flake8: noqa
+import os
+import tempfile
+import unittest
+
+from mock import patch
+
+from remember import history_file
+
+
+class HistoryFileTests(unittest.TestCase):
+    def test_get_last_line_whenLinesSpanBlocks_shouldReadOnlyTheLastLine(self) -> None:
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            history_file_path = os.path.join(tmp_dir, 'history')
+            long_line = 'x' * (history_file.TAIL_BLOCK_SIZE + 10)
+            with open(history_file_path, 'w') as output_file:
+                output_file.write('first\n' + long_line + '\n')
+            self.assertEqual(long_line + '\n', history_file._get_last_line(history_file_path))
+            with open(history_file_path, 'a') as output_file:
+                output_file.write(': 1573535428:0;vim ~/.histfile')
+            self.assertEqual(': 1573535428:0;vim ~/.histfile',
+                             history_file._get_last_line(history_file_path))
+            with patch('remember.history_file.TAIL_BLOCK_SIZE', 4):
+                self.assertEqual(': 1573535428:0;vim ~/.histfile',
+                                 history_file._get_last_line(history_file_path))
+            with open(history_file_path, 'w') as output_file:
+                output_file.write('only line\n')
+            self.assertEqual('only line\n', history_file._get_last_line(history_file_path))
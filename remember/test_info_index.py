@@ -0,0 +1,42 @@
+# flake8: noqa
+import os
+import tempfile
+import unittest
+
+from remember.info_index import CommandInfoIndex, tokenize
+
+
+class CommandInfoIndexTests(unittest.TestCase):
+    def setUp(self) -> None:
+        self._tmp_dir = tempfile.TemporaryDirectory()
+        self._index_path = os.path.join(self._tmp_dir.name, 'index.npz')
+
+    def tearDown(self) -> None:
+        self._tmp_dir.cleanup()
+
+    def test_tokenize_whenPlurals_shouldStemThem(self) -> None:
+        self.assertEqual(['resize', 'disk', 'image', 'pass'],
+                         tokenize('Resize disks images PASS'))
+
+    def test_search_whenQueryMatchesInfo_shouldRankBestFirst(self) -> None:
+        index = CommandInfoIndex(self._index_path)
+        index.rebuild([(1, 'resize the disk image qemu-img resize disk.qcow2 +10G'),
+                       (2, 'list docker images docker images'),
+                       (3, 'clean the build directory make clean')])
+        result = index.search('resize disk image', 10)
+        self.assertEqual([1, 2], [doc_id for doc_id, _ in result])
+        self.assertGreater(result[0][1], result[1][1])
+        self.assertEqual([], index.search('nothing matches', 10))
+
+    def test_update_document_whenReloaded_shouldPersistChanges(self) -> None:
+        index = CommandInfoIndex(self._index_path)
+        index.rebuild([(1, 'list docker images'), (2, 'make clean')])
+        index.update_document(1, 'show running containers')
+        index.update_document(3, 'docker prune images')
+        index.update_document(2, '')
+        reloaded = CommandInfoIndex(self._index_path)
+        self.assertEqual(2, reloaded.num_documents())
+        self.assertEqual([3], [doc_id for doc_id, _ in reloaded.search('images', 10)])
+        self.assertEqual([1], [doc_id for doc_id, _ in reloaded.search('containers', 10)])
+        reloaded.remove_document(3)
+        self.assertEqual([], CommandInfoIndex(self._index_path).search('images', 10))
@@ -1,5 +1,10 @@
+import argparse
 import os
 import pathlib
+import shutil
+import subprocess
+import tempfile
+import unittest
 from typing import OrderedDict
 from unittest import TestCase
 from unittest.mock import mock_open
@@ -7,7 +12,8 @@ import mock
 from mock import patch, Mock
 
 import install_remember3
-from remember.constants import ALIASES
+from remember.command_store_lib import read_unread_history
+from remember.constants import ALIASES, HOOK_STYLE_BUFFERED
 
 TEST_PATH_DIR = os.path.dirname(os.path.realpath(__file__))
 TEST_FILES_PATH = os.path.join(TEST_PATH_DIR, "test_files")
@@ -18,7 +24,8 @@ expected = OrderedDict([('HISTSIZE', 'HISTSIZE=50000\n'), ('SAVEHIST', 'SAVEHIST
                        '\n# Remember command hook\nautoload -U add-zsh-hook\nhook_function() {\n  last_line=$(tail -1 histfile_path)\n  pwdresult=$(pwd)\n  echo "$pwdresult<<!>>$last_line" >> ~/.remember3/.histcontext\n}\nadd-zsh-hook precmd hook_function\n\n'), ('HISTFILE', 'HISTFILE=histfile_path\n')])  # pylint: disable=line-too-long
 
 remember_home = remember_home = pathlib.Path(__file__).parent.parent.resolve()
-alias_lines = ALIASES.format(remember_home=remember_home, save_dir="save_dir").split('\n')
+alias_lines = ALIASES.format(remember_home=remember_home, save_dir="save_dir",
+                             flush='').split('\n')
 expected_aliases = install_remember3.get_alias_dict(alias_lines)
 
 
@@ -56,6 +63,8 @@ class TestMain(TestCase):
     def test_main(self, exists_mock: Mock, setup_remember_mock: Mock, write_lines_mock: Mock,
                   _arg_parse: Mock):
         exists_mock.return_value = True
+        _arg_parse.return_value = argparse.Namespace(rc_file=None, profile=False,
+                                                     hook_style='tail')
         setup_remember_mock.return_value = install_remember3.SetupArgs(
             True, "save_dir", "histfile_path", "rc_file_path")
         install_remember3.main()
@@ -72,3 +81,78 @@ class TestMain(TestCase):
                 install_remember3.write_lines_to_files(
                     "rc_path", "save_path", expected, expected_aliases)
                 mocked_file.assert_called()
+
+    def test_create_hook_function_whenBuiltinStyle_shouldNotUseCommandSubstitution(self):
+        hook_function = install_remember3.create_hook_function('histfile_path')
+        self.assertNotIn('$(', hook_function)
+        self.assertIn('fc -ln -1', hook_function)
+        self.assertIn('$PWD', hook_function)
+        self.assertIn('>> ~/.remember3/.histcontext', hook_function)
+
+    @unittest.skipUnless(shutil.which('bash'), 'needs bash')
+    def test_create_hook_function_whenBashPrompts_shouldRecordEachCommandOnce(self):
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            context_file_path = os.path.join(tmp_dir, 'histcontext')
+            rc_file_path = os.path.join(tmp_dir, 'bashrc')
+            with open(rc_file_path, 'w') as rc_file:
+                rc_file.write(install_remember3.create_hook_function(
+                    'unused', context_file_path=context_file_path))
+                rc_file.write("\nPROMPT_COMMAND='hook_function'\n")
+            subprocess.run(['bash', '--noprofile', '--rcfile', rc_file_path, '-i'],
+                           input=f'echo one\n\ncd {tmp_dir}\n', text=True, cwd='/',
+                           env={'HISTFILE': os.path.join(tmp_dir, 'history')},
+                           stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL, check=False)
+            with open(context_file_path) as context_file:
+                records = [x.split('<<!>>') for x in context_file.read().splitlines()]
+            self.assertEqual([['/', 'echo one'], [tmp_dir, f'cd {tmp_dir}']],
+                             [[x[0], x[1].strip()] for x in records])
+
+    @unittest.skipUnless(shutil.which('bash'), 'needs bash')
+    def test_create_hook_function_whenBashBuffered_shouldWriteFramedRecordsOnFlushAndExit(self):
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            context_file_path = os.path.join(tmp_dir, 'histcontext')
+            with open(context_file_path, 'w') as context_file:
+                context_file.write(install_remember3.CUSTOM_HIST_HEAD)
+            rc_file_path = os.path.join(tmp_dir, 'bashrc')
+            with open(rc_file_path, 'w') as rc_file:
+                rc_file.write(install_remember3.create_hook_function(
+                    'unused', HOOK_STYLE_BUFFERED, context_file_path))
+                rc_file.write("\nPROMPT_COMMAND='hook_function'\n"
+                              "alias flushed='_remember_flush; wc -l < "
+                              + context_file_path + "'\n")
+            commands = ['echo one', '', 'for x in 1 2; do', ' echo $x', 'done', 'flushed',
+                        f'cd {tmp_dir}', 'exit']
+            subprocess.run(['bash', '--noprofile', '--rcfile', rc_file_path, '-i'],
+                           input='\n'.join(commands) + '\n', text=True, cwd='/',
+                           env={'HISTFILE': os.path.join(tmp_dir, 'history')},
+                           stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL, check=False)
+            unread_history = read_unread_history(context_file_path, None)
+            self.assertEqual(
+                [('/', 'echo one'), ('/', 'for x in 1 2; do  echo $x; done'), ('/', 'flushed'),
+                 (tmp_dir, f'cd {tmp_dir}')],
+                [(x.directory_context(), x.command_line()) for x in unread_history.commands])
+
+    @unittest.skipUnless(shutil.which('bash'), 'needs bash')
+    def test_create_hook_function_whenBashExitTrapSet_shouldStillRunIt(self):
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            context_file_path = os.path.join(tmp_dir, 'histcontext')
+            with open(context_file_path, 'w') as context_file:
+                context_file.write(install_remember3.CUSTOM_HIST_HEAD)
+            trap_file_path = os.path.join(tmp_dir, 'trapped')
+            hook_function = install_remember3.create_hook_function(
+                'unused', HOOK_STYLE_BUFFERED, context_file_path)
+            rc_file_path = os.path.join(tmp_dir, 'bashrc')
+            with open(rc_file_path, 'w') as rc_file:
+                rc_file.write(f"trap 'echo \"it'\\''s done\" > {trap_file_path}' EXIT\n")
+                # Sourcing the rc file again must not chain the hook to itself.
+                rc_file.write(hook_function + '\n' + hook_function)
+                rc_file.write("\nPROMPT_COMMAND='hook_function'\n")
+            subprocess.run(['bash', '--noprofile', '--rcfile', rc_file_path, '-i'],
+                           input='echo one\nexit\n', text=True, cwd='/',
+                           env={'HISTFILE': os.path.join(tmp_dir, 'history')},
+                           stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL, check=False,
+                           timeout=10)
+            with open(trap_file_path) as trap_file:
+                self.assertEqual("it's done\n", trap_file.read())
+            self.assertEqual(['echo one'], [
+                x.command_line() for x in read_unread_history(context_file_path, None).commands])
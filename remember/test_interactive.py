@@ -1,6 +1,7 @@
 # flake8: noqa
 import os
 import sys
+import tempfile
 import unittest
 from typing import Any
 
@@ -148,26 +149,33 @@ class Test(unittest.TestCase):
     def test_run_whenCommandChosen_shouldWriteToHistFile(self, sub_process_mock) -> None:
         command_str = "Command to write to history file"
         command = Command(command_str)
-        interactive_command = InteractiveCommandExecutor('SomeHistoryFile.txt')
-        with patch('builtins.input', side_effect=['1']):
-            with patch('builtins.open', mock_open(read_data=b'some command')) as m:
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            history_file_path = os.path.join(tmp_dir, 'SomeHistoryFile.txt')
+            with open(history_file_path, 'w') as history_file:
+                history_file.write('some command\n')
+            interactive_command = InteractiveCommandExecutor(history_file_path)
+            with patch('builtins.input', side_effect=['1']):
                 self.assertTrue(interactive_command.run([command]))
-                handle = m()
-                handle.write.assert_called_with(command_str + '\n')
+            with open(history_file_path) as history_file:
+                self.assertEqual(['some command\n', command_str + '\n'],
+                                 history_file.readlines())
         sub_process_mock.assert_called_once()
 
     def test_run_whenCommandChosenInZsh_shouldWriteToHistFile(self) -> None:
         command_str = "Command to write to history file"
         command = Command(command_str)
-        interactive_command = InteractiveCommandExecutor('SomeHistoryFile.txt')
         user_input = ['1']
-        hist_file_content = b': 1573535428:0;vim ~/.histfile\n'
+        hist_file_content = ': 1573535428:0;vim ~/.histfile\n'
         expected = ': 1573535429:0;Command to write to history file\n'
-        with patch('builtins.input', side_effect=user_input):
-            with patch('remember.interactive.open', mock_open(read_data=hist_file_content)) as m:
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            history_file_path = os.path.join(tmp_dir, 'SomeHistoryFile.txt')
+            with open(history_file_path, 'w') as history_file:
+                history_file.write(hist_file_content)
+            interactive_command = InteractiveCommandExecutor(history_file_path)
+            with patch('builtins.input', side_effect=user_input), patch('subprocess.call'):
                 self.assertTrue(interactive_command.run([command]))
-                handle = m()
-                handle.write.assert_called_with(expected)
+            with open(history_file_path) as history_file:
+                self.assertEqual([hist_file_content, expected], history_file.readlines())
 
     @patch('remember.interactive.load_user_interactor')
     @patch('remember.command_store_lib.save_last_search')
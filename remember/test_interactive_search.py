@@ -0,0 +1,90 @@
+# flake8: noqa
+import sqlite3
+import unittest
+
+import mock
+
+from remember.interactive_search import IncrementalSearchScreen, IncrementalSearcher
+from remember.sql_store import Command, SqlCommandStore
+
+
+def create_store(command_strs) -> SqlCommandStore:
+    store = SqlCommandStore(':memory:')
+    for command_str in command_strs:
+        store.add_command(Command(command_str))
+    return store
+
+
+class IncrementalSearcherTests(unittest.TestCase):
+    def test_search_whenQueryExtended_shouldNarrowWithoutQueryingStore(self) -> None:
+        store = create_store(['git checkout master', 'git commit', 'ls -la'])
+        searcher = IncrementalSearcher(store)
+        with mock.patch.object(store, 'search_commands', wraps=store.search_commands) as spy:
+            self.assertEqual(2, len(searcher.search('git')))
+            result = searcher.search('git ch')
+            spy.assert_called_once()
+        self.assertEqual(['git checkout master'], [x.get_unique_command_id() for x in result])
+
+    def test_search_whenBackspaceToCachedQuery_shouldReuseCachedResult(self) -> None:
+        store = create_store(['git checkout master', 'git commit'])
+        searcher = IncrementalSearcher(store)
+        searcher.search('git')
+        searcher.search('git co')
+        searcher.search('git com')
+        self.assertTrue(searcher.can_narrow('git co'))
+        with mock.patch.object(store, 'search_commands') as spy:
+            self.assertEqual(1, len(searcher.search('git co')))
+            spy.assert_not_called()
+
+    def test_search_whenQueryNotAnExtension_shouldQueryStore(self) -> None:
+        store = create_store(['git checkout master', 'ls -la'])
+        searcher = IncrementalSearcher(store)
+        searcher.search('git')
+        self.assertFalse(searcher.can_narrow('ls'))
+        self.assertEqual(['ls -la'], [x.get_unique_command_id() for x in searcher.search('ls')])
+
+    def test_search_whenCandidatesTruncated_shouldNotNarrow(self) -> None:
+        store = create_store(['git checkout', 'git commit', 'git stash'])
+        searcher = IncrementalSearcher(store, candidate_limit=2)
+        self.assertEqual(2, len(searcher.search('git')))
+        self.assertFalse(searcher.can_narrow('git s'))
+        self.assertEqual(['git stash'], [x.get_unique_command_id() for x in searcher.search('git s')])
+
+    def test_search_whenInterrupted_shouldRaise(self) -> None:
+        store = create_store(['git command %d' % x for x in range(2000)])
+        searcher = IncrementalSearcher(store)
+        searcher.set_interrupt_check(lambda: True)
+        with self.assertRaises(sqlite3.OperationalError):
+            searcher.search('git')
+        searcher.set_interrupt_check(None)
+        self.assertEqual(2000, len(searcher.search('git')))
+
+    def test_search_whenQuote_shouldMatchItLiterally(self) -> None:
+        store = create_store(["echo 'x'", 'echo x'])
+        searcher = IncrementalSearcher(store)
+        self.assertEqual(["echo 'x'"], [x.get_unique_command_id() for x in searcher.search("'x")])
+
+    def test_search_whenLikeWildcards_shouldMatchTheSameFromStoreAndMemory(self) -> None:
+        store = create_store(['a_b', 'axb', '100%', '1000'])
+        self.assertEqual(['a_b'], [x.get_unique_command_id()
+                                   for x in IncrementalSearcher(store).search('a_b')])
+        searcher = IncrementalSearcher(store)
+        searcher.search('a_')
+        self.assertEqual(['a_b'], [x.get_unique_command_id() for x in searcher.search('a_b')])
+        self.assertEqual(['100%'], [x.get_unique_command_id()
+                                    for x in IncrementalSearcher(store).search('0%')])
+
+
+class IncrementalSearchScreenTests(unittest.TestCase):
+    def test_run_store_search_whenInterrupted_shouldKeepTheSearchPending(self) -> None:
+        searcher = mock.Mock(search=mock.Mock(side_effect=sqlite3.OperationalError('interrupted')))
+        screen = IncrementalSearchScreen(searcher, 'git')
+        screen._run_store_search(mock.Mock())
+        self.assertTrue(screen._search_pending)
+        searcher.set_interrupt_check.assert_called_with(None)
+
+    def test_run_store_search_whenOtherError_shouldRaiseIt(self) -> None:
+        searcher = mock.Mock(search=mock.Mock(side_effect=sqlite3.OperationalError('disk I/O error')))
+        screen = IncrementalSearchScreen(searcher, 'git')
+        with self.assertRaises(sqlite3.OperationalError):
+            screen._run_store_search(mock.Mock())
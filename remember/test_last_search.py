@@ -0,0 +1,39 @@
+# flake8: noqa
+import os
+import tempfile
+import unittest
+
+from remember.command_store_lib import save_last_search
+from remember.last_search import read_last_search, read_last_search_command, encode_last_search
+from remember.sql_store import Command
+
+
+class LastSearchTests(unittest.TestCase):
+    def test_read_last_search_command_whenSaved_shouldReadEachIndex(self) -> None:
+        commands = ['git status', 'echo "héllo wörld"', '', 'ls -la']
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            file_path = os.path.join(tmp_dir, 'last_search')
+            with open(file_path, 'wb') as last_search_file:
+                last_search_file.write(encode_last_search(commands))
+            for index, command in enumerate(commands, 1):
+                self.assertEqual(command, read_last_search_command(file_path, index))
+            self.assertIsNone(read_last_search_command(file_path, 0))
+            self.assertIsNone(read_last_search_command(file_path, 5))
+            self.assertEqual(commands, read_last_search(file_path))
+
+    def test_save_last_search_whenCommands_shouldWriteTheirIds(self) -> None:
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            file_path = os.path.join(tmp_dir, 'last_search')
+            save_last_search(file_path, [Command('grep foo'), Command('vim bar')])
+            self.assertEqual(['grep foo', 'vim bar'], read_last_search(file_path))
+
+    def test_read_last_search_whenOldTextFile_shouldRaise(self) -> None:
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            file_path = os.path.join(tmp_dir, 'last_search')
+            with open(file_path, 'w') as last_search_file:
+                last_search_file.write('grep foo\nvim bar\n')
+            with self.assertRaises(ValueError):
+                read_last_search_command(file_path, 1)
+            with open(file_path, 'w'):
+                pass
+            self.assertIsNone(read_last_search_command(file_path, 1))
@@ -0,0 +1,96 @@
+# flake8: noqa
+import os
+import sqlite3
+import tempfile
+import unittest
+from typing import List
+from unittest import mock
+
+from remember.migrations import MIGRATIONS, SCHEMA_VERSION, Migration, get_schema_version, \
+    migrate
+from remember.sql_store import Command, SqlCommandStore
+
+
+class MigrationsTests(unittest.TestCase):
+    def test_migrate_whenNewStore_shouldRunAllMigrationsInOrder(self) -> None:
+        db_conn = sqlite3.connect(':memory:')
+        applied = migrate(db_conn)
+        self.assertEqual(list(range(1, SCHEMA_VERSION + 1)), [x.version for x in applied])
+        self.assertEqual(SCHEMA_VERSION, get_schema_version(db_conn))
+        self.assertEqual([], migrate(db_conn))
+
+    def test_migrate_whenUpToDate_shouldOnlyReadUserVersion(self) -> None:
+        db_conn = sqlite3.connect(':memory:')
+        migrate(db_conn)
+        statements: List[str] = []
+        db_conn.set_trace_callback(statements.append)
+        migrate(db_conn)
+        self.assertEqual(['PRAGMA user_version;'], statements)
+
+    def test_migrate_whenNewerStore_shouldLeaveItAlone(self) -> None:
+        db_conn = sqlite3.connect(':memory:')
+        db_conn.execute(f'PRAGMA user_version = {SCHEMA_VERSION + 1}')
+        self.assertEqual([], migrate(db_conn))
+        self.assertEqual([], db_conn.execute('SELECT name FROM sqlite_master').fetchall())
+
+    def test_migrate_whenUnversionedStoreHasSideTables_shouldNotCountCommandsTwice(self) -> None:
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            db_file_path = os.path.join(tmp_dir, 'remember.db')
+            store = SqlCommandStore(db_file_path)
+            store.add_command(Command('git status', 10.0))
+            store.add_command(Command('git status', 20.0))
+            store.add_command(Command('git diff', 30.0))
+            store.close()
+            # An older release created the same tables without keeping a version.
+            db_conn = sqlite3.connect(db_file_path)
+            db_conn.execute('PRAGMA user_version = 0')
+            self.assertEqual(len(MIGRATIONS), len(migrate(db_conn)))
+            db_conn.close()
+            store = SqlCommandStore(db_file_path)
+            stat = store.get_primary_command_stat('git')
+            assert stat is not None
+            self.assertEqual((3, 2), (stat.total_count, stat.distinct_variants))
+            self.assertEqual(['git diff'], [x.get_unique_command_id()
+                                            for x in store.search_commands_by_tokens('git', ['diff'])])
+            db_conn = store._get_initialized_db_connection()
+            self.assertEqual(2, db_conn.execute('SELECT COUNT(*) FROM usage_buckets').fetchone()[0])
+            store.close()
+
+    def test_migrate_whenCutShort_shouldRunTheMigrationAgain(self) -> None:
+        db_conn = sqlite3.connect(':memory:')
+        migrate(db_conn)
+        db_conn.execute("INSERT INTO remember VALUES(1, 'make test', 2, 1.0, NULL)")
+        db_conn.commit()
+        db_conn.execute('PRAGMA user_version = 3')
+        self.assertEqual(list(range(4, SCHEMA_VERSION + 1)), [x.version for x in migrate(db_conn)])
+        self.assertEqual([('make', 2, 1)], db_conn.execute(
+            'SELECT primary_command, total_count, distinct_variants FROM primary_commands')
+                         .fetchall())
+
+    def test_migrate_whenMigrationFails_shouldKeepTheVersionWithItsChanges(self) -> None:
+        def fail(db_conn: sqlite3.Connection) -> None:
+            db_conn.execute('CREATE TABLE half_done(x)')
+            raise sqlite3.OperationalError('disk I/O error')
+
+        db_conn = sqlite3.connect(':memory:')
+        migrations = MIGRATIONS[:1] + [Migration(2, 'fails half way', fail)]
+        with mock.patch('remember.migrations.MIGRATIONS', migrations):
+            with self.assertRaises(sqlite3.OperationalError):
+                migrate(db_conn)
+        self.assertEqual(1, get_schema_version(db_conn))
+        self.assertEqual([], db_conn.execute(
+            "SELECT name FROM sqlite_master WHERE name = 'half_done'").fetchall())
+
+    def test_migrate_whenCheckpointsHaveLineCount_shouldDropItAndKeepTheCheckpoints(self) -> None:
+        db_conn = sqlite3.connect(':memory:')
+        db_conn.execute('PRAGMA user_version = 10')
+        db_conn.execute('CREATE TABLE history_import_checkpoints (path TEXT PRIMARY KEY, '
+                        'device INTEGER NOT NULL, inode INTEGER NOT NULL, '
+                        'byte_offset INTEGER NOT NULL, line_count INTEGER NOT NULL)')
+        db_conn.execute("INSERT INTO history_import_checkpoints VALUES('/h', 1, 2, 300, 12)")
+        db_conn.commit()
+        self.assertEqual([11], [x.version for x in migrate(db_conn)])
+        self.assertEqual(['path', 'device', 'inode', 'byte_offset'], [
+            row[1] for row in db_conn.execute('PRAGMA table_info(history_import_checkpoints)')])
+        self.assertEqual([('/h', 1, 2, 300)], db_conn.execute(
+            'SELECT * FROM history_import_checkpoints').fetchall())
@@ -0,0 +1,54 @@
+# flake8: noqa
+import io
+import os
+import pstats
+import subprocess
+import sys
+import tempfile
+import tracemalloc
+import unittest
+
+from remember import profiling
+
+
+def _allocate(count: int) -> list:
+    return [str(x) * 10 for x in range(count)]
+
+
+class ProfilingTests(unittest.TestCase):
+    def test_profile_whenEnabled_shouldWriteProfileAndAllocations(self) -> None:
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            with profiling.profile(True, tmp_dir, 'test', top_allocations=3):
+                kept = _allocate(10000)
+            profile_file_path = os.path.join(tmp_dir, 'remember_profile_test.prof')
+            stats_output = io.StringIO()
+            pstats.Stats(profile_file_path, stream=stats_output).print_stats()
+            self.assertIn('(_allocate)', stats_output.getvalue())
+            with open(os.path.join(tmp_dir, 'remember_profile_test_allocations.txt')) as f:
+                lines = f.read().splitlines()
+        self.assertTrue(lines[0].startswith('peak traced:'))
+        self.assertEqual(5, len(lines))
+        self.assertIn('test_profiling.py', lines[2])
+        self.assertFalse(tracemalloc.is_tracing())
+        self.assertEqual(10000, len(kept))
+
+    def test_profile_whenDisabled_shouldWriteNothing(self) -> None:
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            with profiling.profile(False, tmp_dir, 'test'):
+                _allocate(10)
+            self.assertEqual([], os.listdir(tmp_dir))
+
+    def test_import_whenNotProfiling_shouldNotLoadTheProfilers(self) -> None:
+        output = subprocess.check_output(
+            [sys.executable, '-c', 'import sys; from remember import profiling; '
+             'print(sorted({"cProfile", "tracemalloc"} & set(sys.modules)))'],
+            cwd=os.path.dirname(os.path.dirname(os.path.realpath(__file__))))
+        self.assertEqual(b'[]', output.strip())
+
+    def test_profile_whenBlockRaises_shouldStillWriteTheReports(self) -> None:
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            save_dir = os.path.join(tmp_dir, 'not_created_yet')
+            with self.assertRaises(ValueError):
+                with profiling.profile(True, save_dir, 'test'):
+                    raise ValueError()
+            self.assertEqual(2, len(os.listdir(save_dir)))
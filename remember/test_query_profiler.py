@@ -0,0 +1,87 @@
+# flake8: noqa
+import os
+import sqlite3
+import tempfile
+import unittest
+
+from remember.query_profiler import QueryProfiler
+from remember.sql_store import SqlCommandStore, Command
+
+
+class QueryProfilerTests(unittest.TestCase):
+    def _create_store(self) -> SqlCommandStore:
+        store = SqlCommandStore(':memory:', QueryProfiler(steps_per_callback=10))
+        for index in range(20):
+            store.add_command(Command(f'git commit -m {index}', 10.0 + index,
+                                      directory_context='/src/project'))
+        return store
+
+    def _get_profiler(self, store: SqlCommandStore) -> QueryProfiler:
+        profiler = store.get_query_profiler()
+        assert profiler is not None
+        return profiler
+
+    def _get_stats(self, profiler: QueryProfiler, prefix: str):
+        return [x for x in profiler.get_stats() if x.sql.startswith(prefix)]
+
+    def test_search_commands_whenProfiled_shouldRecordCallsAndRows(self) -> None:
+        store = self._create_store()
+        profiler = self._get_profiler(store)
+        profiler.reset()
+        results = store.search_commands(['git'])
+        self.assertEqual(20, len(results))
+        stats = profiler.get_stats()
+        self.assertEqual(1, len(stats))
+        self.assertEqual(1, stats[0].calls)
+        self.assertEqual(20, stats[0].rows)
+        self.assertGreater(stats[0].steps, 0)
+        self.assertGreater(stats[0].total_seconds, 0)
+        self.assertIn('LIKE', stats[0].sql)
+
+    def test_add_command_whenProfiled_shouldAggregateByStatement(self) -> None:
+        store = self._create_store()
+        profiler = self._get_profiler(store)
+        inserts = self._get_stats(profiler, 'INSERT INTO usage_buckets VALUES')
+        self.assertEqual(1, len(inserts))
+        self.assertEqual(20, inserts[0].calls)
+        self.assertEqual(sorted(profiler.get_stats(), key=lambda x: -x.total_seconds),
+                         profiler.get_stats())
+
+    def test_delete_whenTriggersFire_shouldTraceMoreThanCalls(self) -> None:
+        store = self._create_store()
+        profiler = self._get_profiler(store)
+        profiler.reset()
+        self.assertEqual(20, store.delete_stale_commands(1000.0, True, 100))
+        deletes = self._get_stats(profiler, 'DELETE FROM remember')
+        self.assertTrue(deletes)
+        self.assertGreater(deletes[0].traced, deletes[0].calls)
+
+    def test_format_summary_shouldListSlowestFirst(self) -> None:
+        store = self._create_store()
+        summary = self._get_profiler(store).format_summary(limit=3)
+        lines = summary.split('\n')
+        self.assertEqual(4, len(lines))
+        self.assertIn('total ms', lines[0])
+        slowest = self._get_profiler(store).get_stats()[0]
+        self.assertIn(slowest.sql[:20], lines[1])
+
+    def test_write_query_plans_shouldExplainTheSlowestQueries(self) -> None:
+        store = self._create_store()
+        store.search_commands(['git'])
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            plans_file_path = os.path.join(tmp_dir, 'plans.txt')
+            store.write_query_plans(plans_file_path, 3)
+            with open(plans_file_path) as plans_file:
+                plans = plans_file.read()
+        self.assertEqual(3, plans.count('-- '))
+        self.assertTrue('SCAN' in plans or 'SEARCH' in plans)
+        self.assertNotIn('not explainable', plans)
+
+    def test_set_interrupt_check_whenProfiled_shouldStillInterrupt(self) -> None:
+        store = self._create_store()
+        store.set_interrupt_check(lambda: True, 1)
+        with self.assertRaises(sqlite3.OperationalError):
+            store.search_commands(['git'])
+        store.set_interrupt_check(None)
+        self.assertEqual(20, len(store.search_commands(['git'])))
+        self.assertGreater(self._get_stats(self._get_profiler(store), 'SELECT')[0].steps, 0)
@@ -8,6 +8,7 @@ import mock
 from mock import Mock
 
 from remember.command_store_lib import SqlCommandStore, DEFAULT_LAST_SAVE_FILE_NAME, Command
+from remember.last_search import encode_last_search
 
 def create_test_sql_command_store(command_strs: List[str]) -> SqlCommandStore:
     store = SqlCommandStore()
@@ -24,7 +25,9 @@ class TestMain(TestCase):
     def test_setup_args_for_search_but_missing_save_dir_should_return_error_string(self) -> None:
         with mock.patch(
                 'argparse.ArgumentParser.parse_args', return_value=argparse.Namespace(
-                    json=True, sql=False, all=True, startswith=True, execute=False,
+                    json=True, sql=False, all=True, startswith=True, fuzzy=False,
+                    incremental=False, ranked=False, tokens=False, stats=False, since=None,
+                    before=None, timings=None, sql_profile=False, profile=False, background=False, execute=False,
                     save_dir=None, history_file_path='hist', max=1000, query='query')):
             result = remember_main.main()
             assert result
@@ -40,13 +43,16 @@ class TestMain(TestCase):
             load_mock.assert_called_once()
             process_mock.assert_called_once()
             write_mock.assert_called_once_with(
-                os.path.join('test', DEFAULT_LAST_SAVE_FILE_NAME), 'w')
+                os.path.join('test', DEFAULT_LAST_SAVE_FILE_NAME), 'wb')
             handle = write_mock()
-            handle.write.assert_called_with('grep foo\n')
+            handle.write.assert_called_with(encode_last_search(['grep foo']))
 
     @mock.patch('argparse.ArgumentParser.parse_args',
                 return_value=argparse.Namespace(
-                    all=True, startswith=False, execute=False, save_dir='save_dir',
+                    all=True, startswith=False, fuzzy=False, incremental=False, ranked=False,
+                    tokens=False, stats=False, since=None, before=None, timings=None,
+                    sql_profile=False, profile=False, background=False,
+                    execute=False, save_dir='save_dir',
                     history_file_path=None, query='query'))
     def test_setup_args_for_search_but_missing_history_file_path_should_return_error_string(
             self, _: mock.Mock) -> None:
@@ -64,6 +70,12 @@ class TestMain(TestCase):
                                                         sql=False,
                                                         all=True,
                                                         startswith=True,
+                                                        fuzzy=False,
+                                                        incremental=False,
+                                                        ranked=False,
+                                                        tokens=False, stats=False,
+                                                        since=None, before=None, timings=None,
+                                                        sql_profile=False, profile=False, background=False,
                                                         execute=False,
                                                         save_dir='save_dir',
                                                         history_file_path='hist',
@@ -88,6 +100,12 @@ class TestMain(TestCase):
                                                         sql=False,
                                                         all=True,
                                                         startswith=True,
+                                                        fuzzy=False,
+                                                        incremental=False,
+                                                        ranked=False,
+                                                        tokens=False, stats=False,
+                                                        since=None, before=None, timings=None,
+                                                        sql_profile=False, profile=False, background=False,
                                                         execute=True,
                                                         save_dir='save_dir',
                                                         history_file_path='hist',
@@ -113,6 +131,12 @@ class TestMain(TestCase):
                                                         sql=False,
                                                         all=True,
                                                         startswith=True,
+                                                        fuzzy=False,
+                                                        incremental=False,
+                                                        ranked=False,
+                                                        tokens=False, stats=False,
+                                                        since=None, before=None, timings=None,
+                                                        sql_profile=False, profile=False, background=False,
                                                         execute=True,
                                                         save_dir='save_dir',
                                                         history_file_path='hist',
@@ -137,6 +161,12 @@ class TestMain(TestCase):
                                                         sql=False,
                                                         all=True,
                                                         startswith=True,
+                                                        fuzzy=False,
+                                                        incremental=False,
+                                                        ranked=False,
+                                                        tokens=False, stats=False,
+                                                        since=None, before=None, timings=None,
+                                                        sql_profile=False, profile=False, background=False,
                                                         execute=True,
                                                         save_dir='save_dir',
                                                         history_file_path='hist',
@@ -144,4 +174,123 @@ class TestMain(TestCase):
                                                         query=['grep'])):
             remember_main.main()
             method_mock.assert_called_once_with(
-                "save_dir", "hist", ['grep'], True, True, True, 1)
+                "save_dir", "hist", ['grep'], True, True, True, 1, False, False, False,
+                False, None, None, False, False)
+
+    @mock.patch('remember.command_store_lib.start_history_processing')
+    def test_run_remember_command_whenTokens_shouldSearchTokenIndex(
+            self, process_mock: Mock) -> None:
+        store = create_test_sql_command_store(['docker run --rm ubuntu', 'docker ps'])
+        with mock.patch('remember.command_store_lib.load_command_store', return_value=store):
+            with mock.patch('remember_main.display_and_interact_results') as display_mock:
+                remember_main.run_remember_command("test", 'test_hist', ['docker', '--rm'], False,
+                                                   False, False, 10, tokens=True)
+                result = display_mock.call_args[0][0]
+        self.assertEqual(['docker run --rm ubuntu'], [x.get_unique_command_id() for x in result])
+
+    @mock.patch('remember.command_store_lib.start_history_processing')
+    @mock.patch('remember.command_store_lib.print_primary_command_stats')
+    def test_run_stats_command_whenPrimaryGiven_shouldPrintItsInvocations(
+            self, print_stats_mock: Mock, process_mock: Mock) -> None:
+        store = create_test_sql_command_store(['kubectl get pods', 'kubectl logs foo', 'ls'])
+        with mock.patch('remember.command_store_lib.load_command_store', return_value=store):
+            with mock.patch('remember.command_store_lib.print_commands') as print_mock:
+                result = remember_main.run_stats_command("test", 'test_hist', ['kubectl'], 10)
+        self.assertIsNone(result)
+        self.assertEqual(2, print_stats_mock.call_args[0][0][0].distinct_variants)
+        self.assertEqual(2, len(print_mock.call_args[0][0]))
+
+    @mock.patch('remember.command_store_lib.start_history_processing')
+    def test_run_remember_command_whenSinceWithoutQuery_shouldRankByUsesInWindow(
+            self, process_mock: Mock) -> None:
+        store = SqlCommandStore()
+        store.add_command(Command('git status', 100.0, 10))
+        store.add_command(Command('ls', 200 * 86400.0))
+        store.add_command(Command('git pull', 200 * 86400.0))
+        store.add_command(Command('git pull', 200 * 86400.0))
+        with mock.patch('remember.command_store_lib.load_command_store', return_value=store):
+            with mock.patch('remember_main.display_and_interact_results') as display_mock:
+                remember_main.run_remember_command("test", 'test_hist', [], False, False,
+                                                   False, 10, since=150 * 86400.0)
+                result = display_mock.call_args[0][0]
+        self.assertEqual(['git pull', 'ls'], [x.get_unique_command_id() for x in result])
+        self.assertEqual(2, result[0].get_count_seen())
+
+    @mock.patch('remember.command_store_lib.start_history_processing')
+    def test_run_remember_command_whenTokensSinceWithoutQuery_shouldRankByUsesInWindow(
+            self, process_mock: Mock) -> None:
+        store = SqlCommandStore()
+        store.add_command(Command('git status', 200 * 86400.0))
+        with mock.patch('remember.command_store_lib.load_command_store', return_value=store):
+            with mock.patch('remember_main.display_and_interact_results') as display_mock:
+                remember_main.run_remember_command("test", 'test_hist', [], False, False,
+                                                   False, 10, tokens=True, since=150 * 86400.0)
+                result = display_mock.call_args[0][0]
+        self.assertEqual(['git status'], [x.get_unique_command_id() for x in result])
+
+    @mock.patch('remember.command_store_lib.start_history_processing')
+    def test_run_remember_command_whenBeforeWithoutQuery_shouldListMostUsedBefore(
+            self, process_mock: Mock) -> None:
+        store = SqlCommandStore()
+        store.add_command(Command('git status', 100.0))
+        store.add_command(Command('ls', 150.0, 3))
+        store.add_command(Command('git pull', 300.0, 5))
+        with mock.patch('remember.command_store_lib.load_command_store', return_value=store):
+            with mock.patch('remember_main.display_and_interact_results') as display_mock:
+                remember_main.run_remember_command("test", 'test_hist', [], False, False,
+                                                   False, 10, before=200.0)
+                result = display_mock.call_args[0][0]
+        self.assertEqual(['ls', 'git status'], [x.get_unique_command_id() for x in result])
+
+    @mock.patch('remember.command_store_lib.start_history_processing')
+    def test_run_remember_command_whenSinceAndBeforeWithoutQuery_shouldApplyBoth(
+            self, process_mock: Mock) -> None:
+        store = SqlCommandStore()
+        store.add_command(Command('git status', 100.0))
+        store.add_command(Command('ls', 200 * 86400.0))
+        store.add_command(Command('git pull', 300 * 86400.0))
+        with mock.patch('remember.command_store_lib.load_command_store', return_value=store):
+            with mock.patch('remember_main.display_and_interact_results') as display_mock:
+                remember_main.run_remember_command("test", 'test_hist', [], False, False,
+                                                   False, 10, since=150 * 86400.0,
+                                                   before=250 * 86400.0)
+                result = display_mock.call_args[0][0]
+        self.assertEqual(['ls'], [x.get_unique_command_id() for x in result])
+
+    @mock.patch('remember.command_store_lib.start_history_processing')
+    def test_run_remember_command_whenTokensAndTimeRange_shouldFilterByLastUsed(
+            self, process_mock: Mock) -> None:
+        store = SqlCommandStore()
+        store.add_command(Command('docker ps', 100.0))
+        store.add_command(Command('docker ps -a', 200.0))
+        store.add_command(Command('docker ps -q', 300.0))
+        with mock.patch('remember.command_store_lib.load_command_store', return_value=store):
+            with mock.patch('remember_main.display_and_interact_results') as display_mock:
+                remember_main.run_remember_command("test", 'test_hist', ['docker', 'ps'], False,
+                                                   False, False, 10, tokens=True, since=150.0,
+                                                   before=250.0)
+                result = display_mock.call_args[0][0]
+        self.assertEqual(['docker ps -a'], [x.get_unique_command_id() for x in result])
+
+    def test_run_search_args_whenRankedAndTimeRange_shouldReturnError(self) -> None:
+        args = argparse.Namespace(save_dir='save_dir', history_file_path='hist', stats=False,
+                                  query=['docker'], ranked=True, since=100.0, before=None)
+        with mock.patch('remember_main.run_remember_command') as run_mock:
+            error = remember_main.run_search_args(args)
+            assert error is not None
+            self.assertIn('--ranked', error)
+            run_mock.assert_not_called()
+
+    @mock.patch('remember.command_store_lib.start_history_processing')
+    def test_run_remember_command_whenSinceAndBefore_shouldFilterByLastUsed(
+            self, process_mock: Mock) -> None:
+        store = SqlCommandStore()
+        store.add_command(Command('docker ps', 100.0))
+        store.add_command(Command('docker run', 200.0))
+        store.add_command(Command('docker build', 300.0))
+        with mock.patch('remember.command_store_lib.load_command_store', return_value=store):
+            with mock.patch('remember_main.display_and_interact_results') as display_mock:
+                remember_main.run_remember_command("test", 'test_hist', ['docker'], False, False,
+                                                   False, 10, since=150.0, before=250.0)
+                result = display_mock.call_args[0][0]
+        self.assertEqual(['docker run'], [x.get_unique_command_id() for x in result])
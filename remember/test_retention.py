@@ -0,0 +1,73 @@
+# flake8: noqa
+import os
+import tempfile
+import unittest
+
+from remember.constants import SECONDS_PER_DAY
+from remember.retention import RetentionPolicy, apply_retention_policy
+from remember.sql_store import SqlCommandStore, Command
+
+NOW = 1000 * SECONDS_PER_DAY
+
+
+class RetentionTests(unittest.TestCase):
+    def test_apply_retention_policy_whenOldSingleUseCommands_shouldDeleteThemInBatches(
+            self) -> None:
+        store = SqlCommandStore(':memory:')
+        for index in range(25):
+            store.add_command(Command(f'typo {index}', NOW - 100 * SECONDS_PER_DAY))
+        store.add_command(Command('git status', NOW - 100 * SECONDS_PER_DAY, 2))
+        store.add_command(Command('recent typo', NOW - SECONDS_PER_DAY))
+        store.add_command(Command('old but annotated', NOW - 100 * SECONDS_PER_DAY, 1, 'info'))
+        report = apply_retention_policy(
+            store, RetentionPolicy(single_use_max_age_days=90, batch_size=10), NOW)
+        self.assertEqual(25, report.commands_deleted)
+        self.assertEqual(28, report.before.num_commands)
+        self.assertEqual(3, report.after.num_commands)
+        remaining = [x.get_unique_command_id() for x in store.search_commands([''])]
+        self.assertEqual({'git status', 'recent typo', 'old but annotated'}, set(remaining))
+        self.assertEqual(0, len(store.search_commands_by_tokens('typo', [])))
+        stat = store.get_primary_command_stat('git')
+        assert stat is not None
+        self.assertEqual(2, stat.total_count)
+
+    def test_apply_retention_policy_whenNotKeepingAnnotated_shouldDeleteAnnotatedToo(
+            self) -> None:
+        store = SqlCommandStore(':memory:')
+        store.add_command(Command('old but annotated', NOW - 100 * SECONDS_PER_DAY, 1, 'info'))
+        report = apply_retention_policy(
+            store, RetentionPolicy(single_use_max_age_days=90, keep_annotated=False), NOW)
+        self.assertEqual(1, report.commands_deleted)
+
+    def test_apply_retention_policy_whenDirectoryOverCap_shouldKeepMostRecent(self) -> None:
+        store = SqlCommandStore(':memory:')
+        for index in range(5):
+            store.add_command(Command(f'make target{index}', NOW - index, 2,
+                                      directory_context='/src/project'))
+        store.add_command(Command('ls', NOW, 2, directory_context='/src/other'))
+        report = apply_retention_policy(
+            store, RetentionPolicy(single_use_max_age_days=None, max_contexts_per_directory=2,
+                                   batch_size=2), NOW)
+        self.assertEqual(3, report.contexts_deleted)
+        self.assertEqual(6, report.after.num_commands)
+        self.assertEqual(3, report.after.num_contexts)
+        commands = store.get_command_with_context('/src/project', [])
+        self.assertEqual(['make target0', 'make target1'],
+                         [x.get_unique_command_id() for x in commands])
+
+    def test_apply_retention_policy_whenFileStore_shouldReclaimSpace(self) -> None:
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            store = SqlCommandStore(os.path.join(tmp_dir, 'remember.db'))
+            for index in range(2000):
+                store.add_command(Command(f'one off command number {index} ' + 'x' * 100,
+                                          NOW - 100 * SECONDS_PER_DAY))
+            report = apply_retention_policy(store, RetentionPolicy(), NOW)
+            self.assertEqual(2000, report.commands_deleted)
+            self.assertGreater(report.bytes_reclaimed, 0)
+            self.assertEqual(0, report.after.free_bytes)
+            self.assertIn('2000 commands', str(report))
+            # Once converted to incremental auto vacuum later runs don't need a full VACUUM.
+            store.add_command(Command('another one off', NOW - 100 * SECONDS_PER_DAY))
+            report = apply_retention_policy(store, RetentionPolicy(), NOW)
+            self.assertEqual(1, report.commands_deleted)
+            self.assertEqual(0, report.after.free_bytes)
@@ -1,46 +1,58 @@
 # flake8: noqa
+import os
+import sqlite3
+import tempfile
 import unittest
 
+import mock
+
 from remember.sql_store import _create_command_search_select_query, Command, _rerank_matches, \
     SqlCommandStore
 
 REMEMBER_STAR = 'full_command, count_seen, last_used, command_info'
+LIKE_FULL_COMMAND = "full_command LIKE ? ESCAPE '\\'"
+LIKE_COMMAND_INFO = "command_info LIKE ? ESCAPE '\\'"
 
 
 class SqlStoreTests(unittest.TestCase):
     def test_create_select_query_whenSingleTermAll3_ShouldReturnAll3Query(self) -> None:
-        query = _create_command_search_select_query(['grep'], True, True, True)
+        query, params = _create_command_search_select_query(['grep'], True, True, True)
         query = ' '.join(query.split())
-        expected = f"SELECT {REMEMBER_STAR} FROM remember WHERE (full_command LIKE 'grep%' OR " \
-                   "command_info LIKE 'grep%') ORDER BY count_seen DESC, last_used DESC"
+        expected = f"SELECT {REMEMBER_STAR} FROM remember WHERE ({LIKE_FULL_COMMAND} OR " \
+                   f"{LIKE_COMMAND_INFO}) ORDER BY count_seen DESC, last_used DESC"
         self.assertEqual(expected, query)
+        self.assertEqual(['grep%', 'grep%'], params)
 
 
     def test_create_select_query_whenSingleTermNoSpecial_ShouldReturnBasicQuery(self) -> None:
-        query = _create_command_search_select_query(['grep'], False, False, False)
+        query, params = _create_command_search_select_query(['grep'], False, False, False)
         query = ' '.join(query.split())
-        expected = f"SELECT {REMEMBER_STAR} FROM remember WHERE (full_command LIKE '%grep%')"
+        expected = f"SELECT {REMEMBER_STAR} FROM remember WHERE ({LIKE_FULL_COMMAND})"
         self.assertEqual(expected, query)
+        self.assertEqual(['%grep%'], params)
 
     def test_create_select_query_whenSingleTermSorted_ShouldReturnBasicSortQuery(self) -> None:
-        query = _create_command_search_select_query(['grep'], False, True, False)
+        query, params = _create_command_search_select_query(['grep'], False, True, False)
         query = ' '.join(query.split())
-        expected = f"SELECT {REMEMBER_STAR} FROM remember WHERE (full_command LIKE " \
-                   f"'%grep%') ORDER BY count_seen DESC, last_used DESC"
+        expected = f"SELECT {REMEMBER_STAR} FROM remember WHERE ({LIKE_FULL_COMMAND}) " \
+                   f"ORDER BY count_seen DESC, last_used DESC"
         self.assertEqual(expected, query)
+        self.assertEqual(['%grep%'], params)
 
     def test_create_select_query_whenSingleTermStartsWith_ShouldReturnStartsWithQuery(self) -> None:
-        query = _create_command_search_select_query(['grep'], True, False, False)
+        query, params = _create_command_search_select_query(['grep'], True, False, False)
         query = ' '.join(query.split())
-        expected = f"SELECT {REMEMBER_STAR} FROM remember WHERE (full_command LIKE 'grep%')"
+        expected = f"SELECT {REMEMBER_STAR} FROM remember WHERE ({LIKE_FULL_COMMAND})"
         self.assertEqual(expected, query)
+        self.assertEqual(['grep%'], params)
 
     def test_create_select_query_whenSingleTermStartsWithAndSort_ShouldReturnBothQuery(self) -> None:
-        query = _create_command_search_select_query(['grep'], True, True, False)
+        query, params = _create_command_search_select_query(['grep'], True, True, False)
         query = ' '.join(query.split())
-        expected = f"SELECT {REMEMBER_STAR} FROM remember WHERE (full_command LIKE 'grep%') " \
+        expected = f"SELECT {REMEMBER_STAR} FROM remember WHERE ({LIKE_FULL_COMMAND}) " \
                    "ORDER BY count_seen DESC, last_used DESC"
         self.assertEqual(expected, query)
+        self.assertEqual(['grep%'], params)
 
     def test_rerank_whenMoreTermsInLater_shouldReorderCommands(self) -> None:
         command_str = 'one two three'
@@ -154,6 +166,92 @@ class SqlStoreTests(unittest.TestCase):
         self.assertEqual(1, len(results))
         self.assertEqual(context_path, results[0].get_directory_context())
 
+    def test_get_command_with_context_whenRecursive_shouldIncludeSubdirectories(self) -> None:
+        store = SqlCommandStore(':memory:')
+        store.add_command(Command('make', 1.0, directory_context='/src/project'))
+        store.add_command(Command('pytest', 2.0, directory_context='/src/project/tests'))
+        store.add_command(Command('make', 3.0, directory_context='/src/project/docs'))
+        store.add_command(Command('make', 4.0, directory_context='/src/project/docs'))
+        store.add_command(Command('ls', 5.0, directory_context='/src/other'))
+        self.assertEqual(['make'], [x.get_unique_command_id()
+                                    for x in store.get_command_with_context('/src/project', [])])
+        results = store.get_command_with_context('/src/project', [], recursive=True)
+        self.assertEqual(['make', 'pytest'], [x.get_unique_command_id() for x in results])
+        self.assertEqual(3, results[0].get_count_seen())
+        self.assertEqual('/src/project/docs', results[0].get_directory_context())
+        self.assertEqual('/src/project/tests', results[1].get_directory_context())
+        self.assertEqual([], store.get_command_with_context('/src/missing', [], recursive=True))
+
+    def test_get_command_with_context_whenDirectoriesShareAncestors_shouldStoreEachOnce(
+            self) -> None:
+        store = SqlCommandStore(':memory:')
+        store.add_command(Command('ls', directory_context='/home/user/a'))
+        store.add_command(Command('ls', directory_context='/home/user/b'))
+        db_conn = store._get_initialized_db_connection()
+        self.assertEqual(5, db_conn.execute('SELECT COUNT(*) FROM directories').fetchone()[0])
+        # Without the path cache the path is rebuilt from the ancestors.
+        store._clear_directory_cache()
+        results = store.get_command_with_context('/home/user', [], recursive=True)
+        self.assertEqual('/home/user/a', results[0].get_directory_context())
+
+    def test_get_command_with_context_whenLegacyDirectoryTable_shouldMigrateToTree(
+            self) -> None:
+        db_conn = sqlite3.connect(':memory:')
+        db_conn.executescript("""
+            CREATE TABLE remember (
+              rowid INTEGER PRIMARY KEY AUTOINCREMENT, full_command TEXT UNIQUE,
+              count_seen INTEGER NOT NULL, last_used REAL NOT NULL, command_info TEXT);
+            CREATE TABLE directories (
+              rowid INTEGER PRIMARY KEY AUTOINCREMENT, dir_path TEXT UNIQUE);
+            CREATE TABLE command_context (
+              command_id INTEGER NOT NULL, context_id INTEGER NOT NULL,
+              num_occurrences INTEGER NOT NULL, UNIQUE(command_id, context_id),
+              FOREIGN KEY(command_id) REFERENCES remember(rowid) ON DELETE CASCADE,
+              FOREIGN KEY(context_id) REFERENCES directories(rowid) ON DELETE CASCADE);
+            INSERT INTO remember VALUES(1, 'make', 2, 1.0, NULL);
+            INSERT INTO directories VALUES(1, '/src/project'), (2, '/src/project/docs');
+            INSERT INTO command_context VALUES(1, 1, 1), (1, 2, 1);""")
+        with mock.patch('remember.sql_store._create_db_connection', return_value=db_conn):
+            store = SqlCommandStore('legacy.db')
+            results = store.get_command_with_context('/src/project/docs', [])
+        self.assertEqual(['make'], [x.get_unique_command_id() for x in results])
+        self.assertEqual('/src/project/docs', results[0].get_directory_context())
+        self.assertEqual(2, store.get_command_with_context('/src/project', [], True)[0]
+                         .get_count_seen())
+        self.assertEqual([], db_conn.execute('PRAGMA foreign_key_check').fetchall())
+        store.add_command(Command('make', directory_context='/src/project/docs'))
+        self.assertEqual(2, store.get_command_with_context('/src/project/docs', [])[0]
+                         .get_count_seen())
+
+    def test_search_commands_whenTimeRange_shouldOnlyReturnCommandsLastUsedInRange(
+            self) -> None:
+        store = SqlCommandStore(':memory:')
+        store.add_command(Command('docker ps', 100.0))
+        store.add_command(Command('docker run', 200.0))
+        store.add_command(Command('docker build', 300.0))
+        def search(**kwargs):
+            return [x.get_unique_command_id() for x in store.search_commands(['docker'], **kwargs)]
+        self.assertEqual(['docker build', 'docker run'], search(since=200.0))
+        self.assertEqual(['docker ps'], search(before=200.0))
+        self.assertEqual(['docker run'], search(since=150.0, before=250.0))
+        self.assertEqual(['docker run'], search(fuzzy=True, since=150.0, before=250.0))
+        db_conn = store._get_initialized_db_connection()
+        query, params = _create_command_search_select_query(
+            ['docker'], False, True, False, False, 'last_used >= ?')
+        plan = db_conn.execute('EXPLAIN QUERY PLAN ' + query, (*params, 1.0)).fetchall()
+        self.assertIn('remember_last_used', ' '.join(row[3] for row in plan))
+
+    def test_get_command_with_context_whenTimeRange_shouldFilterByLastUsed(self) -> None:
+        store = SqlCommandStore(':memory:')
+        store.add_command(Command('make', 100.0, directory_context='/src'))
+        store.add_command(Command('ls', 300.0, directory_context='/src'))
+        store.add_command(Command('pytest', 300.0, directory_context='/src/tests'))
+        self.assertEqual(['make'], [x.get_unique_command_id() for x in
+                                    store.get_command_with_context('/src', [], before=200.0)])
+        self.assertEqual(['ls', 'pytest'],
+                         sorted(x.get_unique_command_id() for x in store.get_command_with_context(
+                             '/src', [], recursive=True, since=200.0)))
+
     def test_search_commands_sorted(self) -> None:
         command_store = SqlCommandStore(':memory:')
         self.assertEqual(0, command_store.get_num_commands())
@@ -292,3 +390,214 @@ class SqlStoreTests(unittest.TestCase):
         result_command = commands[0]
         # Newer on first
         self.assertEqual(command3.get_unique_command_id(), result_command.get_unique_command_id())
+
+    def test_search_commands_whenFuzzy_shouldMatchAbbreviations(self) -> None:
+        store = SqlCommandStore(':memory:')
+        store.add_command(Command('git checkout master'))
+        store.add_command(Command('git commit -m "fix"'))
+        store.add_command(Command('Git Checkout Main'))
+        matches = store.search_commands(['gco', 'mstr'], fuzzy=True)
+        self.assertEqual(['git checkout master'], [x.get_unique_command_id() for x in matches])
+        matches = store.search_commands(['gc'], fuzzy=True, fuzzy_limit=2)
+        self.assertEqual(2, len(matches))
+        matches = store.search_commands(['GC'], fuzzy=True)
+        self.assertEqual(['Git Checkout Main'], [x.get_unique_command_id() for x in matches])
+
+    def test_search_commands_whenFuzzyTermHasLikeWildcards_shouldEscapeThem(self) -> None:
+        store = SqlCommandStore(':memory:')
+        store.add_command(Command('echo 100%'))
+        store.add_command(Command('echo 1000'))
+        matches = store.search_commands(['0%'], fuzzy=True)
+        self.assertEqual(['echo 100%'], [x.get_unique_command_id() for x in matches])
+
+    def test_search_commands_whenMatchAll_shouldRequireEveryTerm(self) -> None:
+        store = SqlCommandStore(':memory:')
+        store.add_command(Command('git checkout master'))
+        store.add_command(Command('git commit'))
+        matches = store.search_commands(['git', 'master'], match_all=True)
+        self.assertEqual(['git checkout master'], [x.get_unique_command_id() for x in matches])
+        matches = store.search_commands(['git', 'master'])
+        self.assertEqual(2, len(matches))
+        matches = store.search_commands(['git'], limit=1)
+        self.assertEqual(1, len(matches))
+
+    def test_search_commands_by_tokens_whenPrimaryAndFlag_shouldIntersectPostings(self) -> None:
+        store = SqlCommandStore(':memory:')
+        store.add_command(Command('docker run --rm -it ubuntu'))
+        store.add_command(Command('docker run -it ubuntu'))
+        store.add_command(Command('podman run --rm alpine'))
+        store.add_command(Command('echo docker --rm'))
+        matches = store.search_commands_by_tokens('docker', ['--rm'])
+        self.assertEqual(['docker run --rm -it ubuntu'],
+                         [x.get_unique_command_id() for x in matches])
+        matches = store.search_commands_by_tokens(None, ['--rm'])
+        self.assertEqual(3, len(matches))
+        self.assertEqual(0, len(store.search_commands_by_tokens('docker', ['--r'])))
+
+    def test_search_commands_by_tokens_whenCommandDeleted_shouldRemoveTokens(self) -> None:
+        store = SqlCommandStore(':memory:')
+        store.add_command(Command('docker run --rm ubuntu'))
+        store.delete_command('docker run --rm ubuntu')
+        self.assertEqual(0, len(store.search_commands_by_tokens('docker', [])))
+        db_conn = store._get_initialized_db_connection()
+        self.assertEqual(0, db_conn.execute('SELECT COUNT(*) FROM command_tokens').fetchone()[0])
+
+    def test_get_primary_command_stats_whenCommandsAdded_shouldAggregatePerPrimary(self) -> None:
+        store = SqlCommandStore(':memory:')
+        store.add_command(Command('git status', 10.0))
+        store.add_command(Command('git status', 30.0))
+        store.add_command(Command('git pull', 20.0))
+        store.add_command(Command('ls -la', 5.0))
+        stats = store.get_primary_command_stats(10)
+        self.assertEqual(['git', 'ls'], [x.primary_command for x in stats])
+        self.assertEqual(3, stats[0].total_count)
+        self.assertEqual(2, stats[0].distinct_variants)
+        self.assertEqual(30.0, stats[0].last_used)
+        self.assertEqual(1, len(store.get_primary_command_stats(1)))
+
+    def test_get_most_used_commands_since_whenUsedAcrossDays_shouldOnlyCountWindow(
+            self) -> None:
+        day = 86400.0
+        store = SqlCommandStore(':memory:')
+        for _ in range(5):
+            store.add_command(Command('git status', 10 * day))
+        store.add_command(Command('git pull', 20 * day))
+        store.add_command(Command('git pull', 21 * day + 5))
+        store.add_command(Command('ls -la', 21 * day))
+        results = store.get_most_used_commands_since(20 * day + 100, [], 10)
+        self.assertEqual(['git pull', 'ls -la'], [x.get_unique_command_id() for x in results])
+        self.assertEqual(2, results[0].get_count_seen())
+        results = store.get_most_used_commands_since(0, ['git'], 10, starts_with=True)
+        self.assertEqual(['git status', 'git pull'], [x.get_unique_command_id() for x in results])
+        results = store.get_most_used_commands_since(0, [], 10, primary_command='ls')
+        self.assertEqual(['ls -la'], [x.get_unique_command_id() for x in results])
+        stats = store.get_primary_command_stats_since(21 * day, 10)
+        self.assertEqual([('git', 1, 1), ('ls', 1, 1)],
+                         [(x.primary_command, x.total_count, x.distinct_variants) for x in stats])
+        stats = store.get_primary_command_stats_since(0, 10, 'git')
+        self.assertEqual([('git', 7, 2)],
+                         [(x.primary_command, x.total_count, x.distinct_variants) for x in stats])
+        store.delete_command('git pull')
+        self.assertEqual(1, len(store.get_most_used_commands_since(20 * day, [], 10)))
+
+    def test_get_primary_command_stat_whenVariantDeleted_shouldSubtractIt(self) -> None:
+        store = SqlCommandStore(':memory:')
+        store.add_command(Command('git status', 30.0))
+        store.add_command(Command('git status', 30.0))
+        store.add_command(Command('git pull', 20.0))
+        store.add_command(Command('ls', 40.0))
+        store.delete_command('git status')
+        stat = store.get_primary_command_stat('git')
+        assert stat is not None
+        self.assertEqual(1, stat.total_count)
+        self.assertEqual(1, stat.distinct_variants)
+        self.assertEqual(20.0, stat.last_used)
+        store.delete_command('git pull')
+        self.assertIsNone(store.get_primary_command_stat('git'))
+        self.assertIsNotNone(store.get_primary_command_stat('ls'))
+
+    def test_search_commands_whenReadOnly_shouldSearchAndRefuseWrites(self) -> None:
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            db_file_path = os.path.join(tmp_dir, 'remember.db')
+            store = SqlCommandStore(db_file_path)
+            store.add_command(Command('git status'))
+            store.close()
+            store = SqlCommandStore(db_file_path, read_only=True)
+            self.assertEqual(['git status'],
+                             [x.get_unique_command_id() for x in store.search_commands(['git'])])
+            db_conn = store._get_initialized_db_connection()
+            self.assertEqual(-16 * 1024, db_conn.execute('PRAGMA cache_size').fetchone()[0])
+            with self.assertRaises(sqlite3.OperationalError):
+                store.add_command(Command('ls'))
+            store.close()
+
+    def test_search_commands_whenReadOnlyStoreOutdated_shouldMigrateIt(self) -> None:
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            db_file_path = os.path.join(tmp_dir, 'remember.db')
+            db_conn = sqlite3.connect(db_file_path)
+            db_conn.executescript("""
+                CREATE TABLE remember (
+                  rowid INTEGER PRIMARY KEY AUTOINCREMENT, full_command TEXT UNIQUE,
+                  count_seen INTEGER NOT NULL, last_used REAL NOT NULL, command_info TEXT);
+                INSERT INTO remember VALUES(1, 'git status', 1, 1.0, NULL);""")
+            db_conn.close()
+            store = SqlCommandStore(db_file_path, read_only=True)
+            self.assertEqual(['git status'],
+                             [x.get_unique_command_id()
+                              for x in store.search_commands_by_tokens('git', [])])
+            store.close()
+
+    def test_in_memory_snapshot_whenNotWrittenBack_shouldLeaveStoreFileAlone(self) -> None:
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            db_file_path = os.path.join(tmp_dir, 'remember.db')
+            store = SqlCommandStore(db_file_path)
+            store.add_command(Command('git status'))
+            with store.in_memory_snapshot() as snapshot:
+                snapshot.add_command(Command('ls', directory_context='/src'))
+                self.assertTrue(snapshot.has_command_by_name('ls'))
+                self.assertEqual(1, len(snapshot.get_command_with_context('/src', [])))
+            self.assertFalse(store.has_command_by_name('ls'))
+            self.assertEqual([], store.get_command_with_context('/src', []))
+            self.assertTrue(store.has_command_by_name('git status'))
+            store.close()
+
+    def test_in_memory_snapshot_whenWrittenBack_shouldReplaceStoreFile(self) -> None:
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            db_file_path = os.path.join(tmp_dir, 'remember.db')
+            store = SqlCommandStore(db_file_path)
+            store.add_command(Command('git status'))
+            with store.in_memory_snapshot(write_back=True) as snapshot:
+                command = Command('git status')
+                command.set_command_info('show the working tree')
+                snapshot.update_command_info(command)
+                snapshot.add_command(Command('ls'))
+            store.close()
+            store = SqlCommandStore(db_file_path)
+            self.assertEqual(['show the working tree'],
+                             [x.get_command_info() for x in store.search_commands(['git'])])
+            self.assertTrue(store.has_command_by_name('ls'))
+            store.close()
+
+    def test_in_memory_snapshot_whenStoreChangedMeanwhile_shouldNotWriteBack(self) -> None:
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            db_file_path = os.path.join(tmp_dir, 'remember.db')
+            store = SqlCommandStore(db_file_path)
+            store.add_command(Command('git status'))
+            other_store = SqlCommandStore(db_file_path)
+            with self.assertRaises(RuntimeError):
+                with store.in_memory_snapshot(write_back=True) as snapshot:
+                    snapshot.add_command(Command('ls'))
+                    other_store.add_command(Command('make'))
+            other_store.close()
+            self.assertTrue(store.has_command_by_name('make'))
+            self.assertFalse(store.has_command_by_name('ls'))
+            store.close()
+
+    def test_in_memory_snapshot_whenWritingBack_shouldLockOutOtherCommits(self) -> None:
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            db_file_path = os.path.join(tmp_dir, 'remember.db')
+            store = SqlCommandStore(db_file_path)
+            store.add_command(Command('git status'))
+            other_conn = sqlite3.connect(db_file_path, timeout=0.1)
+            commit_errors = []
+
+            class CommitBeforeBackup(sqlite3.Connection):
+                def backup(self, *args, **kwargs) -> None:
+                    # Right between the data_version check and the copy.
+                    try:
+                        with other_conn:
+                            other_conn.execute("UPDATE remember SET command_info = 'lost'")
+                    except sqlite3.OperationalError as error:
+                        commit_errors.append(str(error))
+                    super().backup(*args, **kwargs)
+
+            with mock.patch('remember.sql_store._create_db_connection',
+                            lambda path, *_: sqlite3.connect(path, factory=CommitBeforeBackup)):
+                with store.in_memory_snapshot(write_back=True) as snapshot:
+                    snapshot.add_command(Command('ls'))
+            self.assertEqual(['database is locked'], commit_errors)
+            with other_conn:
+                other_conn.execute("UPDATE remember SET command_info = 'kept'")
+            other_conn.close()
+            self.assertTrue(store.has_command_by_name('ls'))
+            store.close()
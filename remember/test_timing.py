@@ -0,0 +1,77 @@
+# flake8: noqa
+import json
+import threading
+import unittest
+
+import mock
+
+from remember import timing
+from remember.command_store_lib import CommandAndContext, process_history_commands
+from remember.sql_store import SqlCommandStore
+
+
+class TimingTests(unittest.TestCase):
+    def test_phase_whenRepeated_shouldAddUpSecondsAndCalls(self) -> None:
+        timings = timing.Timings()
+        with mock.patch('time.perf_counter', side_effect=[1.0, 1.5, 2.0, 2.25]):
+            with timings.phase(timing.PHASE_SEARCH):
+                pass
+            with timings.phase(timing.PHASE_SEARCH):
+                pass
+        self.assertEqual(0.75, timings.get_seconds(timing.PHASE_SEARCH))
+        self.assertEqual(2, timings.get_calls(timing.PHASE_SEARCH))
+        self.assertEqual(0.0, timings.get_seconds(timing.PHASE_RENDER))
+
+    def test_phase_whenNested_shouldOnlyCountTheOuterPhaseOutsideTheInner(self) -> None:
+        timings = timing.Timings(0.0)
+        with mock.patch('time.perf_counter', side_effect=[1.0, 1.25, 1.75, 2.0]):
+            with timings.phase(timing.PHASE_SEARCH):
+                with timings.phase(timing.PHASE_RERANK):
+                    pass
+        self.assertEqual(0.5, timings.get_seconds(timing.PHASE_SEARCH))
+        self.assertEqual(0.5, timings.get_seconds(timing.PHASE_RERANK))
+
+    def test_to_json_whenPhasesRecorded_shouldKeepTheirOrderAndReportWallTime(self) -> None:
+        timings = timing.Timings(0.0)
+        timings.add(timing.PHASE_CONNECT, 0.002)
+        timings.add(timing.PHASE_SEARCH, 0.001)
+        with mock.patch('time.perf_counter', return_value=0.004):
+            report = json.loads(timings.to_json())
+            breakdown = timings.format_breakdown()
+        self.assertEqual([timing.PHASE_CONNECT, timing.PHASE_SEARCH],
+                         [x['name'] for x in report['phases']])
+        self.assertEqual(4.0, report['total_ms'])
+        self.assertIn('connect', breakdown)
+        self.assertIn('50.0', breakdown)
+
+    def test_add_whenCalledFromThreads_shouldCountEveryCall(self) -> None:
+        timings = timing.Timings()
+
+        def add_phases() -> None:
+            for _ in range(1000):
+                timings.add(timing.PHASE_DB_WRITE, 0.001)
+
+        threads = [threading.Thread(target=add_phases) for _ in range(4)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        self.assertEqual(4000, timings.get_calls(timing.PHASE_DB_WRITE))
+        self.assertAlmostEqual(4.0, timings.get_seconds(timing.PHASE_DB_WRITE))
+
+    def test_process_history_commands_whenCalled_shouldRecordFilterAndWritePhases(
+            self) -> None:
+        timing.TIMINGS.reset()
+        store = SqlCommandStore(':memory:')
+        process_history_commands(store, [CommandAndContext('ls'), CommandAndContext('git log')])
+        for name in (timing.PHASE_CONNECT, timing.PHASE_TABLE_CHECK, timing.PHASE_IGNORE_FILTER,
+                     timing.PHASE_DB_WRITE):
+            self.assertEqual(1, timing.TIMINGS.get_calls(name), name)
+        timing.TIMINGS.reset()
+
+    def test_report_timings_whenNoFormat_shouldPrintNothing(self) -> None:
+        with mock.patch('builtins.print') as print_mock:
+            timing.report_timings(None)
+            print_mock.assert_not_called()
+            timing.report_timings(timing.TIMINGS_JSON)
+            print_mock.assert_called_once()
@@ -1,6 +1,6 @@
 # flake8: noqa
 import argparse
-from typing import List
+from typing import List, Optional
 from unittest import TestCase
 
 import mock
@@ -12,10 +12,16 @@ from remember.interactive import InteractiveCommandExecutor
 
 class CommandStoreTest(SqlCommandStore):
     def search_commands(self,
-                        search_terms: List,
+                        search_terms: List[str],
                         starts_with: bool = False,
                         sort: bool = True,
-                        search_info: bool = False) -> List[Command]:
+                        search_info: bool = False,
+                        fuzzy: bool = False,
+                        fuzzy_limit: int = 100,
+                        match_all: bool = False,
+                        limit: Optional[int] = None,
+                        since: Optional[float] = None,
+                        before: Optional[float] = None) -> List[Command]:
         return [Command('result not used'), Command('another command')]
 
 
@@ -28,15 +34,19 @@ class TestMain(TestCase):
                                                         sql=False,
                                                         all=True,
                                                         startswith=True,
+                                                        fuzzy=False,
                                                         execute=False,
                                                         save_dir='save_dir',
                                                         history_file_path='hist',
                                                         delete=False,
                                                         updateinfo=False,
                                                         max=1000,
+                                                        timings=None,
+                                                        sql_profile=False, profile=False,
                                                         query='query')):
             update_store.main(InteractiveCommandExecutor())
             load_store_mock.assert_called()
+            self.assertTrue(load_store_mock.call_args.kwargs['read_only'])
 
     @mock.patch('remember.command_store_lib.load_command_store', return_value=CommandStoreTest())
     @mock.patch('remember.command_store_lib.print_commands')
@@ -47,53 +57,67 @@ class TestMain(TestCase):
                                                         sql=False,
                                                         all=True,
                                                         startswith=True,
+                                                        fuzzy=False,
                                                         execute=False,
                                                         save_dir='save_dir',
                                                         history_file_path='hist',
                                                         delete=True,
                                                         updateinfo=False,
                                                         max=1000,
+                                                        timings=None,
+                                                        sql_profile=False, profile=False,
                                                         query='query')):
             command_executor_mock = mock.Mock()
             command_executor_mock.delete_interaction.return_value = True
             update_store.main(command_executor_mock)
             print_commands.assert_called_once()
             load_store_mock.assert_called()
+            self.assertFalse(load_store_mock.call_args.kwargs['read_only'])
 
+    @mock.patch('remember.command_store_lib.load_info_index')
     @mock.patch('remember.command_store_lib.load_command_store', return_value=CommandStoreTest())
     def test_setup_args_for_update_when_called_with_update_store_updated(
-            self, load_store_mock: mock.Mock) -> None:
+            self, load_store_mock: mock.Mock, load_index_mock: mock.Mock) -> None:
         with mock.patch('argparse.ArgumentParser.parse_args',
                         return_value=argparse.Namespace(json=True,
                                                         sql=False,
                                                         all=True,
                                                         startswith=True,
+                                                        fuzzy=False,
                                                         execute=False,
                                                         save_dir='save_dir',
                                                         history_file_path='hist',
                                                         delete=False,
                                                         updateinfo=True,
                                                         max=1000,
+                                                        timings=None,
+                                                        sql_profile=False, profile=False,
                                                         query='query')):
             command_executor_mock = mock.Mock()
             update_store.main(command_executor_mock)
             load_store_mock.assert_called()
+            load_index_mock.assert_called_once()
 
+    @mock.patch('remember.command_store_lib.load_info_index')
     @mock.patch('remember.command_store_lib.load_command_store', return_value=CommandStoreTest())
     def test_setup_args_for_update_when_called_with_update_andmax1_store_updated(
-            self, load_store_mock: mock.Mock) -> None:
+            self, load_store_mock: mock.Mock, load_index_mock: mock.Mock) -> None:
         with mock.patch('argparse.ArgumentParser.parse_args',
                         return_value=argparse.Namespace(json=True,
                                                         sql=False,
                                                         all=True,
                                                         startswith=True,
+                                                        fuzzy=False,
                                                         execute=False,
                                                         save_dir='save_dir',
                                                         history_file_path='hist',
                                                         delete=False,
                                                         updateinfo=True,
                                                         max=1,
+                                                        timings=None,
+                                                        sql_profile=False, profile=False,
                                                         query='query')):
             command_executor_mock = mock.Mock()
             update_store.main(command_executor_mock)
             load_store_mock.assert_called()
+            load_index_mock.assert_called_once()
@@ -0,0 +1,124 @@
+"""
+This module records how long the named phases of a remember command take.
+
+Every entry point shares the process wide TIMINGS. Code wraps its work in a phase and the
+entry point prints the breakdown (or JSON for collection) when run with --timings. Phases are
+exclusive, the time of a phase nested in another only counts for the inner one, and the total
+is the wall time since the timings started, so the phases of one thread stay within it.
+"""
+import json
+import threading
+import time
+from contextlib import contextmanager
+from typing import ContextManager, Dict, Iterator, List, Optional, Tuple
+
+PHASE_IMPORT = 'import'
+PHASE_CONNECT = 'connect'
+PHASE_TABLE_CHECK = 'table check'
+PHASE_HISTORY_READ = 'history read'
+PHASE_PARSE = 'parse'
+PHASE_IGNORE_FILTER = 'ignore filter'
+PHASE_DB_WRITE = 'db write'
+PHASE_SEARCH = 'search'
+PHASE_RERANK = 'rerank'
+PHASE_RENDER = 'render'
+
+TIMINGS_TEXT = 'text'
+TIMINGS_JSON = 'json'
+
+# Taken when the first remember module imports this one, the import phase ends when the entry
+# point calls end_import_phase.
+_IMPORT_START_TIME = time.perf_counter()
+
+
+class Timings(object):
+    """Exclusive seconds and number of calls per phase, in the order the phases first ran."""
+
+    def __init__(self, start_time: Optional[float] = None) -> None:
+        self._start_time = time.perf_counter() if start_time is None else start_time
+        # Guards the seconds and calls, the background history processor records phases too.
+        self._lock = threading.Lock()
+        self._seconds: Dict[str, float] = {}
+        self._calls: Dict[str, int] = {}
+        # Per thread, the seconds spent in the nested phases of every open phase.
+        self._local = threading.local()
+
+    @contextmanager
+    def phase(self, name: str) -> Iterator[None]:
+        """Time the with block minus its nested phases, repeated phases add up."""
+        open_phases: List[float] = self._local.__dict__.setdefault('open_phases', [])
+        open_phases.append(0.0)
+        start_time = time.perf_counter()
+        try:
+            yield
+        finally:
+            elapsed = time.perf_counter() - start_time
+            nested_seconds = open_phases.pop()
+            if open_phases:
+                open_phases[-1] += elapsed
+            self.add(name, elapsed - nested_seconds)
+
+    def add(self, name: str, seconds: float) -> None:
+        with self._lock:
+            self._seconds[name] = self._seconds.get(name, 0.0) + seconds
+            self._calls[name] = self._calls.get(name, 0) + 1
+
+    def get_seconds(self, name: str) -> float:
+        with self._lock:
+            return self._seconds.get(name, 0.0)
+
+    def get_calls(self, name: str) -> int:
+        with self._lock:
+            return self._calls.get(name, 0)
+
+    def get_total_seconds(self) -> float:
+        """The wall time since the timings started."""
+        return time.perf_counter() - self._start_time
+
+    def reset(self) -> None:
+        with self._lock:
+            self._start_time = time.perf_counter()
+            self._seconds = {}
+            self._calls = {}
+
+    def to_json(self) -> str:
+        return json.dumps({
+            'phases': [{'name': name, 'ms': round(seconds * 1000, 3), 'calls': calls}
+                       for name, seconds, calls in self._get_phases()],
+            'total_ms': round(self.get_total_seconds() * 1000, 3),
+        })
+
+    def format_breakdown(self) -> str:
+        total = self.get_total_seconds()
+        lines = [f'{"phase":<15}{"ms":>10}{"%":>7}{"calls":>8}']
+        for name, seconds, calls in self._get_phases():
+            percent = 100 * seconds / total if total else 0.0
+            lines.append(f'{name:<15}{seconds * 1000:>10.2f}{percent:>7.1f}{calls:>8}')
+        lines.append(f'{"total":<15}{total * 1000:>10.2f}')
+        return '\n'.join(lines)
+
+    def _get_phases(self) -> List[Tuple[str, float, int]]:
+        """A copy of the name, seconds and calls of every phase, phases may be added meanwhile."""
+        with self._lock:
+            return [(name, seconds, self._calls[name]) for name, seconds in self._seconds.items()]
+
+
+TIMINGS = Timings(_IMPORT_START_TIME)
+
+
+def phase(name: str) -> ContextManager[None]:
+    """Time a phase on the process wide timings, ex: with timing.phase(PHASE_SEARCH): ..."""
+    return TIMINGS.phase(name)
+
+
+def end_import_phase() -> None:
+    """Record the time spent importing, called by the entry points once their imports ran."""
+    TIMINGS.add(PHASE_IMPORT, time.perf_counter() - _IMPORT_START_TIME)
+
+
+def report_timings(output_format: Optional[str]) -> None:
+    """Print the recorded phases in the --timings format, nothing when it wasn't given."""
+    if output_format == TIMINGS_JSON:
+        print(TIMINGS.to_json())
+    elif output_format == TIMINGS_TEXT:
+        print(TIMINGS.format_breakdown())
@@ -3,19 +3,32 @@
 This module runs the remember portion of the command store interaction. It
 allows you to query all the stored commands and also delete them if you choose.
 """
-import time
+# Imported first so that the import phase covers the imports below.
+from remember import timing
+import argparse
 from typing import Optional, List
 
 import remember.command_store_lib as command_store
+from remember import profiling
 from remember.handle_args import setup_args_for_search
-from remember.interactive import display_and_interact_results
+from remember.interactive import display_and_interact_results, load_user_interactor
+from remember.interactive_search import run_incremental_search
 
 IGNORE_RULE_FILE_NAME = 'ignore_rules.txt'
 
 
 def main() -> Optional[str]:
     """Entry point for this executable python module."""
+    timing.end_import_phase()
     args = setup_args_for_search()
+    try:
+        with profiling.profile(args.profile, args.save_dir, 'remember'):
+            return run_search_args(args)
+    finally:
+        timing.report_timings(args.timings)
+
+
+def run_search_args(args: argparse.Namespace) -> Optional[str]:
     if not args.save_dir:
         return """To many or too few args.\n$> remember.py [
                  file_store_directory_path] [history_file_path]
@@ -24,23 +37,105 @@ def main() -> Optional[str]:
         return """To many or too few args.\n$> remember.py [
                  file_store_directory_path] [history_file_path]
                  ['word|phrase to look up']"""
+    if args.stats:
+        return run_stats_command(args.save_dir, args.history_file_path, args.query, args.max,
+                                 args.since)
+    if not args.query and args.since is None and args.before is None:
+        return "Please provide the term to search for, --since, --before or --stats."
+    if args.ranked and (args.since is not None or args.before is not None):
+        return "--ranked orders the commands by their info, it can't be used with --since " \
+               "or --before."
     return run_remember_command(args.save_dir, args.history_file_path, args.query,
-                                args.all, args.startswith, args.execute, args.max)
+                                args.all, args.startswith, args.execute, args.max, args.fuzzy,
+                                args.incremental, args.ranked, args.tokens, args.since,
+                                args.before, args.sql_profile, args.background)
 
 
 def run_remember_command(save_dir: str, history_file_path: str, query: List[str], search_all: bool,
                          search_starts_with: bool, execute: bool,
-                         max_return_count: int) -> Optional[str]:
+                         max_return_count: int, fuzzy: bool = False,
+                         incremental: bool = False, ranked: bool = False,
+                         tokens: bool = False, since: Optional[float] = None,
+                         before: Optional[float] = None,
+                         sql_profile: bool = False,
+                         background: bool = False) -> Optional[str]:
+    store_file_path = command_store.get_file_path(save_dir)
+    store = command_store.load_command_store(store_file_path, sql_profile)
+    history_processor = None
+    # The incremental search keeps querying the store, so it waits for the history.
+    if background and not incremental:
+        history_processor = command_store.start_background_history_processing(
+            store, history_file_path, save_dir, 20)
+    else:
+        command_store.start_history_processing(store, history_file_path, save_dir, 20)
+    try:
+        if incremental:
+            return run_incremental_command(store, history_file_path, query, search_all)
+        print('Looking for all past commands with: ' + ", ".join(query))
+        with timing.phase(timing.PHASE_SEARCH):
+            # Without a query the time window alone decides, ranked and token searches need terms.
+            if not query and since is not None:
+                result = store.get_most_used_commands_since(since, query, max_return_count,
+                                                            before=before)
+            elif not query:
+                result = store.search_commands(query, limit=max_return_count, before=before)
+            elif ranked:
+                result = command_store.ranked_info_search(store, save_dir, query,
+                                                          max_return_count)
+            elif tokens:
+                result = store.search_commands_by_tokens(query[0], query[1:], since, before)
+            else:
+                result = store.search_commands(query, search_starts_with,
+                                               search_info=search_all, fuzzy=fuzzy,
+                                               fuzzy_limit=max_return_count, since=since,
+                                               before=before)
+        command_store.report_query_profile(store, save_dir)
+        if history_processor:
+            history_processor.report_lag(execute)
+        return display_and_interact_results(
+            result, max_return_count, save_dir, history_file_path, query, execute)
+    finally:
+        if history_processor:
+            history_processor.join()
+
+
+def run_stats_command(save_dir: str, history_file_path: str, query: List[str],
+                      max_return_count: int, since: Optional[float] = None) -> Optional[str]:
     store_file_path = command_store.get_file_path(save_dir)
     store = command_store.load_command_store(store_file_path)
     command_store.start_history_processing(store, history_file_path, save_dir, 20)
-    print('Looking for all past commands with: ' + ", ".join(query))
-    start_time = time.time()
-    result = store.search_commands(query, search_starts_with, search_info=search_all)
-    total_time = time.time() - start_time
-    print("Search time %.5f:  seconds" % total_time)
-    return display_and_interact_results(
-        result, max_return_count, save_dir, history_file_path, query, execute)
+    if not query:
+        if since is None:
+            stats = store.get_primary_command_stats(max_return_count)
+        else:
+            stats = store.get_primary_command_stats_since(since, max_return_count)
+        command_store.print_primary_command_stats(stats)
+        return None
+    primary_command = query[0]
+    if since is None:
+        stat = store.get_primary_command_stat(primary_command)
+        stats = [stat] if stat else []
+    else:
+        stats = store.get_primary_command_stats_since(since, 1, primary_command)
+    if not stats:
+        return f'No commands found with the primary command: {primary_command}'
+    if since is None:
+        commands = store.search_commands_by_tokens(primary_command, [])
+    else:
+        commands = store.get_most_used_commands_since(
+            since, [], max_return_count, primary_command=primary_command)
+    command_store.print_primary_command_stats(stats)
+    command_store.print_commands(commands[:max_return_count], query[:1])
+    return None
+
+
+def run_incremental_command(store: command_store.SqlCommandStore, history_file_path: str,
+                            query: List[str], search_all: bool) -> Optional[str]:
+    command = run_incremental_search(store, ' '.join(query), search_all)
+    if not command:
+        return 'Exit'
+    load_user_interactor(history_file_path).execute_command(command)
+    return None
 
 
 if __name__ == "__main__":
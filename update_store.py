@@ -1,20 +1,35 @@
-import time
+# Imported first so that the import phase covers the imports below.
+from remember import timing
+import argparse
 
 import remember.command_store_lib as command_store
-from remember import handle_args
+from remember import handle_args, profiling
 from remember.interactive import InteractiveCommandExecutor
 
 
 def main(command_executor: InteractiveCommandExecutor) -> None:
     """Entry point for this executable python module."""
+    timing.end_import_phase()
     args = handle_args.setup_args_for_update()
+    try:
+        with profiling.profile(args.profile, args.save_dir, 'update_store'):
+            run_update_args(args, command_executor)
+    finally:
+        timing.report_timings(args.timings)
+
+
+def run_update_args(args: argparse.Namespace, command_executor: InteractiveCommandExecutor) -> None:
     store_file_path = command_store.get_file_path(args.save_dir)
-    store = command_store.load_command_store(store_file_path)
+    # Without -u or -d the store is only searched.
+    store = command_store.load_command_store(store_file_path, args.sql_profile,
+                                             read_only=not (args.updateinfo or args.delete))
+    if args.updateinfo or (args.delete and command_store.has_info_index(args.save_dir)):
+        command_store.load_info_index(store, args.save_dir)
     print('Looking for all past commands with: ' + ", ".join(args.query))
-    start_time = time.time()
-    search_results = store.search_commands(args.query, args.startswith, )
-    end_time = time.time()
-    print(f"Search time: {end_time - start_time} seconds")
+    with timing.phase(timing.PHASE_SEARCH):
+        search_results = store.search_commands(args.query, args.startswith, fuzzy=args.fuzzy,
+                                               fuzzy_limit=args.max)
+    command_store.report_query_profile(store, args.save_dir)
     print(f"Number of results found: {str(len(search_results))}")
     if len(search_results) > args.max:
         print(f"Results truncated to the first: {args.max}")